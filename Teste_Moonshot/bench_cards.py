@@ -0,0 +1,155 @@
+"""
+bench_cards.py — mede a renderização dos cards (ms/card e alocações).
+
+Compara o renderer sem cache (equivalente ao generate_trade_card antigo: reabre o
+fundo, recarrega as fontes e redimensiona os ícones a cada card) com o CardRenderer
+em cache, com e sem templates em camadas, e as codificações de saída (bytes/card).
+Também mede o gráfico de velas do sinal (moonshot_chart, meta: < 50 ms com o encode).
+Os fundos são sintéticos (mesmo make_bg do test_cards.py), então roda sem assets
+nem Telegram.
+
+Uso:
+  python bench_cards.py                  # 200 cards por variante
+  python bench_cards.py --n 500 --bg assets/moonshot/bg.jpg
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from moonshot_card import CardRenderer
+from moonshot_chart import ChartRenderer
+from test_cards import make_bg
+
+
+def _cards(n: int):
+    """Dados variados (símbolo/lado/TP/preços) para não medir só o caminho quente de um texto."""
+    syms = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "1000PEPEUSDT", "ARKMUSDT"]
+    for i in range(n):
+        side = "LONG" if i % 2 == 0 else "SHORT"
+        yield {
+            "symbol": syms[i % len(syms)], "side": side, "leverage": f"{5 + i % 20}x",
+            "tp_label": f"TP{1 + i % 3}", "roi_pct": (i % 37) - 12.5,
+            "entry": 100.0 + i * 0.37, "last": 101.0 + i * 0.41, "stop_text": f"{99.5 + i * 0.1:.3f}",
+        }
+
+
+def _render(r: CardRenderer, c: dict, bg_tp: str, bg_stop: str, i: int):
+    if i % 4 == 3:
+        return r.stop_card(c["symbol"], c["side"], c["leverage"], -abs(c["roi_pct"]),
+                           c["entry"], c["last"], c["entry"] * 0.98, bg_stop)
+    return r.trade_card(c["symbol"], c["side"], c["leverage"], c["tp_label"], c["roi_pct"],
+                        c["entry"], c["last"], c["stop_text"], bg_tp)
+
+
+def bench(label: str, r: CardRenderer, n: int, bg_tp: str, bg_stop: str, encode: bool = True):
+    cards = list(_cards(n))
+    _render(r, cards[0], bg_tp, bg_stop, 0)  # aquece (import de plugins do PIL etc.)
+
+    times = []
+    sizes = []
+    for i, c in enumerate(cards):
+        t0 = time.perf_counter()
+        im = _render(r, c, bg_tp, bg_stop, i)
+        if encode:
+            sizes.append(len(r.encode(im)))
+        times.append((time.perf_counter() - t0) * 1000.0)
+
+    # alocações num lote menor (tracemalloc deixa tudo bem mais lento)
+    m = min(n, 50)
+    tracemalloc.start()
+    snap0 = tracemalloc.take_snapshot()
+    for i, c in enumerate(cards[:m]):
+        _render(r, c, bg_tp, bg_stop, i)
+    snap1 = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = snap1.compare_to(snap0, "filename")
+    blocks = sum(max(0, s.count_diff) for s in stats)
+
+    xs = sorted(times)
+    row = {
+        "variant": label,
+        "ms_mean": statistics.fmean(times),
+        "ms_p50": xs[len(xs) // 2],
+        "ms_p90": xs[int(len(xs) * 0.9) - 1],
+        "peak_kb": peak / 1024.0,
+        "blocks_per_card": blocks / m,
+        "bytes_per_card": statistics.fmean(sizes) if sizes else 0.0,
+    }
+    return row
+
+
+def bench_chart(n: int, candles: int = 60, encoding: str = "png"):
+    """ms por gráfico de sinal (desenho e encode separados), com velas sintéticas."""
+    rng = np.random.default_rng(7)
+    c = 100.0 + np.cumsum(rng.normal(0, 0.5, candles + 50))
+    o = np.r_[c[0], c[:-1]]
+    h = np.maximum(o, c) + rng.random(len(c)) * 0.4
+    l = np.minimum(o, c) - rng.random(len(c)) * 0.4
+    last = float(c[-1])
+    kw = dict(o=o, h=h, l=l, c=c, symbol="BTCUSDT", tf="15", side="LONG",
+              entry_zone=(last - 0.2, last + 0.2), sl=last - 2, tps=[last + 2, last + 4, last + 6],
+              breakout=last - 0.3, leverage="10x", decimals=3)
+    ch = ChartRenderer(candles=candles, cards=CardRenderer(encoding=encoding))
+    ch.render(**kw)  # aquece
+    draw_ms, enc_ms, sizes = [], [], []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        im = ch.render(**kw)
+        t1 = time.perf_counter()
+        sizes.append(len(ch.cards.encode(im)))
+        draw_ms.append((t1 - t0) * 1000.0)
+        enc_ms.append((time.perf_counter() - t1) * 1000.0)
+    total = sorted(d + e for d, e in zip(draw_ms, enc_ms))
+    return {"variant": f"gráfico {candles} velas {encoding}", "draw": statistics.fmean(draw_ms),
+            "enc": statistics.fmean(enc_ms), "p90": total[int(len(total) * 0.9) - 1],
+            "bytes": statistics.fmean(sizes)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark dos cards do Moonshot")
+    ap.add_argument("--n", type=int, default=200, help="cards por variante")
+    ap.add_argument("--bg", default=None, help="fundo de TP (padrão: sintético)")
+    ap.add_argument("--bg-stop", default=None, help="fundo de STOP (padrão: sintético)")
+    ap.add_argument("--no-encode", action="store_true", help="mede só o desenho, sem gerar o PNG")
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_cards_"))
+    bg_tp = args.bg or make_bg(str(tmp / "bg.jpg"), "tp")
+    bg_stop = args.bg_stop or make_bg(str(tmp / "bg_stop.jpg"), "stop")
+
+    variants = [
+        ("sem cache (antigo)", CardRenderer(cache_size=0, layered=False)),
+        ("LRU", CardRenderer(layered=False)),
+        ("LRU + camadas", CardRenderer()),
+        ("camadas + png8", CardRenderer(encoding="png8")),
+        ("camadas + jpeg q85", CardRenderer(encoding="jpeg", quality=85)),
+        ("camadas + webp q85", CardRenderer(encoding="webp", quality=85)),
+    ]
+    rows = [bench(label, r, args.n, bg_tp, bg_stop, encode=not args.no_encode) for label, r in variants]
+
+    print(f"\n{args.n} cards por variante | fundo {bg_tp}\n")
+    print(f" {'variante':<22} {'ms/card':>8} {'p50':>7} {'p90':>7} {'pico KB':>9} {'blocos/card':>12} {'bytes/card':>11}")
+    for r in rows:
+        print(f" {r['variant']:<22} {r['ms_mean']:>8.2f} {r['ms_p50']:>7.2f} {r['ms_p90']:>7.2f} "
+              f"{r['peak_kb']:>9.0f} {r['blocks_per_card']:>12.0f} {r['bytes_per_card']:>11.0f}")
+    base, base_b = rows[0]["ms_mean"], rows[0]["bytes_per_card"]
+    print()
+    for r in rows[1:]:
+        size = f", {r['bytes_per_card'] / base_b:.0%} dos bytes" if base_b else ""
+        print(f" {r['variant']}: {r['ms_mean'] / max(base, 1e-9):.0%} do tempo do sem cache{size}")
+
+    print(f"\n {'gráfico de sinal':<26} {'desenho':>8} {'encode':>7} {'p90 tot':>8} {'bytes':>8}")
+    for enc in ("png", "jpeg"):
+        r = bench_chart(max(20, args.n // 4), encoding=enc)
+        print(f" {r['variant']:<26} {r['draw']:>8.2f} {r['enc']:>7.2f} {r['p90']:>8.2f} {r['bytes']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,9 @@ from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import yaml
 
+from moonshot_trade_store import db_path_from_cfg, read_trades
+from moonshot_symbol_stats import est_pnl_usdt, perf_flags
+
 BYBIT = "https://api.bybit.com"
 
 def _session():
@@ -60,12 +63,6 @@ def fetch_tickers_map(category="linear"):
         out[sym] = {"turnover24h": t24, "lastPrice": lp}
     return out
 
-def est_pnl_usdt(t):
-    """aproxima PnL do trade usando roi_pct*notional/100, se existir."""
-    roi = float(t.get("roi_pct", 0.0))
-    notion = float(t.get("notional", 0.0))
-    return (roi/100.0) * notion
-
 def within_days(ts_str, days):
     if not ts_str: return True
     try:
@@ -76,7 +73,7 @@ def within_days(ts_str, days):
 
 def build(args):
     cfg = load_cfg(args.config)
-    trades = load_json(cfg.get("trades_file","moonshot_trades.json"), {})
+    trades = read_trades(cfg.get("trades_file","moonshot_trades.json"), db_path_from_cfg(cfg))
     tick = fetch_tickers_map(cfg.get("category","linear"))
 
     # agrega por símbolo (fechados nos últimos X dias)
@@ -112,9 +109,11 @@ def build(args):
 
         reason = []
         if t24 < args.min_turnover: reason.append(f"low_liq({int(t24)})")
-        if closed >= args.min_trades and stop_rate >= args.stop_rate: reason.append(f"stop_rate={stop_rate:.2f}")
-        if closed >= args.min_trades and tp3_win <= args.max_tp3_win: reason.append(f"tp3_win={tp3_win:.2f}")
-        if closed >= args.min_trades and pnl <= args.max_netpnl: reason.append(f"netPnL={pnl:.2f}")
+        # mesmas regras avaliadas ao vivo pelo agente (moonshot_symbol_stats.perf_flags)
+        reason += perf_flags(closed, stops, tp3, pnl, {
+            "min_trades": args.min_trades, "stop_rate": args.stop_rate,
+            "max_tp3_win": args.max_tp3_win, "max_netpnl": args.max_netpnl,
+        })
 
         if reason:
             bl.append(sym)
@@ -10,10 +10,13 @@ import os
 import time
 import json
 import math
+import threading
 import traceback
 from datetime import datetime
-from telegram_send import send_tp_card
-from collections import Counter
+from telegram_send import send_tp_card, render_tp_card
+from moonshot_card import archive_from_cfg, renderer_from_cfg, set_default_renderer
+from moonshot_render_pool import render_pool_from_cfg
+from collections import Counter, deque
 from zoneinfo import ZoneInfo
 from decimal import Decimal, ROUND_HALF_UP
 
@@ -27,7 +30,42 @@ import pandas as pd
 BYBIT = "https://api.bybit.com"
 
 # === AutoBlacklist ===
-from moonshot_blacklist import AutoBlacklist
+from moonshot_blacklist import blacklist_from_cfg
+
+# === Métricas por estágio / profiler ===
+from moonshot_metrics import NULL_METRICS, metrics_from_cfg
+
+# === Monitor de trades (TP/SL) ===
+from moonshot_monitor import TradeMonitor, is_open
+
+# === Store de trades (SQLite/WAL) ===
+from moonshot_trade_store import store_from_cfg
+
+# === Desempenho por símbolo (janela deslizante → cooldown) ===
+from moonshot_symbol_stats import SymbolStats, perf_cfg, perf_flags
+
+# === Histórico colunar de trades fechados (um arquivo por dia) ===
+from moonshot_trade_archive import archive_from_cfg as trade_archive_from_cfg
+
+# === Pré-filtro em estágios (ticker → velas → book) ===
+from moonshot_prefilter import StagedPrefilter
+
+# === Serviço local de trades (dono único do estado; watchers assinam eventos) ===
+from moonshot_trade_service import service_from_cfg
+
+# === Gráfico de velas no sinal (PIL, sem matplotlib) ===
+from moonshot_chart import chart_args, chart_from_cfg
+
+METRICS = NULL_METRICS  # substituído em main() conforme cfg['metrics']
+
+# === Fila de saída do Telegram (envio em background) ===
+from telegram_outbox import media_cache_from_cfg, outbox_from_cfg, post_media
+
+OUTBOX = None  # criado em main() conforme cfg['telegram']['outbox']; None = envio síncrono
+MEDIA = None   # file_id do GIF/fotos estáticas (telegram.media_cache_file)
+CARD_ARCHIVE = None  # cópia opcional dos cards em disco (cards.archive)
+CARD_POOL = None  # threads que geram os cards fora do monitor (cards.workers)
+CHART = None  # gráfico anexado ao "AI SIGNAL IS READY" (signal_chart.enabled)
 
 # ==============================
 # Rede resiliente
@@ -143,6 +181,24 @@ def fetch_klines(symbol, interval="15", limit=200, category="linear"):
     return df
 
 
+def fetch_klines_1m_since(symbol, start_ms, limit=1000, category="linear"):
+    """Velas de 1m desde start_ms como tuplas (start_ms, o, h, l, c), em ordem crescente."""
+    data = safe_get_json(
+        f"{BYBIT}/v5/market/kline",
+        {"category": category, "symbol": symbol, "interval": "1", "start": int(start_ms), "limit": int(limit)},
+        timeout=8,
+    )
+    lst = ((data or {}).get("result") or {}).get("list", []) or []
+    out = []
+    for it in lst:
+        try:
+            out.append((int(it[0]), float(it[1]), float(it[2]), float(it[3]), float(it[4])))
+        except (TypeError, ValueError, IndexError):
+            continue
+    out.sort()
+    return out
+
+
 def fetch_ticker(symbol, category="linear"):
     data = safe_get_json(f"{BYBIT}/v5/market/tickers", {"category": category, "symbol": symbol})
     lst = (data or {}).get("result", {}).get("list", []) or []
@@ -155,6 +211,14 @@ def fetch_tickers_map(category="linear"):
     return {it.get("symbol"): it for it in lst if it.get("symbol")}
 
 
+def fetch_orderbook(symbol, limit=50, category="linear"):
+    data = safe_get_json(
+        f"{BYBIT}/v5/market/orderbook",
+        {"category": category, "symbol": symbol, "limit": int(limit)},
+    )
+    return (data or {}).get("result") or None
+
+
 def fetch_instruments_page(category="linear", cursor=None):
     params = {"category": category}
     if cursor:
@@ -183,13 +247,7 @@ def discover_perp_symbols(cfg):
     allow = set(s.upper().strip() for s in cfg.get("allowlist", []))
 
     # AutoBlacklist para filtrar na descoberta
-    bl_cfg = (cfg.get("blacklist") or {})
-    abl = AutoBlacklist(
-        path=bl_cfg.get("file", cfg.get("blacklist_file", "moonshot_blacklist.json")),
-        rules=bl_cfg.get("rules", {}),
-        hard_denylist=(bl_cfg.get("hard_denylist") or cfg.get("denylist") or []),
-        enabled=bl_cfg.get("enabled", True),
-    )
+    abl = blacklist_from_cfg(cfg)
     abl.cleanup()
 
     if cfg.get("debug", False):
@@ -343,13 +401,14 @@ def atr(df: pd.DataFrame, n: int = 14) -> pd.Series:
 
 
 def add_indicators(df: pd.DataFrame, cfg: dict) -> pd.DataFrame:
-    df = df.copy()
-    df["ema_s"] = ema(df["close"], int(cfg["ema_short"]))
-    df["ema_l"] = ema(df["close"], int(cfg["ema_long"]))
-    df["rsi"] = rsi(df["close"], int(cfg["rsi_len"]))
-    df["atr"] = atr(df, int(cfg["atr_len"]))
-    df["vol_ma"] = df["volume"].rolling(int(cfg["vol_ma_len"])).mean()
-    return df
+    with METRICS.stage("indicators"):
+        df = df.copy()
+        df["ema_s"] = ema(df["close"], int(cfg["ema_short"]))
+        df["ema_l"] = ema(df["close"], int(cfg["ema_long"]))
+        df["rsi"] = rsi(df["close"], int(cfg["rsi_len"]))
+        df["atr"] = atr(df, int(cfg["atr_len"]))
+        df["vol_ma"] = df["volume"].rolling(int(cfg["vol_ma_len"])).mean()
+        return df
 
 
 # ==============================
@@ -545,21 +604,25 @@ def fmt_pre_signal_msg(symbol, tf, side, dt_str, trigger, atrv, ex, cfg, meta_ma
     )
 
 
-def send_telegram(cfg, text):
+def send_telegram(cfg, text, key=None):
+    """`key`: chave de idempotência no outbox (mesma chave → uma mensagem só)."""
     tg = cfg.get("telegram", {})
     if not tg.get("enabled", False):
         print(text)
         return True
-    data = safe_post_json(
-        f"https://api.telegram.org/bot{tg['bot_token']}/sendMessage",
-        {"chat_id": tg["chat_id"], "text": text},
-    )
+    if OUTBOX is not None:
+        return OUTBOX.send_text(tg["chat_id"], text, key=key)
+    with METRICS.stage("telegram"):
+        data = safe_post_json(
+            f"https://api.telegram.org/bot{tg['bot_token']}/sendMessage",
+            {"chat_id": tg["chat_id"], "text": text},
+        )
     if not data:
         print("[net] Telegram send failed")
     return bool(data)
 
 
-def send_telegram_animation(cfg, caption, gif_path=None, gif_url=None):
+def send_telegram_animation(cfg, caption, gif_path=None, gif_url=None, key=None):
     tg = cfg.get("telegram", {})
     if not tg.get("enabled", False):
         print("[GIF][preview] ", caption[:120].replace("\n", " ") + " ...")
@@ -568,12 +631,20 @@ def send_telegram_animation(cfg, caption, gif_path=None, gif_url=None):
     if caption and len(caption) > 1000:
         caption = caption[:1000] + "…"
 
+    if OUTBOX is not None:
+        ap = os.path.abspath(gif_path) if gif_path else None
+        if gif_url or (ap and os.path.exists(ap)):
+            return OUTBOX.send_animation(tg["chat_id"], caption, url=gif_url, path=ap, fallback_text=caption, key=key)
+        print("[GIF] sem GIF válido; fallback para texto")
+        return send_telegram(cfg, caption, key=key)
+
     url = f"https://api.telegram.org/bot{tg['bot_token']}/sendAnimation"
     try:
         if gif_url:
             print("[GIF] usando URL:", gif_url)
             payload = {"chat_id": tg["chat_id"], "animation": gif_url, "caption": caption}
-            r = SESSION.post(url, json=payload, timeout=20)
+            with METRICS.stage("telegram"):
+                r = SESSION.post(url, json=payload, timeout=20)
             r.raise_for_status()
             return True
 
@@ -581,12 +652,12 @@ def send_telegram_animation(cfg, caption, gif_path=None, gif_url=None):
             ap = os.path.abspath(gif_path)
             if os.path.exists(ap):
                 print("[GIF] usando arquivo:", ap)
-                with open(ap, "rb") as f:
-                    files = {"animation": f}
-                    data = {"chat_id": tg["chat_id"], "caption": caption}
-                    r = requests.post(url, data=data, files=files, timeout=30)
-                    r.raise_for_status()
-                    return True
+                data = {"chat_id": tg["chat_id"], "caption": caption}
+                with METRICS.stage("telegram"):
+                    # file_id em cache → sem re-upload; id recusado → upload de novo
+                    r = post_media(SESSION, tg["bot_token"], "sendAnimation", data, "animation", ap, MEDIA, timeout=30)
+                r.raise_for_status()
+                return True
             else:
                 print("[GIF] arquivo não encontrado:", ap)
 
@@ -601,6 +672,38 @@ def send_telegram_animation(cfg, caption, gif_path=None, gif_url=None):
         return send_telegram(cfg, caption)
 
 
+def send_signal_chart(cfg, caption, args: dict, key=None):
+    """Sinal como foto (gráfico de velas) com o texto na legenda; falhou → só o texto."""
+    tg = cfg.get("telegram", {})
+    if not tg.get("enabled", False):
+        print("[chart][preview] ", caption[:120].replace("\n", " ") + " ...")
+        return True
+
+    if caption and len(caption) > 1000:
+        caption = caption[:1000] + "…"
+
+    if OUTBOX is not None:
+        # args são JSON (persistem no outbox); o render roda no pool de cards
+        return OUTBOX.send_photo(tg["chat_id"], caption, render_name="signal_chart", render_args=args,
+                                 fallback_text=caption, key=key)
+    try:
+        t0 = time.perf_counter()
+        png = CHART.render_bytes(**args)
+        METRICS.observe("chart_render_ms", (time.perf_counter() - t0) * 1000.0)
+        with METRICS.stage("telegram"):
+            r = SESSION.post(
+                f"https://api.telegram.org/bot{tg['bot_token']}/sendPhoto",
+                data={"chat_id": tg["chat_id"], "caption": caption},
+                files={"photo": (f"chart.{CHART.cards.ext}", png)},
+                timeout=30,
+            )
+        r.raise_for_status()
+        return True
+    except Exception as e:
+        print(f"[chart] envio falhou ({e}); fallback para texto")
+        return send_telegram(cfg, caption, key=key)
+
+
 # ==============================
 # Estado & sizing
 # ==============================
@@ -645,13 +748,88 @@ def size_position_usdt(cfg, entry: float, sl: float, lev_used: float | None = No
     return max(min_notional, round(notional, 2))
 
 
-def roi_pct(entry, exit_price, lev, side="LONG"):
-    dir_ = 1.0 if side == "LONG" else -1.0
-    return round(dir_ * ((exit_price - entry) / entry) * lev * 100, 4)
+def send_update(cfg, title, body, key=None):
+    return send_telegram(cfg, f"{title}\n{body}", key=key)
 
 
-def send_update(cfg, title, body):
-    return send_telegram(cfg, f"{title}\n{body}")
+def notify_trade_event(cfg, ev: dict, bg_card: str, trade_key: str = None):
+    """Texto + card de um evento do monitor (TP1/TP2/TP3/STOP)."""
+    sym, side, tf = ev["symbol"], ev["side"], ev["tf"]
+    key = f"ev:{trade_key}:{ev['event']}" if trade_key else None
+    price = ev["price"]
+    if ev["event"] == "TP1":
+        send_update(
+            cfg,
+            "AI Signals Bot | Trade Update",
+            f"✅ TP1 hit | {sym} {side} on {tf}m\n"
+            f"Entry: {ev['entry']}  •  TP1: {ev['tp1']}\n"
+            f"➡️ Stop movido para BE ({ev['sl']})",
+            key=key,
+        )
+        caption = f"{sym} | TP1 atingido ✅"
+    elif ev["event"] == "TP2":
+        send_update(
+            cfg,
+            "AI Signals Bot | Trade Update",
+            f"✅ TP2 hit | {sym} {side} on {tf}m\n"
+            f"TP2: {ev['tp2']}  •  Stop permanece em BE ({ev['sl']})",
+            key=key,
+        )
+        caption = f"{sym} | TP2 atingido ✅"
+    elif ev["event"] == "TP3":
+        send_update(
+            cfg,
+            "Trade Closed",
+            f"🏁 3TP hit — encerrando | {sym} {tf}m\n"
+            f"Filled: {price}\nROI (est.): {ev['roi_pct']}%",
+            key=key,
+        )
+        caption = f"{sym} | TP3 atingido 🏁"
+    else:
+        send_update(
+            cfg,
+            "Trade Closed",
+            f"🛑 Stop Loss | {sym} {side} on {tf}m\n"
+            f"Fill: {price}\nROI (est.): {ev['roi_pct']}%",
+            key=key,
+        )
+        return
+
+    card = {
+        "symbol": sym,
+        "side": side,
+        "leverage": f"{ev['lev']}x",
+        "tp_label": ev["event"],
+        "roi_pct": ev["roi_pct"],
+        "entry": ev["entry"],
+        "last": price,
+        "stop_text": f"{ev['sl']}",
+        "caption": caption,
+    }
+    if OUTBOX is not None:
+        # render no pool + upload na thread da fila; o monitor só enfileira
+        OUTBOX.send_photo(
+            cfg["telegram"]["chat_id"], caption,
+            render_name="tp_card", render_args={"card": card, "bg_path": bg_card},
+            fallback_text=caption,
+            key=f"{key}:card" if key else None,
+        )
+        return
+    send_args = (cfg["telegram"]["bot_token"], cfg["telegram"]["chat_id"], card)
+    if CARD_POOL is not None:
+        # sem outbox: render + upload numa thread do pool; o monitor segue
+        fut = CARD_POOL.submit(send_tp_card, *send_args, bg_path=bg_card, archive=CARD_ARCHIVE)
+        if fut is not None:
+            def _log_err(f):
+                if f.exception() is not None:
+                    dbg(cfg, f"card {ev['event'].lower()} erro: {f.exception()}")
+            fut.add_done_callback(_log_err)
+            return
+    try:
+        with METRICS.stage("telegram"):
+            send_tp_card(*send_args, bg_path=bg_card, archive=CARD_ARCHIVE)
+    except Exception as e:
+        dbg(cfg, f"card {ev['event'].lower()} erro: {e}")
 
 
 
@@ -747,20 +925,44 @@ def normalize_cfg(cfg: dict) -> dict:
 
 
 def main():
+    global METRICS, OUTBOX, MEDIA, CARD_ARCHIVE, CARD_POOL, CHART
     cfg = normalize_cfg(load_cfg())
+    METRICS, profiler = metrics_from_cfg(cfg)
+    CARD_ARCHIVE = archive_from_cfg(cfg)
+    set_default_renderer(renderer_from_cfg(cfg))  # templates em camadas + cards.encoding
+    CHART = chart_from_cfg(cfg)
+    MEDIA = media_cache_from_cfg(cfg)
+    CARD_POOL = render_pool_from_cfg(cfg, METRICS)
+    OUTBOX = outbox_from_cfg(cfg, METRICS, session=SESSION, media=MEDIA, render_pool=CARD_POOL)
+    if OUTBOX is not None:
+        # cards entram no outbox como (renderer, args) para sobreviver a um restart
+        OUTBOX.register_renderer(
+            "tp_card", lambda card, bg_path: render_tp_card(card, bg_path=bg_path, archive=CARD_ARCHIVE)
+        )
+        if CHART is not None:
+            OUTBOX.register_renderer("signal_chart", CHART.render_bytes)
+        OUTBOX.start()  # reenvia o que ficou pendente
     BG_CARD = cfg.get("card_bg_path", "assets/moonshot/bg.jpg")  # opcional no YAML
     cache = load_cache(cfg["cache_file"])
     pre_cache = load_cache(cfg.get("pre_cache_file", "moonshot_pre_cache.json"))
-    trades = load_trades(cfg["trades_file"])
+    store = store_from_cfg(cfg)
+    trades = store.load_all() if store is not None else load_trades(cfg["trades_file"])
+
+    service = None
+
+    def persist_trades(keys, kind="update", publish=True):
+        # chamar com trades_lock: grava só as linhas alteradas (ou o JSON inteiro, sem store)
+        if store is None:
+            save_trades(cfg["trades_file"], trades)
+        else:
+            store.upsert_many((k, trades[k]) for k in keys if k in trades)
+            store.export_json(trades)
+        if publish and service is not None:
+            service.publish(keys, kind=kind)
 
     # AutoBlacklist
-    bl_cfg = (cfg.get("blacklist") or {})
-    abl = AutoBlacklist(
-        path=bl_cfg.get("file", cfg.get("blacklist_file", "moonshot_blacklist.json")),
-        rules=bl_cfg.get("rules", {}),
-        hard_denylist=(bl_cfg.get("hard_denylist") or cfg.get("denylist") or []),
-        enabled=bl_cfg.get("enabled", True),
-    )
+    # backend compartilhado com o moonshot_tools: bans manuais valem sem reiniciar
+    abl = blacklist_from_cfg(cfg, write_behind=True)  # gravado uma vez por ciclo (abl.flush)
     abl.cleanup()
 
     # Símbolos
@@ -776,11 +978,89 @@ def main():
         symbols.append("BTCUSDT")
 
     # Filtro de blacklist no conjunto final (garantia extra)
+    universe = set(symbols)
     symbols = [s for s in symbols if not abl.is_blocked(s)[0]]
 
+    # Pré-filtro: ticker antes das velas, book só no gatilho
+    prefilter = StagedPrefilter(
+        cfg,
+        abl,
+        fetch_orderbook=lambda sym, limit: fetch_orderbook(sym, limit, cfg.get("category", "linear")),
+        metrics=METRICS,
+    )
+
+    # Conjunto quente do scan acompanha a blacklist: sai ao ser banido, volta quando
+    # o cooldown vence (aplicado no início de cada ciclo, sem mexer no batch corrente)
+    hot_changes: deque[tuple[str, str]] = deque()
+    abl.add_listener(
+        on_unban=lambda s: hot_changes.append(("+", s)),
+        on_ban=lambda s: hot_changes.append(("-", s)),
+    )
+
     # Metadados de preço (tickSize/decimais)
     symbol_meta = build_symbol_meta_map(cfg)
 
+    # Monitor de TP/SL: dict de trades compartilhado com o scan, protegido por lock.
+    # SLs viram strikes na blacklist pela thread principal (AutoBlacklist não é thread-safe).
+    trades_lock = threading.RLock()
+    stop_strikes: deque[str] = deque()
+    mon_cfg = (cfg.get("monitor") or {})
+    mon_threaded = bool(mon_cfg.get("threaded", True))
+
+    # Agregados por símbolo atualizados a cada fechamento; regras do build_blacklist
+    # avaliadas ao vivo, cooldown aplicado pela thread principal
+    perf = perf_cfg(cfg)
+    sym_stats = SymbolStats(window_days=perf["window_days"])
+    sym_stats.seed(trades)
+    perf_flagged: deque[tuple[str, list]] = deque()
+
+    # trades fechados também vão para o arquivo colunar por dia (analytics lê só o intervalo)
+    trade_archive = trade_archive_from_cfg(cfg)
+    if trade_archive is not None and trade_archive.version == 0:
+        n = trade_archive.append(trades.items())  # primeira execução: backfill do histórico
+        print(f"[archive] backfill: {n} trade(s) fechado(s) → {trade_archive.root}")
+
+    def _on_close(key, tr, ev):
+        if ev["event"] == "STOP":
+            stop_strikes.append(tr["symbol"])
+        if trade_archive is not None:
+            try:
+                trade_archive.append([(key, tr)])
+            except Exception as e:
+                print(f"[archive] falha ao gravar {key}: {e}")
+        row = sym_stats.add_trade(tr)
+        if perf["enabled"] and row:
+            flags = perf_flags(row["closed"], row["stops"], row["tp3"], row["pnl"], perf)
+            if flags:
+                perf_flagged.append((tr["symbol"], flags))
+
+    monitor = TradeMonitor(
+        trades,
+        trades_lock,
+        price_source=lambda: fetch_tickers_map(category=cfg.get("category", "linear")),
+        save=lambda data, keys: persist_trades(keys),
+        notify=lambda key, ev: notify_trade_event(cfg, ev, BG_CARD, trade_key=key),
+        every_sec=float(mon_cfg.get("every_sec", 5)),
+        breakeven=bool(cfg.get("breakeven_after_tp1", True)),
+        metrics=METRICS,
+        on_close=_on_close,
+        kline_source=(
+            (lambda sym, start_ms, limit: fetch_klines_1m_since(sym, start_ms, limit, cfg.get("category", "linear")))
+            if mon_cfg.get("intrabar", True) else None
+        ),
+        max_lookback_min=float(mon_cfg.get("intrabar_max_lookback_min", 180)),
+        workers=int(mon_cfg.get("intrabar_workers", 8)),
+    )
+    monitor.start(threaded=mon_threaded)
+
+    service = service_from_cfg(
+        cfg, trades, trades_lock,
+        persist=lambda keys: persist_trades(keys, publish=False),
+        on_patch=monitor.track,
+    )
+    if service is not None and not service.start():
+        service = None
+
     batch_size = int(cfg.get("max_symbols_per_cycle", 160))
     scan_idx = 0
     tfs = [str(x) for x in cfg.get("timeframes", ["5", "15"])]
@@ -809,12 +1089,29 @@ def main():
     def get_df(sym: str, tf: str):
         key = (sym, tf)
         if key not in df_cache:
-            df_cache[key] = fetch_klines(sym, interval=tf, limit=200, category=cfg.get("category", "linear"))
+            with METRICS.stage("klines"):
+                df_cache[key] = fetch_klines(sym, interval=tf, limit=200, category=cfg.get("category", "linear"))
         return df_cache[key]
 
     while True:
         try:
-            tick_map = fetch_tickers_map(category=cfg.get("category", "linear"))
+            while stop_strikes:
+                abl.register_stop(stop_strikes.popleft())  # cooldown
+            while perf_flagged:
+                sym, flags = perf_flagged.popleft()
+                abl.ban_temp(sym, perf["cooldown_hours"], "PERF " + ",".join(flags))
+                dbg(cfg, f"[blacklist] {sym} em cooldown por desempenho: {', '.join(flags)}")
+            abl.poll()
+            while hot_changes:
+                op, s = hot_changes.popleft()
+                if op == "+" and s in universe and s not in symbols:
+                    symbols.append(s)
+                    dbg(cfg, f"[blacklist] {s} saiu do cooldown; de volta ao scan")
+                elif op == "-" and s in symbols:
+                    symbols.remove(s)
+
+            with METRICS.stage("tickers"):
+                tick_map = fetch_tickers_map(category=cfg.get("category", "linear"))
 
             start = scan_idx
             end = min(scan_idx + batch_size, len(symbols))
@@ -826,20 +1123,31 @@ def main():
 
             signals_this_cycle = 0
             rej: dict[str, Counter] = {"LONG": Counter(), "SHORT": Counter()}
+            prefilter.begin_cycle(tfs)
             batch_candidates: list[dict] = []
 
             for sym in batch:
                 # Blacklist: checagem rápida
-                blocked, why = abl.is_blocked(sym)
+                with METRICS.stage("blacklist"):
+                    blocked, why = abl.is_blocked(sym)
                 if blocked:
                     if cfg.get("debug", False):
                         print(f"[skip] {sym} (blacklisted: {why})")
                     continue
 
+                # Estágio 1: só o ticker (liquidez/preço/range/funding/OI) — sem velas
+                with METRICS.stage("prefilter"):
+                    pre_why = prefilter.ticker_stage(sym, tick_map.get(sym))
+                if pre_why:
+                    if cfg.get("debug", False):
+                        print(f"[prefilter] {sym} -> {pre_why}")
+                    continue
+
                 # Auto-ban por candles (usa 15m e 60m)
                 df15 = get_df(sym, "15")
                 df60 = get_df(sym, "60")
-                bl_reason = abl.auto_from_candles(sym, df_15m=df15, df_1h=df60, ticker=tick_map.get(sym))
+                with METRICS.stage("blacklist"):
+                    bl_reason = abl.auto_from_candles(sym, df_15m=df15, df_1h=df60, ticker=tick_map.get(sym))
                 if bl_reason:
                     if cfg.get("debug", False):
                         print(f"[auto-blacklist] {sym} -> {bl_reason}")
@@ -881,7 +1189,8 @@ def main():
                     pdi = mdi = adxv = None
                     if cfg.get("adx_filter", {}).get("enabled", False):
                         try:
-                            pdi, mdi, adxv = dmi_adx(df, int(cfg.get("adx_filter", {}).get("len", 14)))
+                            with METRICS.stage("indicators"):
+                                pdi, mdi, adxv = dmi_adx(df, int(cfg.get("adx_filter", {}).get("len", 14)))
                             adx_last = float(adxv.iloc[-2])
                             if adx_last < float(cfg["adx_filter"]["min_adx"]):
                                 if log_each:
@@ -914,8 +1223,9 @@ def main():
 
                     for idx in indices:
                         # Calcula explicações Long/Short
-                        exL = explain_breakout_long_at(df, cfg, idx=idx)
-                        exS = explain_breakout_short_at(df, cfg, idx=idx) if cfg.get("enable_shorts", True) else None
+                        with METRICS.stage("signals"):
+                            exL = explain_breakout_long_at(df, cfg, idx=idx)
+                            exS = explain_breakout_short_at(df, cfg, idx=idx) if cfg.get("enable_shorts", True) else None
                         dt_last = exL["dt"]
 
                         gapL = _gap_long_atr(exL)
@@ -1010,14 +1320,18 @@ def main():
                                         notional = size_position_usdt(cfg, entry_center, sl, lev_used)
                                         margin_est = round(notional / max(lev_used, 1e-12), 2)
 
-                                        pre_msg = fmt_pre_signal_msg(
-                                            sym, tf, side, dt_last, trigger, atrv, ex, cfg, symbol_meta
-                                        )
-                                        pre_msg += (
-                                            f"\n💰 Notional sugerido: ~${notional} | Lev.: {lev_used}x | Margem≈${margin_est}"
-                                        )
-                                        send_telegram(cfg, pre_msg)
-
+                                        with METRICS.stage("prefilter"):
+                                            depth_ok, _ = prefilter.depth_ok(sym, side, notional)
+                                        if depth_ok:
+                                            pre_msg = fmt_pre_signal_msg(
+                                                sym, tf, side, dt_last, trigger, atrv, ex, cfg, symbol_meta
+                                            )
+                                            pre_msg += (
+                                                f"\n💰 Notional sugerido: ~${notional} | Lev.: {lev_used}x | Margem≈${margin_est}"
+                                            )
+                                            send_telegram(cfg, pre_msg, key=pre_key)
+
+                                        # book raso também entra no cache: não reavaliar o mesmo pré-sinal
                                         pre_cache.add(pre_key)
                                         save_cache(cfg.get("pre_cache_file", "moonshot_pre_cache.json"), pre_cache)
 
@@ -1055,6 +1369,16 @@ def main():
                         notional = size_position_usdt(cfg, sig["entry_price"], sig["sl"], lev_used)
                         margin_est = round(notional / max(lev_used, 1e-12), 2)
 
+                        # Estágio 3: profundidade do book só para quem vai disparar
+                        with METRICS.stage("prefilter"):
+                            depth_ok, depth = prefilter.depth_ok(sym, sig["side"], notional)
+                        if not depth_ok:
+                            if log_each:
+                                print(f"[rej] {sym:12} {tf}m (book raso: ~${depth:,.0f} na faixa)")
+                            if idx == -2:
+                                (rej["LONG"] if sig["side"] == "LONG" else rej["SHORT"])["depth"] += 1
+                            continue
+
                         prefix = "🚀 AI SIGNAL IS READY" if idx == -2 else "⏪ BACKSCAN — AI SIGNAL"
                         msg = (
                             fmt_signal_msg(sym, tf, sig, prefix, symbol_meta, cfg)
@@ -1062,13 +1386,20 @@ def main():
                         )
                         gif_path = cfg.get("signal_ready_gif_path")
                         gif_url = cfg.get("signal_ready_gif_url")
-                        if idx == -2 and (gif_path or gif_url):
-                            send_telegram_animation(cfg, msg, gif_path=gif_path, gif_url=gif_url)
+                        if idx == -2 and CHART is not None:
+                            # gráfico no lugar do GIF genérico: velas + rompimento, zona, SL e TPs
+                            brk = (best["resistance"] + best["buf"]) if sig["side"] == "LONG" else (best["support"] - best["buf"])
+                            dp = (symbol_meta.get(sym) or {}).get("dp", cfg.get("default_price_decimals", 6))
+                            args = chart_args(df, idx, CHART.candles, sym, tf, sig, brk,
+                                              leverage=f"{lev_used:g}x", decimals=int(dp))
+                            send_signal_chart(cfg, msg, args, key=f"sig:{key}")
+                        elif idx == -2 and (gif_path or gif_url):
+                            send_telegram_animation(cfg, msg, gif_path=gif_path, gif_url=gif_url, key=f"sig:{key}")
                         else:
-                            send_telegram(cfg, msg)
+                            send_telegram(cfg, msg, key=f"sig:{key}")
 
                         if idx == -2:
-                            trades[key] = {
+                            trade = {
                                 "symbol": sym,
                                 "tf": tf,
                                 "side": sig["side"],
@@ -1081,9 +1412,13 @@ def main():
                                 "lev": lev_used,
                                 "notional": notional,
                                 "created_at": sig["dt"],
+                                "opened_ms": int(time.time() * 1000),
                                 "updates": [],
                             }
-                            save_trades(cfg["trades_file"], trades)
+                            with trades_lock:
+                                trades[key] = trade
+                                persist_trades([key], kind="open")
+                            monitor.track(key)
 
                         cache.add(key)
                         save_cache(cfg["cache_file"], cache)
@@ -1114,7 +1449,8 @@ def main():
 
             # Resumo
             if cfg.get("debug", True):
-                open_trades = sum(1 for t in trades.values() if t.get("status") not in ("CLOSED_TP3", "STOP"))
+                with trades_lock:
+                    open_trades = sum(1 for t in trades.values() if is_open(t))
                 rej_long = {k: v for k, v in rej["LONG"].items() if v}
                 rej_short = {k: v for k, v in rej["SHORT"].items() if v}
                 dbg(
@@ -1123,229 +1459,43 @@ def main():
                     f"rejLONG={rej_long or {'-': 0}} | rejSHORT={rej_short or {'-': 0}}",
                 )
 
-            # Monitoramento de trades (tempo real)
-            for key, tr in list(trades.items()):
-                if tr["status"] in ("CLOSED_TP3", "STOP"):
-                    continue
-                price = last_price(tr["symbol"], category=cfg.get("category", "linear"))
-                if price is None:
-                    continue
-                side = tr.get("side", "LONG")
-
-                if side == "LONG":
-                    if tr["status"] == "OPEN" and price >= tr["tp1"]:
-                        tr["status"] = "TP1"
-                        tr["sl"] = tr["entry"]
-                        tr["updates"].append({
-                            "ts": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-                            "event": "TP1",
-                            "price": price,
-                        })
-                        send_update(
-                            cfg,
-                            "AI Signals Bot | Trade Update",
-                            f"✅ TP1 hit | {tr['symbol']} {side} on {tr['tf']}m\n"
-                            f"Entry: {tr['entry']}  •  TP1: {tr['tp1']}\n"
-                            f"➡️ Stop movido para BE ({tr['sl']})",
-                        )
-                        try:
-                            send_tp_card(
-                                cfg["telegram"]["bot_token"],
-                                cfg["telegram"]["chat_id"],
-                                {
-                                    "symbol": tr["symbol"],
-                                    "side": side,
-                                    "leverage": f"{tr['lev']}x",
-                                    "tp_label": "TP1",
-                                    "roi_pct": roi_pct(tr["entry"], price, tr["lev"], side),
-                                    "entry": tr["entry"],
-                                    "last": price,
-                                    "stop_text": f"{tr['sl']}",
-                                    "caption": f"{tr['symbol']} | TP1 atingido ✅",
-                                },
-                                bg_path=BG_CARD,
-                            )
-                        except Exception as e:
-                            dbg(cfg, f"card tp1 erro: {e}")
-
-                    elif tr["status"] in ("OPEN", "TP1") and price <= tr["sl"]:
-                        tr["status"] = "STOP"
-                        roi = roi_pct(tr["entry"], price, tr["lev"], side)
-                        tr.update({
-                            "exit_price": price,
-                            "exit_reason": "STOP" if price < tr["entry"] else "BE",
-                            "roi_pct": roi,
-                            "closed_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-                        })
-                        tr["updates"].append({
-                            "ts": tr["closed_at"],
-                            "event": "STOP",
-                            "price": price,
-                            "roi_pct": roi,
-                        })
-                        abl.register_stop(tr["symbol"])  # cooldown
-                        send_update(
-                            cfg,
-                            "Trade Closed",
-                            f"🛑 Stop Loss | {tr['symbol']} {side} on {tr['tf']}m\n"
-                            f"Fill: {price}\nROI (est.): {roi}%",
-                        )
-                    elif tr["status"] in ("OPEN", "TP1") and price >= tr["tp2"]:
-                        if tr["status"] != "TP2":
-                            tr["status"] = "TP2"
-                            tr["updates"].append({
-                                "ts": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-                                "event": "TP2",
-                                "price": price,
-                            })
-                            send_update(
-                                cfg,
-                                "AI Signals Bot | Trade Update",
-                                f"✅ TP2 hit | {tr['symbol']} {side} on {tr['tf']}m\n"
-                                f"TP2: {tr['tp2']}  •  Stop permanece em BE ({tr['sl']})",
-                            )
-                            try:
-                                send_tp_card(
-                                    cfg["telegram"]["bot_token"],
-                                    cfg["telegram"]["chat_id"],
-                                    {
-                                        "symbol": tr["symbol"],
-                                        "side": side,
-                                        "leverage": f"{tr['lev']}x",
-                                        "tp_label": "TP2",
-                                        "roi_pct": roi_pct(tr["entry"], price, tr["lev"], side),
-                                        "entry": tr["entry"],
-                                        "last": price,
-                                        "stop_text": f"{tr['sl']}",
-                                        "caption": f"{tr['symbol']} | TP2 atingido ✅",
-                                    },
-                                    bg_path=BG_CARD,
-                                )
-                            except Exception as e:
-                                dbg(cfg, f"card tp2 erro: {e}")
-
-                    elif tr["status"] in ("TP2", "TP1", "OPEN") and price >= tr["tp3"]:
-                        tr["status"] = "CLOSED_TP3"
-                        roi = roi_pct(tr["entry"], price, tr["lev"], side)
-                        tr.update({
-                            "exit_price": price,
-                            "exit_reason": "TP3",
-                            "roi_pct": roi,
-                            "closed_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-                        })
-                        tr["updates"].append({
-                            "ts": tr["closed_at"],
-                            "event": "TP3",
-                            "price": price,
-                            "roi_pct": roi,
-                        })
-                        send_update(
-                            cfg,
-                            "Trade Closed",
-                            f"🏁 3TP hit — encerrando | {tr['symbol']} {tr['tf']}m\n"
-                            f"Filled: {price}\nROI (est.): {roi}%",
-                        )
-                        try:
-                            send_tp_card(
-                                cfg["telegram"]["bot_token"],
-                                cfg["telegram"]["chat_id"],
-                                {
-                                    "symbol": tr["symbol"],
-                                    "side": side,
-                                    "leverage": f"{tr['lev']}x",
-                                    "tp_label": "TP3",
-                                    "roi_pct": roi_pct(tr["entry"], price, tr["lev"], side),
-                                    "entry": tr["entry"],
-                                    "last": price,
-                                    "stop_text": f"{tr['sl']}",
-                                    "caption": f"{tr['symbol']} | TP3 atingido 🏁",
-                                },
-                                bg_path=BG_CARD,
-                            )
-                        except Exception as e:
-                            dbg(cfg, f"card tp3 erro: {e}")
+            # Monitoramento de trades: thread própria (monitor.threaded) ou inline após o batch
+            if not mon_threaded:
+                with METRICS.stage("monitor"):
+                    monitor.poll_once()
 
-                else:
-                    # SHORT
-                    if tr["status"] == "OPEN" and price <= tr["tp1"]:
-                        tr["status"] = "TP1"
-                        tr["sl"] = tr["entry"]
-                        tr["updates"].append({
-                            "ts": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-                            "event": "TP1",
-                            "price": price,
-                        })
-                        send_update(
-                            cfg,
-                            "AI Signals Bot | Trade Update",
-                            f"✅ TP1 hit | {tr['symbol']} {side} on {tr['tf']}m\n"
-                            f"Entry: {tr['entry']}  •  TP1: {tr['tp1']}\n"
-                            f"➡️ Stop movido para BE ({tr['sl']})",
-                        )
-                    elif tr["status"] in ("OPEN", "TP1") and price >= tr["sl"]:
-                        tr["status"] = "STOP"
-                        roi = roi_pct(tr["entry"], price, tr["lev"], side)
-                        tr.update({
-                            "exit_price": price,
-                            "exit_reason": "STOP" if price > tr["entry"] else "BE",
-                            "roi_pct": roi,
-                            "closed_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-                        })
-                        tr["updates"].append({
-                            "ts": tr["closed_at"],
-                            "event": "STOP",
-                            "price": price,
-                            "roi_pct": roi,
-                        })
-                        abl.register_stop(tr["symbol"])  # cooldown
-                        send_update(
-                            cfg,
-                            "Trade Closed",
-                            f"🛑 Stop Loss | {tr['symbol']} {side} on {tr['tf']}m\n"
-                            f"Fill: {price}\nROI (est.): {roi}%",
-                        )
-                    elif tr["status"] in ("OPEN", "TP1") and price <= tr["tp2"]:
-                        if tr["status"] != "TP2":
-                            tr["status"] = "TP2"
-                            tr["updates"].append({
-                                "ts": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-                                "event": "TP2",
-                                "price": price,
-                            })
-                            send_update(
-                                cfg,
-                                "AI Signals Bot | Trade Update",
-                                f"✅ TP2 hit | {tr['symbol']} {side} on {tr['tf']}m\n"
-                                f"TP2: {tr['tp2']}  •  Stop permanece em BE ({tr['sl']})",
-                            )
-                    elif tr["status"] in ("TP2", "TP1", "OPEN") and price <= tr["tp3"]:
-                        tr["status"] = "CLOSED_TP3"
-                        roi = roi_pct(tr["entry"], price, tr["lev"], side)
-                        tr.update({
-                            "exit_price": price,
-                            "exit_reason": "TP3",
-                            "roi_pct": roi,
-                            "closed_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
-                        })
-                        tr["updates"].append({
-                            "ts": tr["closed_at"],
-                            "event": "TP3",
-                            "price": price,
-                            "roi_pct": roi,
-                        })
-                        send_update(
-                            cfg,
-                            "Trade Closed",
-                            f"🏁 3TP hit — encerrando | {tr['symbol']} {tr['tf']}m\n"
-                            f"Filled: {price}\nROI (est.): {roi}%",
-                        )
+            if store is not None:
+                with trades_lock:
+                    store.flush_export(trades)
+            abl.flush()
+
+            dbg(cfg, prefilter.end_cycle())
 
-                save_trades(cfg["trades_file"], trades)
+            METRICS.end_cycle(extra={
+                "signals": signals_this_cycle,
+                "batch": len(batch),
+                "telegram_queue": OUTBOX.depth() if OUTBOX is not None else 0,
+                "card_queue": CARD_POOL.depth() if CARD_POOL is not None else 0,
+            })
+            dbg(cfg, f"tempos | {METRICS.summary_line()}")
 
             time.sleep(float(cfg.get("poll_seconds", 30)))
 
         except KeyboardInterrupt:
             print("Stopped by user.")
+            monitor.stop()
+            if service is not None:
+                service.stop()
+            if store is not None:
+                with trades_lock:
+                    store.export_json(trades, force=True)
+            abl.flush()
+            if OUTBOX is not None:
+                OUTBOX.stop()  # esvazia a fila antes de sair
+            if CARD_POOL is not None:
+                CARD_POOL.stop()
+            if profiler is not None and profiler.running:
+                print(f"[profiler] stacks em {profiler.stop()}")
             break
         except Exception as e:
             print("Loop error:", e)
@@ -0,0 +1,397 @@
+# moonshot_analytics.py — consultas group-by sobre o histórico de trades fechados
+# - Uma CLI para qualquer combinação de dimensões: symbol, tf, side, profile, status,
+#   exit_reason, hour/weekday/day/month (fechamento, no display_timezone) e open_hour
+#   (abertura), com filtros por período, símbolo, lado, TF, perfil, status e motivo
+# - Lê o moonshot_trade_archive (um .npz por dia, só as colunas usadas) e calcula o PnL
+#   líquido com o pnl_engine (mesmos splits/taxas/slippage do report_pnl)
+# - Cache de agregados parciais por dia em <dir do arquivo>/.cache: a chave é a consulta
+#   (dimensões + filtros + parâmetros de PnL + fuso) e cada dia guarda a versão do
+#   manifest em que foi agregado. Repetir a consulta só lê o cache; com trades novos,
+#   só os dias que mudaram são reagregados. As métricas do cache são todas somáveis
+#   (n, wins, losses, stops, net, gross, fees, R, roi) e as médias/taxas saem no fim
+# - Saída em tabela, CSV ou JSON
+#
+#   python moonshot_analytics.py --by symbol,side --since 2025-09-01 --sort net --top 20
+#   python moonshot_analytics.py --by hour --side LONG --format csv --out por_hora.csv
+#   python moonshot_tools.py analytics --by weekday,tf
+#   (vários perfis/instâncias: --archive data/trades --archive ../Outro/data/trades)
+#
+# YAML opcional (valores padrão):
+#   analytics:
+#     cache: true
+#     archives: []          # arquivos extras somados ao trade_archive.dir (outros perfis)
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    from zoneinfo import ZoneInfo
+except Exception:  # pragma: no cover
+    ZoneInfo = None
+
+import pnl_engine
+from moonshot_trade_archive import TradeArchive
+
+CACHE_FORMAT = 1
+
+DIMENSIONS = ("symbol", "tf", "side", "profile", "status", "exit_reason",
+              "hour", "weekday", "day", "month", "open_hour")
+SUMS = ("n", "wins", "losses", "stops", "net", "gross", "fees", "R", "roi")
+METRICS = ("n", "wins", "losses", "winrate", "stop_rate", "net", "avg_net", "gross", "fees",
+           "R", "avg_R", "avg_roi")
+FILTERS = ("symbol", "side", "tf", "profile", "status", "exit_reason")
+WEEKDAYS = ("seg", "ter", "qua", "qui", "sex", "sáb", "dom")
+
+# colunas do arquivo que o cálculo precisa (nada de ler sl/lev/tpN_ms à toa)
+_READ = ["symbol", "profile", "tf", "side", "status", "exit_reason", "entry", "tp1", "tp2", "tp3",
+         "exit_price", "notional", "roi_pct", "opened_ms", "created_ms", "closed_ms",
+         "tp1_hit", "tp2_hit", "tp3_hit", "tp1_px", "tp2_px", "tp3_px"]
+
+
+def _tz(name: str):
+    if ZoneInfo is None:
+        return "UTC"
+    try:
+        ZoneInfo(name)
+        return name
+    except Exception:
+        return "UTC"
+
+
+# ==============================
+# Tabela por trade (um dia do arquivo)
+# ==============================
+
+def _local(ms: np.ndarray, tz: str) -> pd.Series:
+    ms = pd.Series(np.asarray(ms, dtype=np.int64))
+    return pd.to_datetime(ms.where(ms >= 0), unit="ms", utc=True).dt.tz_convert(tz)  # -1 → NaT
+
+
+def _stamp(local: pd.Series, unit: str) -> np.ndarray:
+    """AAAA-MM-DD / AAAA-MM do horário local; strftime linha a linha é lento (como no pnl_engine)."""
+    naive = local.dt.tz_localize(None).to_numpy()
+    out = np.datetime_as_string(naive, unit=unit).astype(object)
+    out[np.isnat(naive)] = "N/A"
+    return out
+
+
+def trade_frame(cols: Dict[str, np.ndarray], params: dict, tz: str) -> pd.DataFrame:
+    """Uma linha por trade: dimensões + métricas somáveis (PnL líquido via pnl_engine)."""
+    res = pnl_engine.compute(pnl_engine.columns_from_archive(cols), params["splits"], params["fees"], params["slip"])
+    closed = _local(cols["closed_ms"], tz)
+    opened_ms = np.where(cols["opened_ms"] >= 0, cols["opened_ms"], cols["created_ms"])
+    opened = _local(opened_ms, tz)
+    net = res["pnl_net"]
+    df = pd.DataFrame({
+        "symbol": cols["symbol"].astype(object), "tf": cols["tf"].astype(np.int64),
+        "side": cols["side"].astype(object), "profile": cols["profile"].astype(object),
+        "status": cols["status"].astype(object), "exit_reason": cols["exit_reason"].astype(object),
+        "hour": closed.dt.hour.fillna(-1).astype(np.int64).to_numpy(),
+        "weekday": closed.dt.weekday.fillna(-1).astype(np.int64).to_numpy(),
+        "day": _stamp(closed, "D"), "month": _stamp(closed, "M"),
+        "open_hour": opened.dt.hour.fillna(-1).astype(np.int64).to_numpy(),
+        "n": 1, "wins": (net > 0).astype(np.int64), "losses": (net < 0).astype(np.int64),
+        "stops": (cols["status"] == "STOP").astype(np.int64),
+        "net": net, "gross": res["pnl_gross"], "fees": res["fees"], "R": res["pnl_R"],
+        "roi": np.nan_to_num(cols["roi_pct"]),
+    })
+    df["exit_reason"] = df["exit_reason"].replace("", "-")
+    return df
+
+
+def _apply_filters(df: pd.DataFrame, filters: Dict[str, List]) -> pd.DataFrame:
+    for col, vals in filters.items():
+        if vals:
+            df = df[df[col].isin(vals)]
+    return df
+
+
+def _partial(df: pd.DataFrame, dims: Sequence[str]) -> pd.DataFrame:
+    if df.empty:
+        return pd.DataFrame(columns=list(dims) + list(SUMS))
+    if not dims:
+        return df[list(SUMS)].sum().to_frame().T
+    return df.groupby(list(dims), sort=False)[list(SUMS)].sum().reset_index()
+
+
+# ==============================
+# Cache de agregados parciais (por dia do arquivo)
+# ==============================
+
+class AggCache:
+    """
+    JSON por consulta em <root>/.cache/agg_<assinatura>.json:
+      {"query": {...}, "days": {"AAAA-MM-DD": {"v": versão do dia, "rows": [[...], ...]}}}
+    Um dia só é reaproveitado se a versão no manifest for a mesma de quando foi agregado.
+    """
+
+    def __init__(self, root: str, query: dict):
+        self.query = query
+        sig = hashlib.sha1(json.dumps(query, sort_keys=True).encode()).hexdigest()[:16]
+        self.path = os.path.join(root, ".cache", f"agg_{sig}.json")
+        self.days: Dict[str, dict] = {}
+        self.dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("query") == query:
+                self.days = data.get("days", {})
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    def get(self, day: str, version: int) -> Optional[list]:
+        hit = self.days.get(day)
+        return hit["rows"] if hit and hit.get("v") == version else None
+
+    def put(self, day: str, version: int, rows: list) -> None:
+        self.days[day] = {"v": version, "rows": rows}
+        self.dirty = True
+
+    def prune(self, keep: Sequence[str]) -> None:
+        """Dias que sumiram do arquivo saem do cache."""
+        gone = [d for d in self.days if d not in set(keep)]
+        for d in gone:
+            del self.days[d]
+        self.dirty = self.dirty or bool(gone)
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"query": self.query, "days": self.days}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+def _rows(df: pd.DataFrame) -> list:
+    """DataFrame parcial → listas JSON (numpy → tipos Python)."""
+    return [[v.item() if isinstance(v, np.generic) else v for v in r]
+            for r in df.itertuples(index=False, name=None)]
+
+
+# ==============================
+# Consulta
+# ==============================
+
+def query(archives: Sequence[TradeArchive], by: Sequence[str], filters: Optional[Dict[str, List]] = None,
+          since=None, until=None, params: Optional[dict] = None, tz: str = "UTC",
+          use_cache: bool = True, stats: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Agrega os trades fechados de [since, until] (dias UTC do arquivo) por `by`.
+    Devolve um DataFrame com as dimensões + METRICS. `stats` (opcional) recebe
+    days / cached / computed para a linha de diagnóstico da CLI.
+    """
+    dims = list(by)
+    bad = [d for d in dims if d not in DIMENSIONS]
+    if bad:
+        raise ValueError(f"dimensão desconhecida: {', '.join(bad)} (use {', '.join(DIMENSIONS)})")
+    filters = {k: list(v) for k, v in (filters or {}).items() if v}
+    params = params or pnl_engine.pnl_params({})
+    tz = _tz(tz)
+    q = {"format": CACHE_FORMAT, "by": dims, "filters": {k: sorted(map(str, v)) for k, v in filters.items()},
+         "params": params, "tz": tz}
+    if "tf" in filters:
+        filters["tf"] = [int(x) for x in filters["tf"]]
+
+    st = stats if stats is not None else {}
+    st.update(days=0, cached=0, computed=0)
+    rows: List[list] = []
+    cols = dims + list(SUMS)
+    for arc in archives:
+        man_days = arc.manifest().get("days", {})
+        cache = AggCache(arc.root, q) if use_cache else None
+        missing: Dict[str, int] = {}
+        for day in arc._select(since, until):
+            version = int(man_days.get(day, {}).get("version", 0))
+            st["days"] += 1
+            hit = cache.get(day, version) if cache else None
+            if hit is None:
+                missing[day] = version
+            else:
+                rows += hit
+                st["cached"] += 1
+        if missing:
+            # dias fora do cache num passe só (um compute/groupby para todos, não um por dia)
+            loaded = [arc._load_day(d, _READ) for d in missing]
+            data = {c: np.concatenate([x[c] for x in loaded]) for c in _READ}
+            df = trade_frame(data, params, tz)
+            df["_aday"] = np.repeat(list(missing), [len(x["closed_ms"]) for x in loaded])
+            df = _apply_filters(df, filters)
+            part = _partial(df, ["_aday"] + dims)
+            per_day: Dict[str, list] = {d: [] for d in missing}
+            for r in _rows(part[["_aday"] + cols]):
+                per_day[r[0]].append(r[1:])
+            for d, v in missing.items():
+                rows += per_day[d]
+                if cache:
+                    cache.put(d, v, per_day[d])
+            st["computed"] += len(missing)
+        if cache:
+            cache.prune(list(man_days))
+            cache.save()
+
+    if not rows:
+        return pd.DataFrame(columns=dims + list(METRICS))
+    allp = pd.DataFrame(rows, columns=cols)
+    out = allp.groupby(dims, sort=True)[list(SUMS)].sum().reset_index() if dims else allp[list(SUMS)].sum().to_frame().T
+    for c in ("n", "wins", "losses", "stops"):
+        out[c] = out[c].astype(np.int64)
+    n = out["n"].clip(lower=1)
+    out["winrate"] = out["wins"] / n * 100.0
+    out["stop_rate"] = out["stops"] / n * 100.0
+    out["avg_net"] = out["net"] / n
+    out["avg_R"] = out["R"] / n
+    out["avg_roi"] = out["roi"] / n
+    if "weekday" in out:
+        out["weekday"] = [f"{w}-{WEEKDAYS[w]}" if 0 <= w < 7 else "N/A" for w in out["weekday"].astype(int)]
+    for c in ("hour", "open_hour"):
+        if c in out:
+            out[c] = [int(h) if h >= 0 else "N/A" for h in out[c]]
+    return out[dims + list(METRICS)]
+
+
+# ==============================
+# Saída
+# ==============================
+
+def _fmt(v, col: str) -> str:
+    if isinstance(v, (float, np.floating)):
+        if col in ("winrate", "stop_rate"):
+            return f"{v:.1f}%"
+        if col in ("avg_R", "R"):
+            return f"{v:+.2f}"
+        return f"{v:+.2f}" if col in ("net", "avg_net", "gross", "avg_roi") else f"{v:.2f}"
+    return str(v)
+
+
+def render(df: pd.DataFrame, fmt: str = "table") -> str:
+    if fmt == "json":
+        return json.dumps(json.loads(df.to_json(orient="records")), ensure_ascii=False, indent=1)
+    if fmt == "csv":
+        buf = io.StringIO()
+        df.to_csv(buf, index=False, quoting=csv.QUOTE_MINIMAL, float_format="%.6f")
+        return buf.getvalue()
+    headers = list(df.columns)
+    rows = [[_fmt(v, c) for v, c in zip(r, headers)] for r in df.itertuples(index=False, name=None)]
+    widths = [max([len(h)] + [len(r[i]) for r in rows]) for i, h in enumerate(headers)]
+    line = " | ".join("{:<" + str(w) + "}" for w in widths)
+    out = [line.format(*headers), "-+-".join("-" * w for w in widths)]
+    out += [line.format(*r) for r in rows]
+    return "\n".join(out)
+
+
+# ==============================
+# CLI
+# ==============================
+
+def _load_cfg(path: str) -> dict:
+    import yaml
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return {}
+
+
+def _csv_arg(vals: Optional[List[str]]) -> List[str]:
+    out: List[str] = []
+    for v in vals or []:
+        out += [x.strip() for x in str(v).split(",") if x.strip()]
+    return out
+
+
+def build_parser(prog: Optional[str] = None) -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog=prog, description="Consultas group-by no histórico de trades fechados")
+    ap.add_argument("--cfg", default="moonshot_config.yaml")
+    ap.add_argument("--by", action="append", default=None,
+                    help=f"dimensões separadas por vírgula ({', '.join(DIMENSIONS)}); vazio = total")
+    ap.add_argument("--since", default=None, help="AAAA-MM-DD (dia UTC do fechamento)")
+    ap.add_argument("--until", default=None, help="AAAA-MM-DD (inclusive)")
+    ap.add_argument("--days", type=int, default=None, help="últimos N dias (alternativa ao --since)")
+    for f in FILTERS:
+        ap.add_argument(f"--{f.replace('_', '-')}", dest=f, action="append", default=None,
+                        help=f"filtra {f} (repetível ou separado por vírgula)")
+    ap.add_argument("--min-n", type=int, default=1, help="esconde grupos com menos trades")
+    ap.add_argument("--sort", default=None, help=f"métrica/dimensão para ordenar ({', '.join(METRICS)})")
+    ap.add_argument("--asc", action="store_true", help="ordem crescente (padrão: decrescente p/ métricas)")
+    ap.add_argument("--top", type=int, default=None, help="só as N primeiras linhas")
+    ap.add_argument("--format", choices=("table", "csv", "json"), default="table")
+    ap.add_argument("--out", default=None, help="grava a saída no arquivo em vez do stdout")
+    ap.add_argument("--archive", action="append", default=None,
+                    help="pasta do trade_archive (repetível; padrão: trade_archive.dir + analytics.archives)")
+    ap.add_argument("--tz", default=None, help="fuso de hour/weekday/day (padrão: display_timezone)")
+    ap.add_argument("--no-cache", action="store_true", help="recalcula tudo sem ler/gravar o cache")
+    return ap
+
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None) -> int:
+    args = build_parser(prog).parse_args(argv)
+    cfg = _load_cfg(args.cfg)
+    ac = cfg.get("analytics") or {}
+
+    roots = args.archive or [(cfg.get("trade_archive") or {}).get("dir", "data/trades")] + list(ac.get("archives") or [])
+    archives = [TradeArchive(r) for r in roots if os.path.isdir(r)]
+    if not archives:
+        print(f"Nenhum arquivo de trades em {', '.join(roots)} (rode: python moonshot_trade_archive.py backfill)",
+              file=sys.stderr)
+        return 1
+
+    since = args.since
+    if args.days and not since:
+        since = pd.Timestamp.utcnow().normalize() - pd.Timedelta(days=args.days - 1)
+        since = since.strftime("%Y-%m-%d")
+
+    by = _csv_arg(args.by)
+    filters = {f: _csv_arg(getattr(args, f)) for f in FILTERS}
+    filters["side"] = [s.upper() for s in filters["side"]]
+    filters["symbol"] = [s.upper() for s in filters["symbol"]]
+    tz = args.tz or cfg.get("display_timezone", "UTC")
+    use_cache = bool(ac.get("cache", True)) and not args.no_cache
+
+    t0 = time.perf_counter()
+    st: dict = {}
+    try:
+        df = query(archives, by, filters, since, args.until, pnl_engine.pnl_params(cfg), tz, use_cache, st)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    elapsed = (time.perf_counter() - t0) * 1000.0
+
+    if args.min_n > 1 and not df.empty:
+        df = df[df["n"] >= args.min_n]
+    if args.sort:
+        if args.sort not in df.columns:
+            print(f"--sort inválido: {args.sort}", file=sys.stderr)
+            return 2
+        df = df.sort_values(args.sort, ascending=args.asc or args.sort in by, kind="stable")
+    if args.top:
+        df = df.head(args.top)
+
+    text = render(df.reset_index(drop=True), args.format)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8", newline="") as f:
+            f.write(text if text.endswith("\n") else text + "\n")
+    else:
+        print(text)
+    if args.format == "table" or args.out:
+        print(f"\n{len(df)} grupo(s) | {st['days']} dia(s): {st['cached']} do cache, {st['computed']} calculado(s) "
+              f"| {elapsed:.0f} ms | fuso {_tz(tz)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,6 +3,8 @@ import json, os, yaml
 from datetime import datetime
 import pandas as pd
 
+from moonshot_trade_store import db_path_from_cfg, read_trades
+
 CFG_FILE = "moonshot_config.yaml"
 
 def load_cfg(path=CFG_FILE):
@@ -28,12 +30,12 @@ def main():
     out_json = cfg.get("audit",{}).get("out_json", "moonshot_audit.json")
     out_txt = cfg.get("audit",{}).get("out_txt", "moonshot_audit_summary.txt")
 
-    if not os.path.exists(trades_path):
+    db_path = db_path_from_cfg(cfg)
+    if not os.path.exists(trades_path) and not (db_path and os.path.exists(db_path)):
         print(f"Nenhum arquivo de trades encontrado: {trades_path}")
         return
 
-    with open(trades_path,"r") as f:
-        trades = json.load(f)
+    trades = read_trades(trades_path, db_path)
 
     rows = []
     for key, tr in trades.items():
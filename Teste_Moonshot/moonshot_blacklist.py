@@ -1,11 +1,13 @@
 # moonshot_blacklist.py
 from __future__ import annotations
 
+import heapq
 import json
 import os
+import sqlite3
 import time
 from dataclasses import dataclass, asdict
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List
 
 import numpy as np
 import pandas as pd
@@ -44,6 +46,30 @@ class AutoBlacklist:
       - wick_lookback_15, max_wick_pct_avg_15m (em %), min_body_frac_15m (0..1)
       - cooldown_hours_* (new_listing, iliq, volatility, wick)
       - stop_strikes_for_cooldown, cooldown_hours_on_strikes
+
+    Persistência:
+      - padrão (CLI): cada alteração grava o JSON na hora (tmp+replace).
+      - write_behind=True (agente): alterações só marcam o estado como sujo;
+        `flush()` grava uma vez (chamar ao fim de cada ciclo e no shutdown).
+
+    Expiração:
+      - heap de expirações (until, símbolo): bans vencidos saem em O(log n) quando
+        `poll()` roda (is_blocked chama poll; custo O(1) se nada venceu).
+      - `_blocked` é o conjunto já calculado dos bloqueados agora (O(1) por consulta);
+        muda só em ban/unban/expiração.
+      - `add_listener(on_unban=..., on_ban=...)`: avisos por símbolo, p/ o agente
+        devolver ao scan quem saiu do cooldown. A expiração só desbloqueia (mantém
+        os strikes); `cleanup()` é quem remove as entradas vencidas.
+
+    Compartilhamento entre processos (shared_db):
+      - SQLite (WAL) com contador global de versão; cada linha guarda a versão em
+        que mudou (remoções viram tombstones).
+      - `sync()` lê só as linhas com versão > última vista (no máx. 1x/s, chamado
+        por poll/is_blocked): um ban manual do moonshot_tools vale no agente na
+        próxima checagem, sem reiniciar e sem recarregar o arquivo inteiro.
+      - `flush()` grava só as linhas alteradas localmente; alterações locais ainda
+        não gravadas têm precedência sobre as remotas.
+      - O JSON continua sendo gravado no flush, como snapshot legível.
     """
 
     def __init__(
@@ -52,13 +78,32 @@ class AutoBlacklist:
         rules: dict,
         hard_denylist: List[str] | None = None,
         enabled: bool = True,
+        write_behind: bool = False,
+        shared_db: Optional[str] = None,
+        sync_interval: float = 1.0,
     ):
         self.path = path or "moonshot_blacklist.json"
         self.rules = rules or {}
         self.enabled = bool(enabled)
         self.hard_denylist = set(s.upper().strip() for s in (hard_denylist or []))
         self.db: Dict[str, Entry] = {}
+        self.write_behind = bool(write_behind)
+        self._dirty = False
+        self._heap: List[tuple[float, str]] = []
+        self._blocked: Dict[str, str] = {}          # símbolo -> motivo (bans dinâmicos ativos)
+        self._on_unban: List[Callable[[str], None]] = []
+        self._on_ban: List[Callable[[str], None]] = []
+        self._dirty_rows: set = set()
+        self._sql: Optional[sqlite3.Connection] = None
+        self._version = 0
+        self.sync_interval = float(sync_interval)
+        self._last_sync = 0.0
         self._load()
+        if shared_db:
+            self._open_shared(shared_db)
+        self._reindex()
+        if not self.write_behind:
+            self.flush()
 
     # ---------- Persistência ----------
     def _normalize_payload(self, raw):
@@ -131,6 +176,7 @@ class AutoBlacklist:
                 raw = json.load(f)
 
             payload = self._normalize_payload(raw)
+            legacy = not (isinstance(raw, dict) and isinstance(raw.get("entries"), dict))
             self.db = {}
             for s, e in (payload.get("entries") or {}).items():
                 # saneamento mínimo
@@ -144,8 +190,9 @@ class AutoBlacklist:
                 }
                 self.db[s] = Entry(**e)
 
-            # Regrava já no formato novo se veio legado
-            self._save()
+            # Formato legado: regravado no novo formato no próximo flush
+            if legacy:
+                self._dirty = True
 
         except FileNotFoundError:
             self.db = {}
@@ -168,6 +215,182 @@ class AutoBlacklist:
             json.dump(payload, f, indent=2)
         os.replace(tmp, self.path)
 
+    def _changed(self, *symbols: str):
+        self._dirty = True
+        self._dirty_rows.update(symbols)
+        if not self.write_behind:
+            self.flush()
+
+    # ---------- Backend compartilhado (SQLite) ----------
+    def _open_shared(self, db_path: str):
+        con = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        with con:
+            con.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS bl_entries (
+                    symbol TEXT PRIMARY KEY, reason TEXT, until REAL, strikes INTEGER,
+                    first_seen REAL, last_updated REAL, deleted INTEGER NOT NULL DEFAULT 0,
+                    version INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_bl_version ON bl_entries(version);
+                CREATE TABLE IF NOT EXISTS bl_meta (k TEXT PRIMARY KEY, v INTEGER);
+                INSERT OR IGNORE INTO bl_meta(k, v) VALUES ('version', 0);
+                """
+            )
+        self._sql = con
+        if con.execute("SELECT v FROM bl_meta WHERE k='version'").fetchone()[0] == 0:
+            # banco novo: importa o que veio do JSON
+            self._dirty_rows.update(self.db)
+            self._dirty = self._dirty or bool(self.db)
+            if not self.write_behind:
+                self._write_rows()
+        else:
+            # banco é a fonte da verdade; o JSON local é só snapshot
+            self.db = {}
+            self._dirty = False
+        self.sync(force=True)
+
+    def _write_rows(self):
+        if self._sql is None or not self._dirty_rows:
+            return
+        rows = list(self._dirty_rows)
+        with self._sql:
+            self._sql.execute("BEGIN IMMEDIATE")
+            v = self._sql.execute("SELECT v FROM bl_meta WHERE k='version'").fetchone()[0] + 1
+            self._sql.execute("UPDATE bl_meta SET v=? WHERE k='version'", (v,))
+            for s in rows:
+                e = self.db.get(s)
+                if e is None:
+                    self._sql.execute(
+                        "INSERT INTO bl_entries(symbol, deleted, version) VALUES (?, 1, ?) "
+                        "ON CONFLICT(symbol) DO UPDATE SET deleted=1, version=excluded.version",
+                        (s, v),
+                    )
+                else:
+                    self._sql.execute(
+                        "INSERT OR REPLACE INTO bl_entries"
+                        "(symbol, reason, until, strikes, first_seen, last_updated, deleted, version) "
+                        "VALUES (?, ?, ?, ?, ?, ?, 0, ?)",
+                        (s, e.reason, e.until, e.strikes, e.first_seen, e.last_updated, v),
+                    )
+        self._dirty_rows.clear()
+
+    def sync(self, force: bool = False) -> int:
+        """Aplica as linhas alteradas por outros processos desde a última versão vista."""
+        if self._sql is None:
+            return 0
+        t = time.monotonic()
+        if not force and t - self._last_sync < self.sync_interval:
+            return 0
+        self._last_sync = t
+        rows = self._sql.execute(
+            "SELECT symbol, reason, until, strikes, first_seen, last_updated, deleted, version "
+            "FROM bl_entries WHERE version > ? ORDER BY version", (self._version,)
+        ).fetchall()
+        now = self._now()
+        n = 0
+        for sym, reason, until, strikes, first_seen, last_updated, deleted, version in rows:
+            self._version = max(self._version, int(version))
+            if sym in self._dirty_rows:
+                continue  # alteração local pendente vence
+            if deleted:
+                if sym in self.db:
+                    self._drop(sym)
+                    n += 1
+                continue
+            e = Entry(symbol=sym, reason=reason, until=until, strikes=int(strikes or 0),
+                      first_seen=first_seen, last_updated=last_updated)
+            if self.db.get(sym) != e:
+                self._put(sym, e, now)
+                n += 1
+        return n
+
+    # ---------- Índice de bloqueados / heap de expirações ----------
+    def _reindex(self, now: Optional[float] = None):
+        now = now or self._now()
+        prev = getattr(self, "_blocked", None) or {}
+        self._blocked = {}
+        self._heap = []
+        for s, e in self.db.items():
+            if e.until is None or now < e.until:
+                self._blocked[s] = e.reason
+                if e.until is not None:
+                    self._heap.append((float(e.until), s))
+        heapq.heapify(self._heap)
+        # bans vencidos que o poll() ainda não tinha liberado: avisa os listeners aqui
+        for s in prev:
+            if s not in self._blocked:
+                self._fire(self._on_unban, s)
+
+    def _fire(self, listeners, symbol: str):
+        for fn in listeners:
+            try:
+                fn(symbol)
+            except Exception as ex:
+                print(f"[blacklist] listener erro {symbol}: {ex}")
+
+    def _put(self, s: str, entry: Entry, now: float):
+        """Grava a entrada no db e atualiza bloqueados/heap (sem persistir)."""
+        self.db[s] = entry
+        was = s in self._blocked
+        if entry.until is None or now < entry.until:
+            self._blocked[s] = entry.reason
+            if entry.until is not None:
+                heapq.heappush(self._heap, (float(entry.until), s))
+                if len(self._heap) > 2 * len(self.db) + 64:
+                    self._reindex(now)  # compacta itens obsoletos
+            if not was:
+                self._fire(self._on_ban, s)
+        elif was:
+            self._blocked.pop(s, None)
+            self._fire(self._on_unban, s)
+
+    def _drop(self, s: str):
+        self.db.pop(s, None)
+        if self._blocked.pop(s, None) is not None:
+            self._fire(self._on_unban, s)
+
+    def add_listener(self, on_unban: Optional[Callable[[str], None]] = None,
+                     on_ban: Optional[Callable[[str], None]] = None):
+        if on_unban is not None:
+            self._on_unban.append(on_unban)
+        if on_ban is not None:
+            self._on_ban.append(on_ban)
+
+    def poll(self, now: Optional[float] = None) -> List[str]:
+        """Libera os bans cujo `until` já passou; retorna os símbolos liberados."""
+        now = now or self._now()
+        self.sync()
+        released = []
+        while self._heap and self._heap[0][0] <= now:
+            until, s = heapq.heappop(self._heap)
+            e = self.db.get(s)
+            if e is None or e.until is None or float(e.until) != until or s not in self._blocked:
+                continue  # item obsoleto (ban renovado/removido depois)
+            self._blocked.pop(s, None)
+            released.append(s)
+        for s in released:
+            self._fire(self._on_unban, s)
+        return released
+
+    def blocked_symbols(self) -> set:
+        self.poll()
+        return set(self._blocked) | self.hard_denylist
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def flush(self) -> bool:
+        """Grava se houver alterações pendentes. Retorna True se gravou."""
+        if not self._dirty:
+            return False
+        self._write_rows()
+        self._save()
+        self._dirty = False
+        return True
+
     # ---------- Utilidades ----------
     @staticmethod
     def _now() -> float:
@@ -176,13 +399,14 @@ class AutoBlacklist:
     def cleanup(self, now: Optional[float] = None) -> List[str]:
         """Remove bans expirados."""
         now = now or self._now()
+        self.poll(now)
         removed = []
         for s, e in list(self.db.items()):
             if e.until is not None and now >= e.until:
                 removed.append(s)
-                self.db.pop(s, None)
+                self._drop(s)
         if removed:
-            self._save()
+            self._changed(*removed)
         return removed
 
     # ---------- API principal ----------
@@ -190,19 +414,19 @@ class AutoBlacklist:
         s = symbol.upper()
         if s in self.hard_denylist:
             return True, "hard_denylist"
-        e = self.db.get(s)
-        if not e:
-            return False, ""
-        if e.until is None:
-            return True, e.reason  # permaban
-        now = now or self._now()
-        if now < e.until:
-            return True, e.reason
+        self.poll(now)
+        reason = self._blocked.get(s)
+        if reason is not None:
+            return True, reason
         return False, ""
 
     def ban_temp(self, symbol: str, hours: float, reason: str, strikes_inc: int = 0):
         if not self.enabled:
             return
+        self._set_temp(symbol, hours, reason, strikes_inc)
+        self._changed(symbol.upper())
+
+    def _set_temp(self, symbol: str, hours: float, reason: str, strikes_inc: int = 0):
         s = symbol.upper()
         now = self._now()
         until = now + float(hours) * 3600.0
@@ -216,8 +440,7 @@ class AutoBlacklist:
             first_seen=(old.first_seen if old and old.first_seen else now),
             last_updated=now,
         )
-        self.db[s] = entry
-        self._save()
+        self._put(s, entry, now)
 
     def ban_perm(self, symbol: str, reason: str = "permanent"):
         if not self.enabled:
@@ -233,14 +456,14 @@ class AutoBlacklist:
             first_seen=(old.first_seen if old and old.first_seen else now),
             last_updated=now,
         )
-        self.db[s] = entry
-        self._save()
+        self._put(s, entry, now)
+        self._changed(s)
 
     def unban(self, symbol: str):
         s = symbol.upper()
         if s in self.db:
-            self.db.pop(s, None)
-            self._save()
+            self._drop(s)
+            self._changed(s)
 
     def register_stop(self, symbol: str, now: Optional[float] = None):
         """
@@ -250,20 +473,43 @@ class AutoBlacklist:
         s = symbol.upper()
         e = self.db.get(s)
         strikes = (e.strikes if e else 0) + 1
-        self.db[s] = Entry(
+        self._put(s, Entry(
             symbol=s,
             reason="strike",
             until=(e.until if e else now),
             strikes=strikes,
             first_seen=(e.first_seen if e and e.first_seen else now),
             last_updated=now,
-        )
-        self._save()
+        ), now)
 
         thr = int(self.rules.get("stop_strikes_for_cooldown", 2))
         cd_hours = float(self.rules.get("cooldown_hours_on_strikes", 6))
-        if strikes >= thr:
-            self.ban_temp(s, cd_hours, f"{strikes} SL strikes (cooldown)")
+        if strikes >= thr and self.enabled:
+            self._set_temp(s, cd_hours, f"{strikes} SL strikes (cooldown)")
+        self._changed(s)  # uma gravação só (strike + eventual cooldown)
+
+    # ---------- Regra automática só com o ticker (sem velas) ----------
+    def auto_from_ticker(self, symbol: str, ticker: Optional[dict]) -> Optional[str]:
+        """
+        Mesma regra de liquidez do auto_from_candles, mas só com ticker.turnover24h —
+        permite banir ILLQ antes de baixar qualquer vela. Retorna o motivo ou None.
+        """
+        if not self.enabled or not ticker:
+            return None
+        s = symbol.upper()
+        if s in set(x.upper() for x in self.rules.get("exempt_from_illq_symbols", [])):
+            return None
+        try:
+            vq = float(ticker.get("turnover24h") or 0.0)
+        except (TypeError, ValueError):
+            return None
+        if vq <= 0.0:
+            return None  # sem dado confiável: deixa para o fallback por velas
+        min_vq = float(self.rules.get("min_quote_vol_24h", 1_500_000))
+        if vq < min_vq:
+            self.ban_temp(symbol, float(self.rules.get("cooldown_hours_iliquid", 24)), f"ILLQ v24h≈{vq:,.0f}")
+            return "ILLQ_24h"
+        return None
 
     # ---------- Regras automáticas por candles ----------
     def auto_from_candles(
@@ -376,6 +622,29 @@ class AutoBlacklist:
         return None
 
 
+def blacklist_from_cfg(cfg: dict, write_behind: bool = False) -> AutoBlacklist:
+    """
+    AutoBlacklist a partir da seção `blacklist` do YAML (agente e moonshot_tools usam o mesmo backend).
+
+    YAML opcional (valores padrão):
+      blacklist:
+        shared_db: <file sem extensão>.db   # vazio/null => só JSON (sem compartilhamento)
+        sync_interval_sec: 1
+    """
+    bl = (cfg.get("blacklist") or {})
+    path = bl.get("file", cfg.get("blacklist_file", "moonshot_blacklist.json"))
+    shared = bl.get("shared_db", os.path.splitext(path)[0] + ".db")
+    return AutoBlacklist(
+        path=path,
+        rules=bl.get("rules", {}),
+        hard_denylist=(bl.get("hard_denylist") or cfg.get("denylist") or []),
+        enabled=bl.get("enabled", True),
+        write_behind=write_behind,
+        shared_db=shared or None,
+        sync_interval=float(bl.get("sync_interval_sec", 1.0)),
+    )
+
+
 # --------- Helpers técnicos ---------
 def _atr_percent(df: pd.DataFrame, n: int = 14) -> float:
     c = df["close"].astype(float)
@@ -1,7 +1,33 @@
 # moonshot_card.py — cards com ÍCONES (TP/STOP)
+# - CardRenderer: fundo, fontes (arquivo, tamanho) e ícones redimensionados são
+#   carregados uma vez e ficam num LRU; cada card é desenhado numa cópia do fundo
+# - generate_trade_card/generate_stop_card continuam com a mesma assinatura e usam
+#   um renderer padrão do módulo
+# - Benchmark: bench_cards.py (ms/card e alocações, com e sem cache)
+# - encode_card(): card → bytes em memória (upload direto, sem arquivo temporário)
+# - CardArchive: cópia opcional em disco, nomes únicos e retenção (idade/quantidade)
+# - Templates em camadas: a parte estática de cada (fundo, tipo, rótulo) é composta
+#   uma vez; por card só o texto dinâmico. Codificação configurável (png/png8/jpeg/webp)
+#
+# YAML opcional (valores padrão):
+#   cards:
+#     layered: true
+#     encoding: png            # png | png8 | jpeg | webp
+#     quality: 85              # jpeg/webp
+#     archive:
+#       enabled: false
+#       dir: out/cards
+#       keep_days: 7
+#       max_files: 500
 from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
 from pathlib import Path
+import io
+import itertools
+import os
 import platform
+import threading
+import time
 
 # ====== CONTROLES DE LAYOUT (mesmos do TP) ======
 PILL_Y_OFFSET     = +26
@@ -21,7 +47,7 @@ GREEN=(42,214,95,255)
 RED=(234,69,53,255)
 PILL_LONG=(29,132,86,255); PILL_SHORT=(200,40,40,255)
 
-def _tt(pref_path, size, **kw):
+def _font_candidates(pref_path):
     sys = platform.system()
     candidates = [pref_path]
     if sys == "Darwin":
@@ -42,7 +68,10 @@ def _tt(pref_path, size, **kw):
             "C:/Windows/Fonts/arial.ttf",
             "C:/Windows/Fonts/segoeui.ttf",
         ]
-    for c in candidates:
+    return candidates
+
+def _tt(pref_path, size, **kw):
+    for c in _font_candidates(pref_path):
         try:
             return ImageFont.truetype(str(c), size=size, **kw)
         except Exception:
@@ -58,16 +87,19 @@ def _load_icon(name: str, size: int):
             return im
     return None
 
-def _common_fonts(k: float):
-    f_title = _tt(F_BOLD, int(46*k))
-    f_pill  = _tt(F_REG,  int(25*k))
-    f_small = _tt(F_REG,  int(18*k))
-    f_big   = _tt(F_BOLD, int(86*k))
-    f_num   = _tt(F_BOLD, int(38*k))
-    f_stopv = _tt(F_BOLD, int(38*k*STOP_VALUE_SCALE))
-    f_tp    = _tt(F_BOLD, int(30*k))
+def _fonts_with(tt, k: float):
+    f_title = tt(F_BOLD, int(46*k))
+    f_pill  = tt(F_REG,  int(25*k))
+    f_small = tt(F_REG,  int(18*k))
+    f_big   = tt(F_BOLD, int(86*k))
+    f_num   = tt(F_BOLD, int(38*k))
+    f_stopv = tt(F_BOLD, int(38*k*STOP_VALUE_SCALE))
+    f_tp    = tt(F_BOLD, int(30*k))
     return f_title, f_pill, f_small, f_big, f_num, f_stopv, f_tp
 
+def _common_fonts(k: float):
+    return _fonts_with(_tt, k)
+
 def _grid(W: int):
     k = W/936.0
     left   = int(63*k)
@@ -93,6 +125,303 @@ def _draw_pill(draw, k, left, y_sym, symbol, side, leverage, f_title, f_pill):
     ty = y_pill + (pill_h - f_pill.size)//2
     draw.text((tx,ty), pill_txt, font=f_pill, fill=(220,245,235,255))
 
+class CardRenderer:
+    """
+    Renderizador com cache. Cada fundo (caminho, mtime), fonte (arquivo, tamanho),
+    conjunto de fontes por largura do fundo e ícone (nome, tamanho) é carregado uma
+    vez e mantido num LRU; o card é desenhado numa cópia do fundo em cache.
+    cache_size=0 desliga o cache (comportamento antigo; usado no benchmark).
+
+    layered=True: as camadas estáticas de cada (fundo, tipo, rótulo) — cabeçalho com
+    ícone, rótulos "Entry Price"/..., ícone + prefixo da linha de stop — são compostas
+    uma vez (template); por card só entram símbolo, pill, ROI, preços e stop.
+    O pill depende da largura do símbolo, então fica na parte dinâmica.
+
+    encoding: "png" | "png8" (paleta, bem menor) | "jpeg" | "webp"; quality vale
+    para jpeg/webp. Ver encode().
+    """
+
+    def __init__(self, cache_size: int = 32, layered: bool = True, encoding: str = "png", quality: int = 85):
+        n = max(0, int(cache_size))
+        self._bg = lru_cache(maxsize=n)(self._load_bg)
+        self._font = lru_cache(maxsize=n * 4)(self._load_font)
+        self._font_path = lru_cache(maxsize=n)(self._resolve_font)
+        self._fonts = lru_cache(maxsize=n)(self._load_fonts)
+        self._icon = lru_cache(maxsize=n)(_load_icon)
+        self._tpl = lru_cache(maxsize=n)(self._build_template)
+        self.layered = bool(layered)
+        self.encoding = (encoding or "png").lower()
+        self.quality = int(quality)
+
+    # ---------- recursos ----------
+    @staticmethod
+    def _load_bg(path: str, mtime_ns: int):
+        with Image.open(path) as src:
+            return src.convert("RGBA")
+
+    def background(self, path) -> Image.Image:
+        """Cópia do fundo (RGBA) pronta para desenhar; o arquivo é relido só se mudar."""
+        path = str(path)
+        return self._bg(path, os.stat(path).st_mtime_ns).copy()
+
+    @staticmethod
+    def _resolve_font(pref_path: str):
+        # sonda a lista de fallback uma vez por arquivo preferido
+        for c in _font_candidates(pref_path):
+            try:
+                ImageFont.truetype(str(c), size=12)
+                return str(c)
+            except Exception:
+                continue
+        return None
+
+    def _load_font(self, pref_path: str, size: int):
+        path = self._font_path(pref_path)
+        return ImageFont.truetype(path, size=size) if path else ImageFont.load_default()
+
+    def font(self, pref_path, size: int):
+        return self._font(str(pref_path), int(size))
+
+    def _load_fonts(self, W: int):
+        return _fonts_with(self.font, W/936.0)
+
+    def fonts(self, W: int):
+        """As sete fontes do layout para um fundo de largura W."""
+        return self._fonts(int(W))
+
+    def icon(self, name: str, size: int):
+        return self._icon(name, int(size))
+
+    def cache_info(self) -> dict:
+        return {n: getattr(self, "_" + n).cache_info()._asdict() for n in ("bg", "font", "fonts", "icon", "tpl")}
+
+    # ---------- camadas estáticas ----------
+    def _build_template(self, kind: str, path: str, mtime_ns: int, label: str, with_stop: bool):
+        """Fundo + tudo que não muda entre cards do mesmo tipo; devolve (imagem, x do valor do stop)."""
+        im = self._bg(path, mtime_ns).copy()
+        W,H = im.size
+        draw = ImageDraw.Draw(im)
+        k, left, y_sym, y_hdr, y_roi, y_lab, y_val, y_stop = _grid(W)
+        f_title, f_pill, f_small, f_big, f_num, f_stopv, f_tp = self.fonts(W)
+
+        if kind == "trade":
+            # ROI header + ícone
+            icon_t = self.icon("target.png", int(32*k))
+            x = left
+            draw.text((x, y_hdr), "ROI ", font=f_pill, fill=DIM)
+            x += int(draw.textlength("ROI ", font=f_pill))
+            if icon_t:
+                im.paste(icon_t, (x, y_hdr + (f_pill.size - icon_t.size[1])//2 - int(4*k)), icon_t)
+                x += icon_t.size[0] + int(8*k)
+            draw.text((x, y_hdr), f"{label}", font=f_tp, fill=WHITE)
+            col2_label, prefix = "Last Traded Price", "Stop movido para: "
+        else:
+            # Header "STOP LOSS" com ícone
+            icon_s = self.icon("stop.png", int(30*k))
+            x = left
+            if icon_s:
+                im.paste(icon_s, (x, y_hdr + (f_pill.size - icon_s.size[1])//2 - int(2*k)), icon_s)
+                x += icon_s.size[0] + int(8*k)
+            draw.text((x, y_hdr), "STOP LOSS", font=f_tp, fill=WHITE)
+            col2_label, prefix = "Filled Price", "Stop (SL): "
+
+        # labels
+        col2 = left + int(248*k)
+        draw.text((left, y_lab), "Entry Price", font=f_small, fill=DIM)
+        draw.text((col2,  y_lab), col2_label, font=f_small, fill=DIM)
+
+        # linha de stop: ícone + prefixo (o valor é dinâmico)
+        off = None
+        if with_stop:
+            icon_a = self.icon("arrow.png", int(38*k))
+            x = left
+            if icon_a:
+                im.paste(icon_a, (x, y_stop + (f_pill.size - icon_a.size[1])//2 - int(1*k)), icon_a)
+                x += icon_a.size[0] + int(6*k)
+            draw.text((x, y_stop), prefix, font=f_pill, fill=WHITE)
+            off = x + int(draw.textlength(prefix, font=f_pill))
+        return im, off
+
+    def template(self, kind: str, bg_path, label: str = "", with_stop: bool = True):
+        """Cópia do template (kind "trade"/"stop") + x do valor do stop."""
+        path = str(bg_path)
+        mtime_ns = os.stat(path).st_mtime_ns
+        if not self.layered:
+            return self._build_template(kind, path, mtime_ns, label, with_stop)
+        im, off = self._tpl(kind, path, mtime_ns, label, with_stop)
+        return im.copy(), off
+
+    # ---------- cards ----------
+    def _dynamic(self, im, symbol, side, leverage, roi_txt, roi_fill, v1, v2, stop_txt, off):
+        W,H = im.size
+        draw = ImageDraw.Draw(im)
+        k, left, y_sym, y_hdr, y_roi, y_lab, y_val, y_stop = _grid(W)
+        f_title, f_pill, f_small, f_big, f_num, f_stopv, f_tp = self.fonts(W)
+
+        # SYMBOL
+        draw.text((left, y_sym), symbol, font=f_title, fill=WHITE, stroke_width=1, stroke_fill=(0,0,0,180))
+
+        # pill
+        _draw_pill(draw, k, left, y_sym, symbol, side, leverage, f_title, f_pill)
+
+        # ROI big
+        draw.text((left, y_roi), roi_txt, font=f_big, fill=roi_fill, stroke_width=0, stroke_fill=(0,0,0,140))
+
+        # values
+        col2 = left + int(248*k)
+        draw.text((left, y_val), v1, font=f_num, fill=WHITE, stroke_width=1, stroke_fill=(0,0,0,150))
+        draw.text((col2, y_val), v2,  font=f_num, fill=WHITE, stroke_width=1, stroke_fill=(0,0,0,150))
+
+        # valor do stop (bold menor) depois do prefixo do template
+        if off is not None:
+            draw.text((off, y_stop), stop_txt, font=f_stopv, fill=WHITE)
+        return im
+
+    def trade_card(
+        self,
+        symbol: str,
+        side: str,
+        leverage: str,
+        tp_label: str,       # "TP1"/"TP2"/"TP3"
+        roi_pct: float,
+        entry_price: float,
+        last_price: float,
+        stop_text: str,
+        bg_path: str,
+    ):
+        im, off = self.template("trade", bg_path, tp_label)
+        return self._dynamic(im, symbol, side, leverage, f"{roi_pct:+.2f}%", GREEN if roi_pct>=0 else RED,
+                             f"{entry_price:.3f}", f"{last_price:.3f}", str(stop_text), off)
+
+    def stop_card(
+        self,
+        symbol: str,
+        side: str,
+        leverage: str,
+        roi_pct: float,      # negativo!
+        entry_price: float,
+        filled_price: float, # preço do fill (SL)
+        sl_price: float | None,
+        bg_path: str,
+    ):
+        im, off = self.template("stop", bg_path, "STOP", with_stop=sl_price is not None)
+        return self._dynamic(im, symbol, side, leverage, f"{roi_pct:+.2f}%", RED,
+                             f"{entry_price:.3f}", f"{filled_price:.3f}", f"{sl_price}", off)
+
+    # ---------- saída ----------
+    @property
+    def ext(self) -> str:
+        return {"png8": "png", "jpeg": "jpg"}.get(self.encoding, self.encoding)
+
+    def encode(self, im) -> bytes:
+        """Card → bytes no formato configurado (png / png8 / jpeg / webp)."""
+        if self.encoding == "png8":
+            pal = im.convert("RGB").quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+            return encode_card(pal, "PNG", optimize=True)
+        if self.encoding in ("jpeg", "jpg"):
+            return encode_card(im.convert("RGB"), "JPEG", quality=self.quality, optimize=True)
+        if self.encoding == "webp":
+            return encode_card(im.convert("RGB"), "WEBP", quality=self.quality, method=4)
+        return encode_card(im, "PNG")
+
+
+_DEFAULT = CardRenderer()
+
+def encode_card(im, fmt: str = "PNG", **opts) -> bytes:
+    """Card (PIL) → bytes do arquivo, sem passar pelo disco."""
+    buf = io.BytesIO()
+    im.save(buf, format=fmt, **opts)
+    return buf.getvalue()
+
+class CardArchive:
+    """
+    Arquivo opcional dos cards enviados. Nomes únicos (label_SÍMBOLO_data_hora_seq), então
+    dois cards do mesmo símbolo não se sobrescrevem; a limpeza roda a cada `prune_every`
+    gravações e apaga o que passou de keep_days ou excede max_files (mais antigos primeiro).
+    """
+
+    def __init__(self, out_dir, keep_days: float = 7.0, max_files: int = 500, prune_every: int = 20):
+        self.dir = Path(out_dir)
+        self.keep_days = float(keep_days)
+        self.max_files = int(max_files)
+        self.prune_every = max(1, int(prune_every))
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._since_prune = 0
+
+    def save(self, data: bytes, label: str, symbol: str, ext: str = "png") -> str:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = self.dir / f"{label.lower()}_{symbol}_{stamp}_{os.getpid()}-{next(self._seq)}.{ext}"
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+        with self._lock:
+            self._since_prune += 1
+            due = self._since_prune >= self.prune_every
+            if due:
+                self._since_prune = 0
+        if due:
+            self.prune()
+        return str(path)
+
+    def prune(self) -> int:
+        try:
+            files = sorted((p for p in self.dir.iterdir() if p.is_file() and not p.name.endswith(".tmp")),
+                           key=lambda p: p.stat().st_mtime)
+        except FileNotFoundError:
+            return 0
+        cut = time.time() - self.keep_days * 86400.0
+        drop = [p for p in files if p.stat().st_mtime < cut]
+        rest = files[len(drop):]
+        if self.max_files > 0 and len(rest) > self.max_files:
+            drop += rest[: len(rest) - self.max_files]
+        removed = 0
+        for p in drop:
+            try:
+                p.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+def archive_from_cfg(cfg: dict):
+    ac = ((cfg.get("cards") or {}).get("archive") or {})
+    if not ac.get("enabled", False):
+        return None
+    return CardArchive(ac.get("dir", "out/cards"), ac.get("keep_days", 7), ac.get("max_files", 500))
+
+def archive_from_env(env: dict, default_dir):
+    """Daemons (tools/): CARD_ARCHIVE=1 liga; CARD_OUT_DIR, CARD_ARCHIVE_KEEP_DAYS, CARD_ARCHIVE_MAX_FILES."""
+    if str(env.get("CARD_ARCHIVE", "0")).strip().lower() not in ("1", "true", "yes", "on"):
+        return None
+    return CardArchive(
+        env.get("CARD_OUT_DIR") or default_dir,
+        float(env.get("CARD_ARCHIVE_KEEP_DAYS", "7")),
+        int(env.get("CARD_ARCHIVE_MAX_FILES", "500")),
+    )
+
+def default_renderer() -> CardRenderer:
+    return _DEFAULT
+
+def set_default_renderer(r: CardRenderer) -> None:
+    global _DEFAULT
+    _DEFAULT = r
+
+def renderer_from_cfg(cfg: dict) -> CardRenderer:
+    cc = cfg.get("cards") or {}
+    return CardRenderer(layered=bool(cc.get("layered", True)),
+                        encoding=str(cc.get("encoding", "png")), quality=int(cc.get("quality", 85)))
+
+def renderer_from_env(env: dict) -> CardRenderer:
+    """Daemons (tools/): CARD_ENCODING (png/png8/jpeg/webp), CARD_QUALITY."""
+    return CardRenderer(encoding=env.get("CARD_ENCODING") or "png", quality=int(env.get("CARD_QUALITY") or 85))
+
+def _save(im, out_path: str) -> str:
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    im.save(out_path)
+    return out_path
+
 def generate_trade_card(
     symbol: str,
     side: str,
@@ -105,56 +434,8 @@ def generate_trade_card(
     out_path: str,
     bg_path: str,
 ):
-    im = Image.open(bg_path).convert("RGBA")
-    W,H = im.size
-    draw = ImageDraw.Draw(im)
-
-    k, left, y_sym, y_hdr, y_roi, y_lab, y_val, y_stop = _grid(W)
-    f_title, f_pill, f_small, f_big, f_num, f_stopv, f_tp = _common_fonts(k)
-
-    # SYMBOL
-    draw.text((left, y_sym), symbol, font=f_title, fill=WHITE, stroke_width=1, stroke_fill=(0,0,0,180))
-
-    # pill
-    _draw_pill(draw, k, left, y_sym, symbol, side, leverage, f_title, f_pill)
-
-    # ROI header + ícone
-    icon_t = _load_icon("target.png", int(32*k))
-    x = left
-    draw.text((x, y_hdr), "ROI ", font=f_pill, fill=DIM)
-    x += int(draw.textlength("ROI ", font=f_pill))
-    if icon_t:
-        im.paste(icon_t, (x, y_hdr + (f_pill.size - icon_t.size[1])//2 - int(4*k)), icon_t)
-        x += icon_t.size[0] + int(8*k)
-    draw.text((x, y_hdr), f"{tp_label}", font=f_tp, fill=WHITE)
-
-    # ROI big
-    draw.text((left, y_roi), f"{roi_pct:+.2f}%", font=f_big,
-              fill=GREEN if roi_pct>=0 else RED, stroke_width=0, stroke_fill=(0,0,0,140))
-
-    # labels
-    col2 = left + int(248*k)
-    draw.text((left, y_lab), "Entry Price", font=f_small, fill=DIM)
-    draw.text((col2,  y_lab), "Last Traded Price", font=f_small, fill=DIM)
-
-    # values
-    draw.text((left, y_val), f"{entry_price:.3f}", font=f_num, fill=WHITE, stroke_width=1, stroke_fill=(0,0,0,150))
-    draw.text((col2, y_val), f"{last_price:.3f}",  font=f_num, fill=WHITE, stroke_width=1, stroke_fill=(0,0,0,150))
-
-    # STOP line (ícone + prefixo + valor em bold menor)
-    icon_a = _load_icon("arrow.png", int(38*k))
-    x = left
-    if icon_a:
-        im.paste(icon_a, (x, y_stop + (f_pill.size - icon_a.size[1])//2 - int(1*k)), icon_a)
-        x += icon_a.size[0] + int(6*k)
-    prefix = "Stop movido para: "
-    draw.text((x, y_stop), prefix, font=f_pill, fill=WHITE)
-    off = x + int(draw.textlength(prefix, font=f_pill))
-    draw.text((off, y_stop), str(stop_text), font=f_stopv, fill=WHITE)
-
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    im.save(out_path)
-    return out_path
+    im = _DEFAULT.trade_card(symbol, side, leverage, tp_label, roi_pct, entry_price, last_price, stop_text, bg_path)
+    return _save(im, out_path)
 
 def generate_stop_card(
     symbol: str,
@@ -167,52 +448,5 @@ def generate_stop_card(
     out_path: str,
     bg_path: str,
 ):
-    im = Image.open(bg_path).convert("RGBA")
-    W,H = im.size
-    draw = ImageDraw.Draw(im)
-
-    k, left, y_sym, y_hdr, y_roi, y_lab, y_val, y_stop = _grid(W)
-    f_title, f_pill, f_small, f_big, f_num, f_stopv, f_tp = _common_fonts(k)
-
-    # SYMBOL
-    draw.text((left, y_sym), symbol, font=f_title, fill=WHITE, stroke_width=1, stroke_fill=(0,0,0,180))
-
-    # pill
-    _draw_pill(draw, k, left, y_sym, symbol, side, leverage, f_title, f_pill)
-
-    # Header "STOP LOSS" com ícone
-    icon_s = _load_icon("stop.png", int(30*k))
-    x = left
-    if icon_s:
-        im.paste(icon_s, (x, y_hdr + (f_pill.size - icon_s.size[1])//2 - int(2*k)), icon_s)
-        x += icon_s.size[0] + int(8*k)
-    draw.text((x, y_hdr), "STOP LOSS", font=f_tp, fill=WHITE)
-
-    # ROI big (vermelho)
-    draw.text((left, y_roi), f"{roi_pct:+.2f}%", font=f_big,
-              fill=RED, stroke_width=0, stroke_fill=(0,0,0,140))
-
-    # labels
-    col2 = left + int(248*k)
-    draw.text((left, y_lab), "Entry Price", font=f_small, fill=DIM)
-    draw.text((col2,  y_lab), "Filled Price", font=f_small, fill=DIM)
-
-    # values
-    draw.text((left, y_val), f"{entry_price:.3f}", font=f_num, fill=WHITE, stroke_width=1, stroke_fill=(0,0,0,150))
-    draw.text((col2, y_val), f"{filled_price:.3f}",  font=f_num, fill=WHITE, stroke_width=1, stroke_fill=(0,0,0,150))
-
-    # linha extra: SL (se houver)
-    if sl_price is not None:
-        icon_a = _load_icon("arrow.png", int(38*k))
-        x = left
-        if icon_a:
-            im.paste(icon_a, (x, y_stop + (f_pill.size - icon_a.size[1])//2 - int(1*k)), icon_a)
-            x += icon_a.size[0] + int(6*k)
-        prefix = "Stop (SL): "
-        draw.text((x, y_stop), prefix, font=f_pill, fill=WHITE)
-        off = x + int(draw.textlength(prefix, font=f_pill))
-        draw.text((off, y_stop), f"{sl_price}", font=f_stopv, fill=WHITE)
-
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    im.save(out_path)
-    return out_path
\ No newline at end of file
+    im = _DEFAULT.stop_card(symbol, side, leverage, roi_pct, entry_price, filled_price, sl_price, bg_path)
+    return _save(im, out_path)
@@ -0,0 +1,202 @@
+# moonshot_chart.py — gráfico de velas para o "AI SIGNAL IS READY"
+# - Desenho direto com PIL a partir dos arrays OHLC (NumPy) que o agente já tem;
+#   sem matplotlib/plotly. Coordenadas calculadas vetorizadas, 1 linha + 1 retângulo por vela
+# - Últimas N velas, nível de rompimento, zona de entrada, SL e TP1..TP3 com rótulo de preço
+# - Mesmo visual dos cards (cores, fontes, pill LONG/SHORT) e mesmos caches do CardRenderer
+#   (fundo/fontes); o fundo já recortado + escurecido fica num LRU próprio
+# - 60 velas: ~6 ms de desenho + codificação (PNG ~17 ms, JPEG ~4 ms); bench_cards.py mede
+#
+# YAML opcional (valores padrão):
+#   signal_chart:
+#     enabled: false
+#     candles: 60
+#     width: 960
+#     height: 540
+#     bg_path: ""          # vazio = fundo liso escuro
+
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from moonshot_card import DIM, F_BOLD, F_REG, GREEN, RED, WHITE, CardRenderer, _draw_pill, default_renderer
+
+BG_COLOR = (14, 18, 24, 255)
+GRID = (255, 255, 255, 22)
+ZONE_LONG = (42, 214, 95, 46)
+ZONE_SHORT = (234, 69, 53, 46)
+BRK = (240, 200, 80, 255)
+
+
+def _dashed(draw, x0: int, x1: int, y: int, fill, width: int = 2, dash: int = 10, gap: int = 6):
+    for x in range(x0, x1, dash + gap):
+        draw.line((x, y, min(x + dash, x1), y), fill=fill, width=width)
+
+
+class ChartRenderer:
+    """
+    ch = ChartRenderer(candles=60)
+    im = ch.render(o, h, l, c, symbol="BTCUSDT", tf="15", side="LONG", entry_zone=(a, b),
+                   sl=sl, tps=[tp1, tp2, tp3], breakout=nivel)
+    png = ch.render_bytes(...)   # mesmo, já codificado (cards.encoding)
+
+    Fontes, fundo e codificação vêm do CardRenderer (padrão: default_renderer() no
+    momento do render, então set_default_renderer() vale para os gráficos também).
+    """
+
+    def __init__(self, width: int = 960, height: int = 540, candles: int = 60,
+                 bg_path: Optional[str] = None, cards: Optional[CardRenderer] = None):
+        self.W, self.H = int(width), int(height)
+        self.candles = max(5, int(candles))
+        self.bg_path = bg_path or None
+        self._cards = cards
+        self._base = lru_cache(maxsize=4)(self._build_base)
+
+    @property
+    def cards(self) -> CardRenderer:
+        return self._cards or default_renderer()
+
+    # ---------- fundo ----------
+    def _build_base(self, path: Optional[str], mtime_ns: int):
+        """Fundo no tamanho do gráfico (recorte central + véu escuro para as velas)."""
+        if not path:
+            return Image.new("RGB", (self.W, self.H), BG_COLOR[:3])
+        src = self.cards.background(path)
+        s = max(self.W / src.width, self.H / src.height)
+        im = src.resize((max(self.W, round(src.width * s)), max(self.H, round(src.height * s))), Image.BILINEAR)
+        x0, y0 = (im.width - self.W) // 2, (im.height - self.H) // 2
+        im = im.crop((x0, y0, x0 + self.W, y0 + self.H))
+        return Image.alpha_composite(im, Image.new("RGBA", im.size, (8, 10, 14, 170))).convert("RGB")
+
+    def base(self) -> Image.Image:
+        path = self.bg_path if self.bg_path and os.path.exists(self.bg_path) else None
+        mtime_ns = os.stat(path).st_mtime_ns if path else 0
+        return self._base(path, mtime_ns).copy()
+
+    # ---------- gráfico ----------
+    def render(
+        self,
+        o: Sequence[float],
+        h: Sequence[float],
+        l: Sequence[float],
+        c: Sequence[float],
+        symbol: str,
+        tf: str,
+        side: str,
+        entry_zone: Sequence[float],
+        sl: float,
+        tps: Sequence[float],
+        breakout: Optional[float] = None,
+        leverage: str = "",
+        decimals: int = 6,
+    ):
+        n = self.candles
+        o, h, l, c = (np.asarray(a, dtype=float)[-n:] for a in (o, h, l, c))
+        n = len(c)
+        im = self.base()
+        W, H = im.size
+        draw = ImageDraw.Draw(im, "RGBA")  # base RGB + cores com alpha → mistura (zona, grade)
+        k = W / 936.0
+        f_title = self.cards.font(F_BOLD, int(34 * k))
+        f_pill = self.cards.font(F_REG, int(20 * k))
+        f_lab = self.cards.font(F_BOLD, int(15 * k))
+
+        side = side.upper()
+        left, right, top, bottom = int(24 * k), W - int(150 * k), int(84 * k), H - int(22 * k)
+
+        # cabeçalho: símbolo + pill (mesmo desenho dos cards) + TF
+        y_sym = int(22 * k)
+        draw.text((left, y_sym), symbol, font=f_title, fill=WHITE, stroke_width=1, stroke_fill=(0, 0, 0, 180))
+        pill = f"{leverage} · {tf}m" if leverage else f"{tf}m"
+        _draw_pill(draw, k, left, y_sym + int(6 * k), symbol, side, pill, f_title, f_pill)
+
+        # escala de preço: velas + todos os níveis (o TP3 costuma ficar fora do range recente)
+        levels = [float(x) for x in (*entry_zone, sl, *tps) if x is not None]
+        if breakout is not None:
+            levels.append(float(breakout))
+        lo = min(float(l.min()), *levels)
+        hi = max(float(h.max()), *levels)
+        pad = (hi - lo) * 0.04 or abs(hi) * 0.01 or 1.0
+        lo, hi = lo - pad, hi + pad
+        sy = (bottom - top) / (hi - lo)
+
+        def Y(v):
+            return top + (hi - np.asarray(v, dtype=float)) * sy
+
+        # grade horizontal discreta
+        for gy in np.linspace(top, bottom, 5):
+            draw.line((left, int(gy), right, int(gy)), fill=GRID, width=1)
+
+        # zona de entrada
+        z0, z1 = sorted(float(x) for x in entry_zone)
+        draw.rectangle((left, int(Y(z1)), right, int(Y(z0))), fill=ZONE_LONG if side == "LONG" else ZONE_SHORT)
+
+        # velas (coordenadas vetorizadas; o loop só emite as primitivas)
+        step = (right - left) / n
+        bw = max(1, int(step * 0.62))
+        xs = (left + (np.arange(n) + 0.5) * step).astype(int)
+        yh, yl = Y(h).astype(int), Y(l).astype(int)
+        yb0 = Y(np.maximum(o, c)).astype(int)
+        yb1 = np.maximum(Y(np.minimum(o, c)).astype(int), yb0 + 1)
+        up = c >= o
+        half = bw // 2
+        for x, a, b, t, u, g in zip(xs.tolist(), yh.tolist(), yl.tolist(), yb0.tolist(), yb1.tolist(), up.tolist()):
+            col = GREEN if g else RED
+            draw.line((x, a, x, b), fill=col, width=max(1, int(k)))
+            draw.rectangle((x - half, t, x - half + bw, u), fill=col)
+
+        # níveis + rótulos na margem direita
+        lab_x = right + int(8 * k)
+
+        def level(v, txt, col, dashed=False):
+            y = int(Y(v))
+            if dashed:
+                _dashed(draw, left, right, y, col, width=max(1, int(2 * k)))
+            else:
+                draw.line((left, y, right, y), fill=col, width=max(1, int(2 * k)))
+            label = f"{txt} {v:.{decimals}f}"
+            tw = draw.textlength(label, font=f_lab)
+            th = f_lab.size + int(6 * k)
+            draw.rounded_rectangle((lab_x, y - th // 2, lab_x + tw + int(10 * k), y + th // 2),
+                                   radius=int(4 * k), fill=col[:3] + (220,))
+            draw.text((lab_x + int(5 * k), y - f_lab.size // 2 - int(1 * k)), label, font=f_lab, fill=(10, 12, 16, 255))
+
+        if breakout is not None:
+            level(float(breakout), "BRK", BRK, dashed=True)
+        level(float(sl), "SL", RED)
+        for i, tp in enumerate(tps, 1):
+            level(float(tp), f"TP{i}", GREEN)
+        draw.text((left + int(6 * k), int(Y(z1)) - f_lab.size - int(4 * k)), "ENTRY", font=f_lab, fill=DIM)
+        return im
+
+    def render_bytes(self, **kw) -> bytes:
+        """render(**kw) codificado (cards.encoding); aceita listas (args do outbox são JSON)."""
+        return self.cards.encode(self.render(**kw))
+
+
+def chart_args(df, idx: int, n: int, symbol: str, tf: str, sig: dict, breakout: Optional[float],
+               leverage: str = "", decimals: int = 6) -> dict:
+    """Args JSON-serializáveis de render() a partir do DataFrame de velas (vela `idx` é a última)."""
+    end = len(df) + idx + 1 if idx < 0 else idx + 1
+    sub = df.iloc[max(0, end - n):end]
+    return {
+        "o": sub["open"].to_numpy(float).tolist(), "h": sub["high"].to_numpy(float).tolist(),
+        "l": sub["low"].to_numpy(float).tolist(), "c": sub["close"].to_numpy(float).tolist(),
+        "symbol": symbol, "tf": str(tf), "side": sig["side"],
+        "entry_zone": [float(x) for x in sig["entry_zone"]], "sl": float(sig["sl"]),
+        "tps": [float(x) for x in sig["tps"]],
+        "breakout": None if breakout is None else float(breakout),
+        "leverage": leverage, "decimals": int(decimals),
+    }
+
+
+def chart_from_cfg(cfg: dict) -> Optional[ChartRenderer]:
+    sc = cfg.get("signal_chart") or {}
+    if not sc.get("enabled", False):
+        return None
+    return ChartRenderer(int(sc.get("width", 960)), int(sc.get("height", 540)), int(sc.get("candles", 60)),
+                         sc.get("bg_path") or None)
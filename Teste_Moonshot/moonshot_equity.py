@@ -0,0 +1,460 @@
+# moonshot_equity.py — curva de equity marcada a mercado, drawdown e exposição
+# - Reconstrói o saldo numa grade fixa (padrão 1 min) a partir dos eventos dos trades
+#   (abertura, TP1, TP2, fechamento) + velas de 1m guardadas em disco para marcar as
+#   posições abertas a mercado
+# - Realizado: cada perna do pnl_engine (taxa de entrada, TP1, TP2, final) entra no horário
+#   em que aconteceu; a soma das pernas é o pnl_net do report_pnl
+# - Não realizado: por símbolo, Σ w·dir·notional·(P/entrada − 1) = P·A(t) − B(t), com A e B
+#   montados por arrays de diferença (np.add.at + cumsum) — o laço é por símbolo, nunca por
+#   minuto; meses de grade em poucos segundos
+# - Relatório: máximo drawdown (USDT e %), pico → fundo → recuperação, tempo debaixo d'água
+#   (total e maior trecho) e exposição por lado (notional ainda aberto: média, máximo, % do tempo)
+# - CandleStore: closes de 1m por símbolo e mês (<dir>/<SYMBOL>/AAAA-MM.npz); --fill baixa
+#   da Bybit só os dias que faltam (o dia corrente é rebaixado até fechar)
+#
+#   python moonshot_equity.py --since 2025-09-01 --fill
+#   python moonshot_equity.py --step 5 --csv equity.csv
+#
+# YAML opcional (valores padrão):
+#   equity:
+#     candles_dir: data/candles_1m
+#     step_min: 1
+#   (capital inicial = account_equity_usdt, o mesmo do sizing do agente)
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import pnl_engine
+from moonshot_trade_archive import COLUMNS, TradeArchive, _columns, ms_day, trade_row
+from moonshot_trade_store import db_path_from_cfg, read_trades
+
+MIN_MS = 60_000
+DAY_MS = 86_400_000
+CANCELLED = ("CANCEL", "CANCELED", "CANCELLED")
+ENDED = ("STOP", "STOPPED") + CANCELLED  # + tudo que começa com CLOSED (CLOSED_TP1/2/3)
+
+
+# ==============================
+# Velas de 1m em disco
+# ==============================
+
+def _bybit_1m(symbol: str, start_ms: int, end_ms: int, category: str = "linear") -> List[Tuple[int, float]]:
+    """(start_ms, close) de [start_ms, end_ms] em blocos de 1000 (a API devolve do mais novo ao mais velho)."""
+    import requests
+    out: List[Tuple[int, float]] = []
+    t = int(start_ms)
+    while t <= end_ms:
+        hi = min(int(end_ms), t + 1000 * MIN_MS - 1)
+        try:
+            r = requests.get("https://api.bybit.com/v5/market/kline", timeout=10, params={
+                "category": category, "symbol": symbol, "interval": "1", "start": t, "end": hi, "limit": 1000})
+            lst = ((r.json().get("result") or {}).get("list")) or []
+        except Exception as e:
+            print(f"[equity] velas {symbol}: {e.__class__.__name__}")
+            break
+        for it in lst:
+            try:
+                out.append((int(it[0]), float(it[4])))
+            except (TypeError, ValueError, IndexError):
+                continue
+        t = hi + 1
+    out.sort()
+    return out
+
+
+class CandleStore:
+    """
+    st = CandleStore("data/candles_1m")
+    st.fill("BTCUSDT", start_ms, end_ms)     # baixa só os dias que faltam
+    ts, close = st.load("BTCUSDT", start_ms, end_ms)
+
+    Um .npz por símbolo e mês (<dir>/<SYMBOL>/AAAA-MM.npz: ts, close e os dias já
+    completos); meses de curva abrem poucos arquivos por símbolo.
+    """
+
+    def __init__(self, root: str, fetcher: Optional[Callable[[str, int, int], List[Tuple[int, float]]]] = None):
+        self.root = root
+        self.fetcher = fetcher or _bybit_1m
+
+    def _path(self, symbol: str, month: str) -> str:
+        return os.path.join(self.root, symbol, f"{month}.npz")
+
+    @staticmethod
+    def _days(start_ms: int, end_ms: int) -> List[int]:
+        d0 = int(start_ms) // DAY_MS * DAY_MS
+        return list(range(d0, int(end_ms) + 1, DAY_MS))
+
+    def _read(self, path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                return z["ts"], z["close"], z["days"]
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            e = np.array([], dtype=np.int64)
+            return e, np.array([], dtype=np.float64), e
+
+    def fill(self, symbol: str, start_ms: int, end_ms: int) -> int:
+        """Baixa os dias ausentes/incompletos de [start_ms, end_ms]; devolve quantos dias baixou."""
+        now = int(time.time() * 1000)
+        by_month: Dict[str, List[int]] = {}
+        for d0 in self._days(start_ms, min(end_ms, now)):
+            by_month.setdefault(ms_day(d0)[:7], []).append(d0)
+        n = 0
+        for month, days in by_month.items():
+            path = self._path(symbol, month)
+            ts, close, done = self._read(path)
+            todo = [d for d in days if d not in set(done.tolist())]
+            if not todo:
+                continue
+            new = [r for d in todo for r in self.fetcher(symbol, d, min(d + DAY_MS - 1, now))]
+            if not new:
+                continue
+            ts = np.concatenate([ts, np.array([r[0] for r in new], dtype=np.int64)])
+            close = np.concatenate([close, np.array([r[1] for r in new], dtype=np.float64)])
+            ts, first = np.unique(ts[::-1], return_index=True)  # vela rebaixada substitui a antiga
+            close = close[::-1][first]
+            done = np.union1d(done, [d for d in todo if d + DAY_MS <= now - MIN_MS]).astype(np.int64)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, ts=ts, close=close, days=done)
+            os.replace(tmp, path)
+            n += len(todo)
+        return n
+
+    def load(self, symbol: str, start_ms: int, end_ms: int) -> Tuple[np.ndarray, np.ndarray]:
+        months = sorted({ms_day(d)[:7] for d in self._days(start_ms, end_ms)})
+        parts = [self._read(self._path(symbol, m))[:2] for m in months]
+        parts = [p for p in parts if len(p[0])]
+        if not parts:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+        return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
+def store_from_cfg(cfg: dict) -> CandleStore:
+    return CandleStore((cfg.get("equity") or {}).get("candles_dir", "data/candles_1m"))
+
+
+# ==============================
+# Trades → colunas (fechados do arquivo + abertos do trades_file)
+# ==============================
+
+def is_ended(status) -> bool:
+    """Mesma regra dos watchers/report_trades_now: CLOSED*, STOP/STOPPED e cancelados não estão abertos."""
+    s = str(status or "").upper().strip()
+    return s.startswith("CLOSED") or s in ENDED
+
+
+def _ended(status: np.ndarray) -> np.ndarray:
+    s = np.char.upper(np.char.strip(status.astype(str)))
+    return np.char.startswith(s, "CLOSED") | np.isin(s, ENDED)
+
+
+def open_columns(trades: Dict[str, dict], profile: str = "") -> Dict[str, np.ndarray]:
+    """Trades ainda abertos no mesmo formato do moonshot_trade_archive."""
+    rows = [trade_row(k, tr, profile) for k, tr in trades.items()
+            if isinstance(tr, dict) and not is_ended(tr.get("status"))]
+    return _columns(rows)
+
+
+def _concat(parts: Sequence[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    return {c: np.concatenate([p[c] for p in parts]) for c in COLUMNS}
+
+
+# ==============================
+# Curva de equity
+# ==============================
+
+def _at(T: np.ndarray, ms: np.ndarray) -> np.ndarray:
+    """Primeiro ponto da grade >= ms (evento antes da grade → 0, depois → len(T))."""
+    return np.searchsorted(T, ms, side="left")
+
+
+def equity_curve(cols: Dict[str, np.ndarray], store: Optional[CandleStore], start_ms: int, end_ms: int,
+                 step_ms: int = MIN_MS, params: Optional[dict] = None, capital: float = 1000.0) -> dict:
+    """
+    Arrays na grade [start_ms, end_ms] de step_ms: t, equity, realized, unrealized,
+    expo_long, expo_short (notional aberto) + `priced` (% das posições·minuto com preço).
+    Trades fechados antes do início entram no saldo inicial.
+    """
+    params = params or pnl_engine.pnl_params({})
+    T = np.arange(int(start_ms), int(end_ms) + 1, int(step_ms), dtype=np.int64)
+    K = len(T)
+
+    # cancelado nunca virou posição: fora da curva
+    keep = ~np.isin(np.char.upper(np.char.strip(cols["status"].astype(str))), CANCELLED)
+    cols = {c: a[keep] for c, a in cols.items()}
+    closed = _ended(cols["status"])
+    res = pnl_engine.compute(pnl_engine.columns_from_archive(cols), params["splits"], params["fees"], params["slip"])
+
+    # horários ausentes: fechamento → último TP (ou a abertura); abertura → fechamento (ou o
+    # início da grade). Assim o total bate com o report_pnl; quantos foram estimados vai em `undated`
+    opened = np.where(cols["opened_ms"] >= 0, cols["opened_ms"], cols["created_ms"])
+    tp_last = np.max([cols["tp1_ms"], cols["tp2_ms"], cols["tp3_ms"]], axis=0)
+    no_close = closed & (cols["closed_ms"] < 0)
+    close_raw = np.where(no_close, np.maximum(tp_last, opened), cols["closed_ms"])
+    no_open = opened < 0
+    opened = np.where(no_open, np.where(closed & (close_raw >= 0), close_raw, int(start_ms) - 1), opened)
+    close_raw = np.where(closed & (close_raw < 0), opened, close_raw)
+    undated = int((no_close | no_open).sum())
+
+    inf = np.iinfo(np.int64).max
+    close_ms = np.where(closed, np.maximum(close_raw, opened), inf)
+
+    def leg_ms(j: int) -> np.ndarray:
+        at = cols[f"tp{j}_ms"]
+        fallback = np.where(closed, close_ms, opened)  # TP sem horário: no fechamento (ou na abertura)
+        return np.where(at >= 0, np.clip(at, opened, close_ms), fallback)
+
+    tp1_ms, tp2_ms = leg_ms(1), leg_ms(2)
+    f1, f2 = res["frac_tp1"], res["frac_tp2"]
+    rest = np.maximum(0.0, 1.0 - f1 - f2)
+
+    # ---- realizado: uma perna por evento, acumulada na grade ----
+    ev_ms = np.concatenate([opened, tp1_ms, tp2_ms, close_ms])
+    ev_val = np.concatenate([-res["fee_entry"], res["pnl_tp1"] - res["fee_tp1"],
+                             res["pnl_tp2"] - res["fee_tp2"],
+                             np.where(closed, res["pnl_final"] - res["fee_final"], 0.0)])
+    live = ev_val != 0
+    diff = np.zeros(K + 1)
+    np.add.at(diff, _at(T, ev_ms[live]), ev_val[live])
+    realized = np.cumsum(diff[:K])
+
+    # ---- peso ainda aberto w(t): 1 → 1−f1 → 1−f1−f2 → 0 ----
+    w_ms = np.concatenate([opened, tp1_ms, tp2_ms, close_ms])
+    w_dv = np.concatenate([np.ones(len(opened)), -f1, -f2, -rest])
+    w_ix = _at(T, w_ms)
+    n = len(opened)
+    trade_of = np.tile(np.arange(n), 4)
+
+    notional = np.nan_to_num(cols["notional"])
+    long = cols["side"] == "LONG"
+    expo = {}
+    for name, mask in (("expo_long", long), ("expo_short", ~long)):
+        sel = mask[trade_of]
+        d = np.zeros(K + 1)
+        np.add.at(d, w_ix[sel], (w_dv * notional[trade_of])[sel])
+        x = np.cumsum(d[:K])
+        expo[name] = np.where(x > 1e-6, x, 0.0)  # resíduo de ponto flutuante depois de zerar
+
+    # ---- não realizado: P(t)·A(t) − B(t) por símbolo ----
+    direction = np.where(long, 1.0, -1.0)
+    e_eff = np.maximum(res["entry_eff"], 1e-12)
+    a_i = direction * notional / e_eff
+    b_i = direction * notional
+    unreal = np.zeros(K)
+    open_pts = priced_pts = 0
+    active = (close_ms >= T[0]) & (opened <= T[-1]) if K else np.zeros(n, dtype=bool)
+    syms = cols["symbol"]
+    for sym in np.unique(syms[active]):
+        ti = np.flatnonzero(active & (syms == sym))
+        sel = np.isin(trade_of, ti)
+        ix, dv, tr = w_ix[sel], w_dv[sel], trade_of[sel]
+        j0 = int(_at(T, opened[ti]).min())
+        j1 = int(min(K, ix.max() + 1))
+        if j1 <= j0:
+            continue
+        m = j1 - j0
+        dA, dB = np.zeros(m + 1), np.zeros(m + 1)
+        loc = np.clip(ix - j0, 0, m)
+        np.add.at(dA, loc, dv * a_i[tr])
+        np.add.at(dB, loc, dv * b_i[tr])
+        A, B = np.cumsum(dA[:m]), np.cumsum(dB[:m])
+        # contagem de posições abertas: fora delas A/B são só resíduo de ponto flutuante
+        cnt = np.zeros(m + 1)
+        np.add.at(cnt, np.clip(_at(T, opened[ti]) - j0, 0, m), 1)
+        np.add.at(cnt, np.clip(_at(T, close_ms[ti]) - j0, 0, m), -1)
+        is_open = np.cumsum(cnt[:m]) > 0
+        Tw = T[j0:j1]
+        ts, close = store.load(str(sym), int(Tw[0]) - MIN_MS, int(Tw[-1])) if store else (np.array([]), np.array([]))
+        if len(ts):
+            k = np.searchsorted(ts, Tw - MIN_MS, side="right") - 1  # última vela já fechada em t
+            P = np.where(k >= 0, close[np.clip(k, 0, None)], np.nan)
+        else:
+            P = np.full(m, np.nan)
+        have = is_open & np.isfinite(P)
+        unreal[j0:j1] += np.where(have, np.nan_to_num(P) * A - B, 0.0)
+        open_pts += int(is_open.sum())
+        priced_pts += int(have.sum())
+
+    equity = capital + realized + unreal
+    return {"t": T, "equity": equity, "realized": realized, "unrealized": unreal,
+            "expo_long": expo["expo_long"], "expo_short": expo["expo_short"],
+            "priced": 100.0 * priced_pts / open_pts if open_pts else 100.0,
+            "trades": int(n), "undated": undated, "capital": float(capital)}
+
+
+# ==============================
+# Drawdown / exposição
+# ==============================
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Início/fim (exclusivo) de cada trecho True."""
+    d = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(d == 1), np.flatnonzero(d == -1)
+
+
+def drawdown_stats(curve: dict, step_ms: int) -> dict:
+    eq, T = curve["equity"], curve["t"]
+    if not len(eq):
+        return {}
+    peak = np.maximum.accumulate(eq)
+    dd = eq - peak
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd_pct = np.where(peak > 0, dd / peak * 100.0, 0.0)
+    i_tr = int(np.argmin(dd))
+    i_pk = int(np.argmax(eq[:i_tr + 1]))
+    rec = np.flatnonzero(eq[i_tr:] >= peak[i_tr])
+    under = dd < -1e-9
+    s, e = _runs(under)
+    longest = int((e - s).max()) if len(s) else 0
+    return {
+        "max_dd": float(dd[i_tr]), "max_dd_pct": float(dd_pct.min()),
+        "peak_ms": int(T[i_pk]), "trough_ms": int(T[i_tr]),
+        "recovery_ms": int(T[i_tr + rec[0]]) if len(rec) else None,
+        "under_min": int(under.sum()) * step_ms / MIN_MS,
+        "under_pct": float(under.mean() * 100.0),
+        "longest_under_min": longest * step_ms / MIN_MS,
+        "start": float(eq[0]), "end": float(eq[-1]), "high": float(eq.max()), "low": float(eq.min()),
+    }
+
+
+def exposure_stats(curve: dict) -> dict:
+    out = {}
+    for side, key in (("LONG", "expo_long"), ("SHORT", "expo_short")):
+        x = curve[key]
+        out[side] = {"avg": float(x.mean()) if len(x) else 0.0, "max": float(x.max()) if len(x) else 0.0,
+                     "time_pct": float((x > 0).mean() * 100.0) if len(x) else 0.0}
+    net = curve["expo_long"] - curve["expo_short"]
+    out["net_avg"] = float(net.mean()) if len(net) else 0.0
+    return out
+
+
+# ==============================
+# CLI
+# ==============================
+
+def _load_cfg(path: str) -> dict:
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def _ms(v: Optional[str], default: int) -> int:
+    if not v:
+        return default
+    dt = datetime.fromisoformat(v)
+    return int((dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp() * 1000)
+
+
+def _fmt_ms(ms: Optional[int], tz) -> str:
+    if ms is None:
+        return "não recuperou"
+    return datetime.fromtimestamp(ms / 1000.0, tz).strftime("%Y-%m-%d %H:%M %Z")
+
+
+def _fmt_dur(minutes: float) -> str:
+    d, rem = divmod(int(minutes), 1440)
+    h, m = divmod(rem, 60)
+    return f"{d}d {h:02d}h{m:02d}" if d else f"{h}h{m:02d}"
+
+
+def write_csv(curve: dict, path: str) -> None:
+    import pandas as pd
+    peak = np.maximum.accumulate(curve["equity"])
+    pd.DataFrame({
+        "t_utc": np.datetime_as_string(curve["t"].astype("datetime64[ms]"), unit="m"),
+        "equity": curve["equity"], "realized": curve["realized"], "unrealized": curve["unrealized"],
+        "drawdown": curve["equity"] - peak, "expo_long": curve["expo_long"], "expo_short": curve["expo_short"],
+    }).to_csv(path, index=False, float_format="%.6f")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Equity marcada a mercado, drawdown e exposição por lado")
+    ap.add_argument("--cfg", default="moonshot_config.yaml")
+    ap.add_argument("--since", default=None, help="início da grade (ISO, UTC; padrão: primeira abertura)")
+    ap.add_argument("--until", default=None, help="fim da grade (ISO, UTC; padrão: agora)")
+    ap.add_argument("--step", type=int, default=None, help="resolução em minutos (padrão: equity.step_min)")
+    ap.add_argument("--archive", default=None, help="pasta do trade_archive (padrão: trade_archive.dir)")
+    ap.add_argument("--candles", default=None, help="pasta das velas de 1m (padrão: equity.candles_dir)")
+    ap.add_argument("--fill", action="store_true", help="baixa da Bybit as velas que faltam antes de calcular")
+    ap.add_argument("--no-open", action="store_true", help="ignora os trades ainda abertos no trades_file")
+    ap.add_argument("--capital", type=float, default=None, help="saldo inicial (padrão: account_equity_usdt)")
+    ap.add_argument("--csv", default=None, help="grava a curva (t, equity, realizado, não realizado, dd, exposição)")
+    ap.add_argument("--tz", default=None)
+    args = ap.parse_args()
+
+    cfg = _load_cfg(args.cfg)
+    ec = cfg.get("equity") or {}
+    step_ms = int(args.step or ec.get("step_min", 1)) * MIN_MS
+    capital = float(args.capital if args.capital is not None else cfg.get("account_equity_usdt", 1000))
+    try:
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo(args.tz or cfg.get("display_timezone", "UTC"))
+    except Exception:
+        tz = timezone.utc
+
+    t0 = time.perf_counter()
+    arc = TradeArchive(args.archive or (cfg.get("trade_archive") or {}).get("dir", "data/trades"))
+    until_ms = _ms(args.until, int(time.time() * 1000))
+    parts = [arc.read(None, until_ms)]  # tudo até o fim: o que fechou antes do início vira saldo inicial
+    if not args.no_open:
+        parts.append(open_columns(read_trades(cfg.get("trades_file", "moonshot_trades.json"), db_path_from_cfg(cfg))))
+    cols = _concat(parts)
+    if not len(cols["key"]):
+        print("Nenhum trade (rode: python moonshot_trade_archive.py backfill)")
+        return
+    opened = np.where(cols["opened_ms"] >= 0, cols["opened_ms"], cols["created_ms"])
+    first = int(opened[opened >= 0].min()) if (opened >= 0).any() else until_ms
+    start_ms = _ms(args.since, first) // step_ms * step_ms
+    t_load = time.perf_counter() - t0
+
+    store = CandleStore(args.candles or ec.get("candles_dir", "data/candles_1m"))
+    if args.fill:
+        closed_ms = np.where(cols["closed_ms"] >= 0, cols["closed_ms"], until_ms)
+        live = (closed_ms >= start_ms) & (opened <= until_ms) & (opened >= 0)
+        fetched = 0
+        for sym in np.unique(cols["symbol"][live]):
+            m = live & (cols["symbol"] == sym)
+            fetched += store.fill(str(sym), max(start_ms, int(opened[m].min())) - MIN_MS, min(until_ms, int(closed_ms[m].max())))
+        print(f"velas: {fetched} dia(s) baixado(s)")
+
+    t1 = time.perf_counter()
+    curve = equity_curve(cols, store, start_ms, until_ms, step_ms, pnl_engine.pnl_params(cfg), capital)
+    t_curve = time.perf_counter() - t1
+    dd = drawdown_stats(curve, step_ms)
+    ex = exposure_stats(curve)
+
+    print("\n==== Moonshot Equity (marcada a mercado) ====")
+    print(f"Período: {_fmt_ms(int(curve['t'][0]), tz)} → {_fmt_ms(int(curve['t'][-1]), tz)} "
+          f"| grade {step_ms // MIN_MS} min ({len(curve['t'])} pontos) | {curve['trades']} trades")
+    print(f"Capital: {dd['start']:.2f} → {dd['end']:.2f} USDT (máx {dd['high']:.2f}, mín {dd['low']:.2f}) "
+          f"| não realizado agora {curve['unrealized'][-1]:+.2f}")
+    print(f"Máx. drawdown: {dd['max_dd']:.2f} USDT ({dd['max_dd_pct']:.2f}%) | pico {_fmt_ms(dd['peak_ms'], tz)} "
+          f"→ fundo {_fmt_ms(dd['trough_ms'], tz)} → recuperação {_fmt_ms(dd['recovery_ms'], tz)}")
+    print(f"Debaixo d'água: {_fmt_dur(dd['under_min'])} ({dd['under_pct']:.1f}% do período) "
+          f"| maior trecho {_fmt_dur(dd['longest_under_min'])}")
+    for side in ("LONG", "SHORT"):
+        x = ex[side]
+        print(f"Exposição {side:<5}: média {x['avg']:.2f} | máx {x['max']:.2f} USDT | exposto {x['time_pct']:.1f}% do tempo")
+    print(f"Exposição líquida média (LONG − SHORT): {ex['net_avg']:+.2f} USDT")
+    if curve["undated"]:
+        print(f"Aviso: {curve['undated']} trade(s) sem horário de abertura/fechamento — posicionados pelo último "
+              f"evento conhecido (ou no início da grade), só para o total bater com o report_pnl")
+    if curve["priced"] < 99.5:
+        print(f"Aviso: só {curve['priced']:.1f}% das posições·minuto têm vela de 1m (sem vela = não realizado 0; use --fill)")
+    print(f"Tempo: leitura {t_load * 1000:.0f} ms | curva {t_curve * 1000:.0f} ms")
+
+    if args.csv:
+        write_csv(curve, args.csv)
+        print(f"CSV: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+# moonshot_metrics.py — instrumentação do loop do agente
+# - Cronômetros por estágio (tickers, klines, blacklist, indicadores, sinais, telegram, monitor)
+# - Agregação por ciclo + percentis (p50/p90/p99) sobre uma janela de ciclos
+# - Arquivo de métricas JSON gravado de forma atômica a cada ciclo
+# - Profiler por amostragem (opcional), ligado/desligado em runtime via sinal (SIGUSR1),
+#   que grava stacks "collapsed" (formato do flamegraph.pl / speedscope)
+#
+# YAML opcional (valores padrão):
+#   metrics:
+#     enabled: true
+#     file: logs/metrics.json
+#     window_cycles: 200        # nº de ciclos usados nos percentis
+#     profiler:
+#       interval_ms: 10
+#       out_dir: logs
+#       signal: SIGUSR1         # kill -USR1 <pid> liga; repetir desliga e grava o .folded
+
+from __future__ import annotations
+
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil por interpolação linear (q em 0..100)."""
+    if not values:
+        return 0.0
+    xs = sorted(values)
+    if len(xs) == 1:
+        return float(xs[0])
+    pos = (len(xs) - 1) * (q / 100.0)
+    lo = int(pos)
+    hi = min(lo + 1, len(xs) - 1)
+    frac = pos - lo
+    return float(xs[lo] + (xs[hi] - xs[lo]) * frac)
+
+
+def atomic_write_json(path: str, data) -> None:
+    dname = os.path.dirname(path)
+    if dname:
+        os.makedirs(dname, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ==============================
+# Cronômetros por estágio
+# ==============================
+
+class CycleMetrics:
+    """
+    Acumula o tempo gasto em cada estágio durante um ciclo e, ao fechar o ciclo,
+    guarda o total por estágio numa janela deslizante para calcular percentis.
+
+    Uso:
+        m = CycleMetrics(path="logs/metrics.json")
+        with m.stage("tickers"):
+            ...
+        m.end_cycle()
+
+    Estágios podem ser aninhados (ex.: "telegram" dentro de "signals"); cada um
+    contabiliza o próprio tempo inclusivo. Thread-safe: o monitor de trades roda
+    em outra thread e usa o mesmo objeto.
+    """
+
+    def __init__(self, path: Optional[str] = None, window: int = 200, enabled: bool = True):
+        self.path = path
+        self.enabled = bool(enabled)
+        self.window = max(1, int(window))
+        self._lock = threading.Lock()
+        self._cur: Dict[str, float] = defaultdict(float)
+        self._cur_calls: Counter = Counter()
+        self._hist: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._cycles: deque = deque(maxlen=self.window)
+        self._counters: Counter = Counter()
+        self._gauges: Dict[str, float] = {}
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._cycle_start = time.perf_counter()
+        self._n_cycles = 0
+        self.last_cycle: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            with self._lock:
+                self._cur[name] += dt
+                self._cur_calls[name] += 1
+
+    def add(self, name: str, seconds: float) -> None:
+        """Soma um tempo medido fora de um `with stage(...)`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._cur[name] += float(seconds)
+            self._cur_calls[name] += 1
+
+    def incr(self, name: str, n: int = 1) -> None:
+        """Contador monotônico (ex.: requisições economizadas)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] += int(n)
+
+    def gauge(self, name: str, value: float) -> None:
+        """Valor instantâneo (ex.: profundidade de fila)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = float(value)
+
+    def observe(self, name: str, value: float) -> None:
+        """Amostra avulsa (ex.: latência de detecção de TP/SL) para percentis próprios."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._samples[name].append(float(value))
+
+    def end_cycle(self, extra: Optional[dict] = None) -> Dict[str, float]:
+        """Fecha o ciclo corrente, atualiza percentis e grava o arquivo de métricas."""
+        if not self.enabled:
+            return {}
+        now = time.perf_counter()
+        with self._lock:
+            total = now - self._cycle_start
+            cycle = dict(self._cur)
+            cycle["cycle_total"] = total
+            for k, v in cycle.items():
+                self._hist[k].append(v)
+            self._cycles.append(total)
+            calls = dict(self._cur_calls)
+            self._cur.clear()
+            self._cur_calls.clear()
+            self._cycle_start = now
+            self._n_cycles += 1
+            self.last_cycle = cycle
+            snap = self._snapshot_locked(calls, extra)
+        if self.path:
+            try:
+                atomic_write_json(self.path, snap)
+            except Exception as e:
+                print(f"[metrics] falha ao gravar {self.path}: {e}")
+        return cycle
+
+    def _snapshot_locked(self, calls: dict, extra: Optional[dict]) -> dict:
+        stages = {}
+        for k, vals in self._hist.items():
+            xs = list(vals)
+            stages[k] = {
+                "last_ms": round(self.last_cycle.get(k, 0.0) * 1000.0, 2),
+                "p50_ms": round(percentile(xs, 50) * 1000.0, 2),
+                "p90_ms": round(percentile(xs, 90) * 1000.0, 2),
+                "p99_ms": round(percentile(xs, 99) * 1000.0, 2),
+                "max_ms": round(max(xs) * 1000.0, 2) if xs else 0.0,
+                "calls_last": int(calls.get(k, 0)),
+            }
+        samples = {}
+        for k, vals in self._samples.items():
+            xs = list(vals)
+            samples[k] = {
+                "n": len(xs),
+                "p50": round(percentile(xs, 50), 4),
+                "p90": round(percentile(xs, 90), 4),
+                "p99": round(percentile(xs, 99), 4),
+                "max": round(max(xs), 4) if xs else 0.0,
+            }
+        out = {
+            "ts": time.time(),
+            "pid": os.getpid(),
+            "cycles": self._n_cycles,
+            "window": len(self._cycles),
+            "stages": stages,
+            "samples": samples,
+            "counters": dict(self._counters),
+            "gauges": dict(self._gauges),
+        }
+        if extra:
+            out["extra"] = extra
+        return out
+
+    def summary_line(self) -> str:
+        """Resumo curto do último ciclo para o log de debug."""
+        c = self.last_cycle
+        if not c:
+            return ""
+        parts = [f"{k}={v*1000:.0f}ms" for k, v in sorted(c.items(), key=lambda kv: -kv[1]) if k != "cycle_total"]
+        return f"total={c.get('cycle_total', 0.0)*1000:.0f}ms " + " ".join(parts)
+
+
+class _NullMetrics(CycleMetrics):
+    def __init__(self):
+        super().__init__(path=None, enabled=False)
+
+
+NULL_METRICS = _NullMetrics()
+
+
+# ==============================
+# Profiler por amostragem
+# ==============================
+
+class SamplingProfiler:
+    """
+    Amostra periodicamente a stack de uma thread (por padrão a principal) via
+    sys._current_frames() e acumula stacks "collapsed":
+        modulo:func;modulo:func;... <contagem>
+    O arquivo .folded gerado vai direto no flamegraph.pl ou no speedscope.
+    """
+
+    def __init__(self, interval_ms: float = 10.0, out_dir: str = "logs", thread_id: Optional[int] = None):
+        self.interval = max(0.001, float(interval_ms) / 1000.0)
+        self.out_dir = out_dir
+        self.thread_id = thread_id or threading.main_thread().ident
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._th: Optional[threading.Thread] = None
+        self._started_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._th is not None and self._th.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stacks.clear()
+        self._stop.clear()
+        self._started_at = time.time()
+        self._th = threading.Thread(target=self._loop, name="sampling-profiler", daemon=True)
+        self._th.start()
+        print(f"[profiler] ligado (intervalo={self.interval*1000:.0f}ms)")
+
+    def stop(self) -> Optional[str]:
+        """Desliga e grava o .folded; retorna o caminho gravado (ou None)."""
+        if not self.running:
+            return None
+        self._stop.set()
+        self._th.join(timeout=2.0)
+        self._th = None
+        return self.dump()
+
+    def toggle(self) -> None:
+        if self.running:
+            path = self.stop()
+            print(f"[profiler] desligado — stacks em {path}")
+        else:
+            self.start()
+
+    def _loop(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self.thread_id == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                mod = os.path.splitext(os.path.basename(code.co_filename))[0]
+                stack.append(f"{mod}:{code.co_name}")
+                frame = frame.f_back
+            self._stacks[";".join(reversed(stack))] += 1
+
+    def dump(self) -> Optional[str]:
+        if not self._stacks:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self._started_at or time.time()))
+        path = os.path.join(self.out_dir, f"profile_{stamp}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self._stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        return path
+
+    def install_signal(self, signame: str = "SIGUSR1") -> bool:
+        """Registra o toggle num sinal POSIX (só funciona na thread principal)."""
+        sig = getattr(signal, signame, None)
+        if sig is None:
+            return False
+        try:
+            signal.signal(sig, lambda *_: self.toggle())
+            return True
+        except (ValueError, OSError):
+            return False
+
+
+def metrics_from_cfg(cfg: dict) -> tuple[CycleMetrics, Optional[SamplingProfiler]]:
+    """Cria métricas + profiler a partir da seção `metrics` do YAML."""
+    mc = cfg.get("metrics") or {}
+    if not mc.get("enabled", True):
+        return NULL_METRICS, None
+    metrics = CycleMetrics(
+        path=mc.get("file", "logs/metrics.json"),
+        window=int(mc.get("window_cycles", 200)),
+    )
+    pc = mc.get("profiler") or {}
+    prof = SamplingProfiler(
+        interval_ms=float(pc.get("interval_ms", 10)),
+        out_dir=pc.get("out_dir", "logs"),
+    )
+    if prof.install_signal(pc.get("signal", "SIGUSR1")):
+        print(f"[profiler] toggle via kill -{str(pc.get('signal', 'SIGUSR1')).replace('SIG', '')} {os.getpid()}")
+    if pc.get("start_enabled", False):
+        prof.start()
+    return metrics, prof
@@ -0,0 +1,570 @@
+# moonshot_monitor.py — monitor de trades (TP1/TP2/TP3/STOP) desacoplado do scan
+# - Roda em thread própria, na cadência `monitor.every_sec` (independe do tempo do batch)
+# - Um único GET /v5/market/tickers por rodada para todos os trades abertos
+# - Transições LONG/SHORT unificadas (sinal do lado), com cascata na mesma leitura
+#   (ex.: preço acima do TP2 vindo de OPEN gera TP1 e TP2 na mesma rodada)
+# - Notificações vão para uma fila consumida por outra thread (Telegram lento não
+#   atrasa a detecção)
+# - Latência de detecção vai para as métricas
+# - Resolução intrabar: velas de 1m desde a última checagem (high/low) decidem quais níveis
+#   foram tocados e em que ordem, com o horário da vela no `updates`. Só baixa klines dos
+#   símbolos cujo range 24h do ticker alcança algum nível pendente.
+#
+# YAML opcional (valores padrão):
+#   monitor:
+#     threaded: true    # false => roda uma vez por ciclo, após o batch (comportamento antigo)
+#     every_sec: 5
+#     intrabar: true    # false => só o lastPrice do ticker
+#     intrabar_max_lookback_min: 180
+#     intrabar_workers: 8
+#   breakeven_after_tp1: true
+#
+# Os trades abertos ficam espelhados em arrays NumPy (TradeBook): dado um vetor de
+# preços (ou high/low), as transições possíveis de todos os trades saem de poucas
+# comparações vetorizadas, e só os trades que mudam passam pela regra escalar.
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from moonshot_metrics import NULL_METRICS, CycleMetrics
+
+CLOSED_STATUSES = ("CLOSED_TP3", "STOP")
+OPEN_STATUSES = ("OPEN", "TP1", "TP2")
+TS_FMT = "%Y-%m-%d %H:%M:%S UTC"
+
+
+# (start_ms, open, high, low, close)
+Candle = Tuple[int, float, float, float, float]
+
+
+def utc_now_str() -> str:
+    return datetime.utcnow().strftime(TS_FMT)
+
+
+def ms_to_utc_str(ms: int) -> str:
+    return datetime.utcfromtimestamp(ms / 1000.0).strftime(TS_FMT)
+
+
+def parse_utc_ms(s: str) -> Optional[int]:
+    try:
+        dt = datetime.strptime(s, TS_FMT)
+    except (TypeError, ValueError):
+        return None
+    return int((dt - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+def roi_pct(entry, exit_price, lev, side="LONG"):
+    dir_ = 1.0 if side == "LONG" else -1.0
+    return round(dir_ * ((exit_price - entry) / entry) * lev * 100, 4)
+
+
+def is_open(tr: dict) -> bool:
+    return tr.get("status") not in CLOSED_STATUSES
+
+
+# ==============================
+# Transições (escalar, por trade)
+# ==============================
+
+def _event(tr: dict, name: str, fill: float, ts: str, closing: bool) -> dict:
+    upd = {"ts": ts, "event": name, "price": fill}
+    if closing:
+        upd["roi_pct"] = tr["roi_pct"]
+    tr.setdefault("updates", []).append(upd)
+    # snapshot do trade no momento do evento (o dict continua mudando depois)
+    return {
+        "event": name,
+        "price": fill,
+        "ts": ts,
+        "symbol": tr["symbol"],
+        "side": tr.get("side", "LONG"),
+        "tf": tr.get("tf"),
+        "entry": tr["entry"],
+        "sl": tr["sl"],
+        "tp1": tr["tp1"],
+        "tp2": tr["tp2"],
+        "tp3": tr["tp3"],
+        "lev": tr.get("lev", 1),
+        "roi_pct": roi_pct(tr["entry"], fill, tr.get("lev", 1), tr.get("side", "LONG")),
+        "closing": closing,
+    }
+
+
+def _close(tr: dict, status: str, fill: float, reason: str, ts: str) -> None:
+    tr["status"] = status
+    tr.update({
+        "exit_price": fill,
+        "exit_reason": reason,
+        "roi_pct": roi_pct(tr["entry"], fill, tr.get("lev", 1), tr.get("side", "LONG")),
+        "closed_at": ts,
+    })
+
+
+def advance(tr: dict, price: float, ts: Optional[str] = None, at_level: bool = False,
+            breakeven: bool = True) -> List[dict]:
+    """
+    Aplica ao trade todas as transições que `price` dispara, em ordem, e devolve os eventos.
+
+    LONG e SHORT usam a mesma regra com s=+1/-1 (s*preço >= s*alvo). Com at_level=True
+    o preço registrado é o do nível (TP/SL), não o da leitura — usado quando o preço
+    vem de um caminho intrabar contínuo.
+    """
+    events: List[dict] = []
+    if not is_open(tr):
+        return events
+    s = 1.0 if tr.get("side", "LONG") == "LONG" else -1.0
+    ts = ts or utc_now_str()
+    p = s * float(price)
+    while True:
+        st = tr["status"]
+        if st not in OPEN_STATUSES:
+            break
+        if st == "OPEN" and p >= s * tr["tp1"]:
+            fill = tr["tp1"] if at_level else price
+            tr["status"] = "TP1"
+            if breakeven:
+                tr["sl"] = tr["entry"]
+            events.append(_event(tr, "TP1", fill, ts, closing=False))
+        elif p <= s * tr["sl"]:
+            fill = tr["sl"] if at_level else price
+            reason = "STOP" if s * fill < s * tr["entry"] else "BE"
+            _close(tr, "STOP", fill, reason, ts)
+            events.append(_event(tr, "STOP", fill, ts, closing=True))
+        elif st == "TP1" and p >= s * tr["tp2"]:
+            fill = tr["tp2"] if at_level else price
+            tr["status"] = "TP2"
+            events.append(_event(tr, "TP2", fill, ts, closing=False))
+        elif st in ("TP1", "TP2") and p >= s * tr["tp3"]:
+            fill = tr["tp3"] if at_level else price
+            _close(tr, "CLOSED_TP3", fill, "TP3", ts)
+            events.append(_event(tr, "TP3", fill, ts, closing=True))
+        else:
+            break
+    return events
+
+
+# ==============================
+# Resolução intrabar (velas de 1m)
+# ==============================
+
+def candle_path(o: float, h: float, l: float, c: float) -> Sequence[float]:
+    """
+    Caminho de preço assumido dentro da vela: vela de alta faz O→L→H→C,
+    vela de baixa faz O→H→L→C (convenção usual de backtest com OHLC).
+    """
+    return (o, l, h, c) if c >= o else (o, h, l, c)
+
+
+def resolve_candles(tr: dict, candles: Sequence[Candle], breakeven: bool = True) -> List[dict]:
+    """
+    Percorre as velas em ordem, aplicando `advance` em cada ponto do caminho intrabar.
+    A abertura é aplicada com o próprio preço (gap); os trechos seguintes são contínuos
+    e registram o preço do nível tocado. Cada evento leva o horário da vela.
+    """
+    events: List[dict] = []
+    for start_ms, o, h, l, c in candles:
+        if not is_open(tr):
+            break
+        ts = ms_to_utc_str(start_ms)
+        path = candle_path(o, h, l, c)
+        for i, px in enumerate(path):
+            for ev in advance(tr, px, ts=ts, at_level=(i > 0), breakeven=breakeven):
+                ev["bar_ms"] = int(start_ms)
+                events.append(ev)
+    return events
+
+
+# ==============================
+# Espelho vetorizado dos trades abertos
+# ==============================
+
+STATUS_CODE = {"OPEN": 0, "TP1": 1, "TP2": 2}
+_FREE = -1
+
+
+class TradeBook:
+    """
+    Trades abertos em arrays compactos (entry, sl, tp1..3, sinal do lado, status, símbolo).
+
+    `candidates(hi, lo)` devolve só as chaves cujo range [lo, hi] alcança algum nível
+    pendente — a mesma condição de `advance`, avaliada para todos os trades de uma vez.
+    Linhas de trades fechados vão para uma free-list e são reaproveitadas.
+    """
+
+    _COLS = ("entry", "sl", "tp1", "tp2", "tp3", "sign")
+
+    def __init__(self, capacity: int = 64):
+        cap = max(8, int(capacity))
+        self.keys: List[Optional[str]] = [None] * cap
+        self.row: Dict[str, int] = {}
+        self.symbols: List[str] = []
+        self.sym_id: Dict[str, int] = {}
+        self._free: List[int] = list(range(cap - 1, -1, -1))
+        for c in self._COLS:
+            setattr(self, c, np.zeros(cap, dtype=np.float64))
+        self.status = np.full(cap, _FREE, dtype=np.int8)
+        self.sym = np.zeros(cap, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.row)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.row
+
+    def _grow(self) -> None:
+        old = len(self.keys)
+        new = old * 2
+        self.keys.extend([None] * (new - old))
+        self._free.extend(range(new - 1, old - 1, -1))
+        for c in self._COLS:
+            arr = getattr(self, c)
+            setattr(self, c, np.concatenate([arr, np.zeros(new - old, dtype=arr.dtype)]))
+        self.status = np.concatenate([self.status, np.full(new - old, _FREE, dtype=np.int8)])
+        self.sym = np.concatenate([self.sym, np.zeros(new - old, dtype=np.int32)])
+
+    def upsert(self, key: str, tr: dict) -> None:
+        """Insere/atualiza a linha do trade; remove se ele já fechou."""
+        if not is_open(tr) or tr.get("status") not in STATUS_CODE:
+            self.remove(key)
+            return
+        i = self.row.get(key)
+        if i is None:
+            if not self._free:
+                self._grow()
+            i = self._free.pop()
+            self.row[key] = i
+            self.keys[i] = key
+        sym = tr["symbol"]
+        sid = self.sym_id.get(sym)
+        if sid is None:
+            sid = self.sym_id[sym] = len(self.symbols)
+            self.symbols.append(sym)
+        self.entry[i] = float(tr["entry"])
+        self.sl[i] = float(tr["sl"])
+        self.tp1[i] = float(tr["tp1"])
+        self.tp2[i] = float(tr["tp2"])
+        self.tp3[i] = float(tr["tp3"])
+        self.sign[i] = 1.0 if tr.get("side", "LONG") == "LONG" else -1.0
+        self.status[i] = STATUS_CODE[tr["status"]]
+        self.sym[i] = sid
+
+    def remove(self, key: str) -> None:
+        i = self.row.pop(key, None)
+        if i is None:
+            return
+        self.keys[i] = None
+        self.status[i] = _FREE
+        self._free.append(i)
+
+    def sync(self, items: Iterable[Tuple[str, dict]]) -> None:
+        for key, tr in items:
+            self.upsert(key, tr)
+
+    def open_keys(self) -> List[str]:
+        return list(self.row)
+
+    def symbol_vector(self, values: Dict[str, float]) -> np.ndarray:
+        """Vetor alinhado a `self.symbols` (NaN onde não há preço — nunca dispara)."""
+        v = np.full(len(self.symbols), np.nan)
+        for sym, x in values.items():
+            j = self.sym_id.get(sym)
+            if j is not None and x is not None:
+                v[j] = x
+        return v
+
+    def candidates(self, hi_by_sym: Dict[str, float], lo_by_sym: Optional[Dict[str, float]] = None) -> List[str]:
+        """Chaves dos trades com alguma transição possível dado o range [lo, hi] do símbolo."""
+        if not self.row:
+            return []
+        rows = np.fromiter(self.row.values(), dtype=np.int64, count=len(self.row))
+        hi_s = self.symbol_vector(hi_by_sym)
+        lo_s = hi_s if lo_by_sym is None else self.symbol_vector(lo_by_sym)
+        sid = self.sym[rows]
+        hi, lo = hi_s[sid], lo_s[sid]
+        s = self.sign[rows]
+        st = self.status[rows]
+        fav = s * np.where(s > 0, hi, lo)   # extremo a favor
+        adv = s * np.where(s > 0, lo, hi)   # extremo contra
+        with np.errstate(invalid="ignore"):
+            hit = (st == 0) & (fav >= s * self.tp1[rows])
+            hit |= adv <= s * self.sl[rows]
+            hit |= (st == 1) & (fav >= s * self.tp2[rows])
+            hit |= (st >= 1) & (fav >= s * self.tp3[rows])
+        return [self.keys[i] for i in rows[hit]]
+
+
+# ==============================
+# Monitor em thread própria
+# ==============================
+
+class TradeMonitor:
+    """
+    Dono do ciclo de vida TP/SL dos trades abertos.
+
+    - trades/lock: o dict compartilhado com o scan e o RLock que o protege
+    - price_source(): devolve {symbol: ticker} (um único GET bulk)
+    - save(trades, keys): persiste só os trades `keys` que mudaram (chamado com o lock adquirido)
+    - notify(key, ev): envia a notificação de um evento (roda na thread notificadora)
+    - on_close(key, tr, ev): hook opcional quando o trade fecha (roda na thread do monitor)
+    - kline_source(symbol, start_ms, limit): velas de 1m [(start_ms, o, h, l, c)] em ordem;
+      se None, usa só o lastPrice do ticker
+    """
+
+    def __init__(
+        self,
+        trades: Dict[str, dict],
+        lock: threading.RLock,
+        price_source: Callable[[], Dict[str, dict]],
+        save: Callable[[Dict[str, dict], List[str]], None],
+        notify: Callable[[str, dict], None],
+        every_sec: float = 5.0,
+        breakeven: bool = True,
+        metrics: CycleMetrics = NULL_METRICS,
+        on_close: Optional[Callable[[str, dict, dict], None]] = None,
+        kline_source: Optional[Callable[[str, int, int], List[Candle]]] = None,
+        max_lookback_min: float = 180.0,
+        workers: int = 8,
+    ):
+        self.trades = trades
+        self.lock = lock
+        self.price_source = price_source
+        self.save = save
+        self.notify = notify
+        self.every_sec = max(0.5, float(every_sec))
+        self.breakeven = bool(breakeven)
+        self.metrics = metrics
+        self.on_close = on_close
+        self.kline_source = kline_source
+        self.max_lookback_ms = int(float(max_lookback_min) * 60_000)
+        self.workers = max(1, int(workers))
+        self.notifications: "queue.Queue[tuple[str, dict]]" = queue.Queue()
+        self._last_check: Dict[str, float] = {}
+        self._since_ms: Dict[str, int] = {}            # por trade: início da última vela vista
+        self._kline_cache: Dict[str, List[Candle]] = {}  # por símbolo
+        self._started_ms = int(time.time() * 1000)
+        self.book = TradeBook(capacity=len(trades) or 64)
+        with self.lock:
+            self.book.sync(self.trades.items())
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    # ---------- rodada ----------
+    def track(self, key: str) -> None:
+        """Registra um trade recém-criado (chamar com o trade já no dict)."""
+        with self.lock:
+            tr = self.trades.get(key)
+            if tr is not None:
+                self.book.upsert(key, tr)
+
+    def open_items(self) -> List[tuple[str, dict]]:
+        with self.lock:
+            return [(k, self.trades[k]) for k in self.book.open_keys() if k in self.trades]
+
+    def _trade_since_ms(self, key: str, tr: dict, now_ms: int) -> int:
+        since = self._since_ms.get(key)
+        if since is None:
+            since = tr.get("opened_ms")
+            if since is None:
+                # trade antigo/legado: última atualização registrada ou início do processo
+                upd = (tr.get("updates") or [])
+                since = parse_utc_ms(upd[-1].get("ts")) if upd else None
+                since = since or self._started_ms
+        return max(int(since), now_ms - self.max_lookback_ms)
+
+    def _fetch_candles(self, want: Dict[str, int]) -> Dict[str, List[Candle]]:
+        """Baixa (em paralelo) só as velas que faltam no cache de cada símbolo."""
+
+        def _one(sym: str, since: int):
+            cached = self._kline_cache.get(sym) or []
+            start = cached[-1][0] if cached and cached[0][0] <= since else since
+            fresh = self.kline_source(sym, start, 1000) or []
+            merged = {c[0]: c for c in cached if c[0] >= since}
+            for c in fresh:
+                merged[c[0]] = c  # a vela em formação é substituída pela versão nova
+            return sym, sorted(merged.values()), bool(fresh)
+
+        out: Dict[str, List[Candle]] = {}
+        if not want:
+            return out
+        with self.metrics.stage("monitor_klines"):
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(want))) as ex:
+                for sym, candles, ok in ex.map(lambda kv: _one(*kv), want.items()):
+                    self._kline_cache[sym] = candles
+                    if ok:
+                        out[sym] = candles
+        self.metrics.incr("monitor_kline_requests", len(want))
+        return out
+
+    @staticmethod
+    def _last_prices(tick_map: Dict[str, dict], symbols: Iterable[str]) -> Dict[str, float]:
+        out: Dict[str, float] = {}
+        for sym in symbols:
+            t = tick_map.get(sym)
+            try:
+                out[sym] = float(t.get("lastPrice")) if t else None
+            except (TypeError, ValueError):
+                out[sym] = None
+        return out
+
+    def poll_once(self) -> List[dict]:
+        """Uma rodada completa: preços bulk → (velas 1m) → transições → persistência → notificações."""
+        items = self.open_items()
+        if not items:
+            self._kline_cache.clear()
+            return []
+        with self.metrics.stage("monitor_prices"):
+            tick_map = self.price_source() or {}
+        now = time.time()
+        now_ms = int(now * 1000)
+        ts = utc_now_str()
+        by_key = dict(items)
+        syms = {tr["symbol"] for tr in by_key.values()}
+        last = self._last_prices(tick_map, syms)
+
+        # (key -> velas a percorrer) e (key -> preço snapshot) só para trades candidatos
+        bar_work: Dict[str, List[Candle]] = {}
+        snap_work: Dict[str, float] = {}
+        if self.kline_source is not None:
+            # 1) filtro vetorizado pelo range 24h do ticker → quem precisa de velas
+            hi24, lo24 = {}, {}
+            for sym in syms:
+                t = tick_map.get(sym) or {}
+                try:
+                    hi24[sym], lo24[sym] = float(t.get("highPrice24h")), float(t.get("lowPrice24h"))
+                except (TypeError, ValueError):
+                    hi24[sym], lo24[sym] = float("inf"), float("-inf")  # sem range: sempre checa
+            with self.lock:
+                maybe = set(self.book.candidates(hi24, lo24))
+            want: Dict[str, int] = {}
+            for key, tr in items:
+                since = self._trade_since_ms(key, tr, now_ms)
+                self._since_ms.setdefault(key, since)
+                if key not in maybe:
+                    # nenhum nível no range 24h: nada a resolver até a vela atual
+                    self._since_ms[key] = now_ms - now_ms % 60_000
+                    continue
+                want[tr["symbol"]] = min(want.get(tr["symbol"], since), since)
+            self.metrics.incr("monitor_kline_skipped", len(syms) - len(want))
+            candles = self._fetch_candles(want)
+            for sym in list(self._kline_cache):
+                if sym not in want:
+                    self._kline_cache.pop(sym, None)
+
+            # 2) filtro vetorizado pelo high/low das velas novas → quem de fato mudou
+            hi_b, lo_b = {}, {}
+            for sym, bars in candles.items():
+                hi_b[sym] = max(c[2] for c in bars)
+                lo_b[sym] = min(c[3] for c in bars)
+            with self.lock:
+                moved = set(self.book.candidates(hi_b, lo_b)) if hi_b else set()
+            for key in maybe:
+                tr = by_key.get(key)
+                if tr is None:
+                    continue
+                bars = candles.get(tr["symbol"])
+                if bars is None:
+                    if last.get(tr["symbol"]) is not None:
+                        snap_work[key] = last[tr["symbol"]]
+                    continue
+                since = self._since_ms.get(key, 0)
+                if key in moved:
+                    bar_work[key] = [c for c in bars if c[0] >= since]
+                self._since_ms[key] = bars[-1][0]
+        else:
+            with self.lock:
+                for key in self.book.candidates(last):
+                    snap_work[key] = last[by_key[key]["symbol"]]
+        self.metrics.gauge("monitor_candidates", len(bar_work) + len(snap_work))
+
+        fired: List[tuple[str, dict, dict]] = []
+        with self.lock:
+            for key in list(bar_work) + list(snap_work):
+                tr = by_key[key]
+                if not is_open(tr):
+                    continue
+                if key in bar_work:
+                    evs = resolve_candles(tr, bar_work[key], breakeven=self.breakeven)
+                    for upd in tr["updates"][len(tr["updates"]) - len(evs):]:
+                        upd["detected_at"] = ts
+                else:
+                    evs = advance(tr, snap_work[key], ts=ts, breakeven=self.breakeven)
+                if not evs:
+                    continue
+                prev = self._last_check.get(key)
+                for ev in evs:
+                    ev["key"] = key
+                    if "bar_ms" in ev:
+                        ev["latency_s"] = round(now - ev["bar_ms"] / 1000.0, 3)
+                    else:
+                        ev["latency_s"] = round(now - prev, 3) if prev else None
+                    fired.append((key, tr, ev))
+                self.book.upsert(key, tr)  # sl/status novos (ou remove se fechou)
+                if not is_open(tr):
+                    self._last_check.pop(key, None)
+                    self._since_ms.pop(key, None)
+            for key in by_key:
+                if key in self.book:
+                    self._last_check[key] = now
+            if fired:
+                self.save(self.trades, list(dict.fromkeys(k for k, _, _ in fired)))
+        for key, tr, ev in fired:
+            if ev.get("latency_s") is not None:
+                self.metrics.observe("tp_sl_detect_latency_s", ev["latency_s"])
+            if ev["closing"] and self.on_close is not None:
+                try:
+                    self.on_close(key, tr, ev)
+                except Exception as e:
+                    print(f"[monitor] on_close erro {key}: {e}")
+            self.notifications.put((key, ev))
+        self.metrics.gauge("monitor_open_trades", len(items))
+        self.metrics.gauge("notify_queue_depth", self.notifications.qsize())
+        return [ev for _, _, ev in fired]
+
+    # ---------- threads ----------
+    def _poll_loop(self) -> None:
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                with self.metrics.stage("monitor"):
+                    self.poll_once()
+            except Exception as e:
+                print(f"[monitor] erro: {e}")
+            self._stop.wait(max(0.0, self.every_sec - (time.perf_counter() - t0)))
+
+    def _notify_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                key, ev = self.notifications.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                self.notify(key, ev)
+            except Exception as e:
+                print(f"[monitor] notificação falhou {key} {ev.get('event')}: {e}")
+            finally:
+                self.notifications.task_done()
+
+    def start(self, threaded: bool = True) -> None:
+        """Sobe a thread notificadora e, se threaded, a thread de polling."""
+        targets = [("trade-notify", self._notify_loop)]
+        if threaded:
+            targets.insert(0, ("trade-monitor", self._poll_loop))
+        for name, fn in targets:
+            th = threading.Thread(target=fn, name=name, daemon=True)
+            th.start()
+            self._threads.append(th)
+        if threaded:
+            print(f"[monitor] thread de TP/SL a cada {self.every_sec:g}s")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        for th in self._threads:
+            th.join(timeout=timeout)
@@ -0,0 +1,185 @@
+# moonshot_prefilter.py — filtro em estágios antes de gastar requisições
+# - Estágio 1 (ticker): só o snapshot bulk de tickers, já baixado no ciclo —
+#   liquidez (turnover24h → ban ILLQ na AutoBlacklist), preço, range 24h,
+#   funding e open interest. Quem cai aqui não baixa nenhuma vela.
+# - Estágio 2 (velas): o fluxo normal do agente (auto_from_candles + regime + sinais).
+# - Estágio 3 (book): profundidade do order book só para candidatos no gatilho
+#   (sinal/pré-sinal prestes a sair), cache por ciclo.
+# - Por ciclo: requisições economizadas por estágio (métricas + linha de log).
+#
+# YAML opcional (valores padrão; 0 = regra desligada):
+#   prefilter:
+#     enabled: true
+#     min_price: 0
+#     min_range_pct_24h: 0       # mercado parado
+#     max_range_pct_24h: 0       # pump/dump extremo
+#     max_abs_funding: 0         # ex.: 0.002 (0,2%)
+#     min_open_interest_usdt: 0
+#     depth:
+#       enabled: false
+#       band_pct: 1.0            # faixa em torno do mid usada na soma
+#       min_usdt: 20000          # profundidade mínima no lado da entrada
+#       notional_mult: 0         # e/ou >= notional * mult
+#       limit: 50
+
+from __future__ import annotations
+
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from moonshot_metrics import NULL_METRICS, CycleMetrics
+
+
+def _f(x) -> Optional[float]:
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return None
+
+
+def book_depth_usdt(book: dict, side: str, band_pct: float) -> float:
+    """Soma preço*qtd do lado que a entrada consome (LONG → asks, SHORT → bids) dentro da faixa."""
+    asks = book.get("a") or []
+    bids = book.get("b") or []
+    if not asks or not bids:
+        return 0.0
+    mid = (float(asks[0][0]) + float(bids[0][0])) / 2.0
+    band = mid * band_pct / 100.0
+    levels = asks if side == "LONG" else bids
+    total = 0.0
+    for px, qty in ((float(p), float(q)) for p, q in levels):
+        if abs(px - mid) > band:
+            break
+        total += px * qty
+    return total
+
+
+class StagedPrefilter:
+    """
+    Uso por ciclo:
+        pf.begin_cycle(kline_tfs)
+        for sym in batch:
+            if pf.ticker_stage(sym, tick_map.get(sym)): continue   # sem velas
+            ...velas...
+            ok, depth = pf.depth_ok(sym, side, notional)            # só no gatilho
+        dbg(cfg, pf.end_cycle())
+    """
+
+    def __init__(
+        self,
+        cfg: dict,
+        abl=None,
+        fetch_orderbook: Optional[Callable[[str, int], Optional[dict]]] = None,
+        metrics: CycleMetrics = NULL_METRICS,
+    ):
+        pc = cfg.get("prefilter") or {}
+        self.enabled = bool(pc.get("enabled", True))
+        self.min_price = float(pc.get("min_price", 0) or 0)
+        self.min_range = float(pc.get("min_range_pct_24h", 0) or 0)
+        self.max_range = float(pc.get("max_range_pct_24h", 0) or 0)
+        self.max_funding = float(pc.get("max_abs_funding", 0) or 0)
+        self.min_oi = float(pc.get("min_open_interest_usdt", 0) or 0)
+        dc = pc.get("depth") or {}
+        self.depth_enabled = bool(dc.get("enabled", False)) and fetch_orderbook is not None
+        self.depth_band = float(dc.get("band_pct", 1.0))
+        self.depth_min = float(dc.get("min_usdt", 20000))
+        self.depth_mult = float(dc.get("notional_mult", 0) or 0)
+        self.depth_limit = int(dc.get("limit", 50))
+        self.abl = abl
+        self.fetch_orderbook = fetch_orderbook
+        self.metrics = metrics
+        self._kl_per_symbol = 2
+        self._depth_cache: Dict[str, dict] = {}
+        self._reset_counts()
+
+    def _reset_counts(self):
+        self.n_in = 0
+        self.n_ticker_skip = 0
+        self.n_klines = 0
+        self.n_depth = 0
+        self.n_depth_rej = 0
+        self.reasons: Dict[str, int] = {}
+
+    def begin_cycle(self, kline_tfs: Iterable[str]) -> None:
+        # velas que cada símbolo baixaria: 15m/60m da blacklist + TFs do scan
+        self._kl_per_symbol = len({"15", "60"} | {str(t) for t in kline_tfs})
+        self._depth_cache.clear()
+        self._reset_counts()
+
+    # ---------- estágio 1 ----------
+    def _ticker_reason(self, sym: str, t: Optional[dict]) -> Optional[str]:
+        if not t:
+            return None  # sem ticker não há o que decidir aqui
+        if self.abl is not None:
+            why = self.abl.auto_from_ticker(sym, t)
+            if why:
+                return why
+        last = _f(t.get("lastPrice"))
+        if last is not None and (last <= 0 or (self.min_price and last < self.min_price)):
+            return "PRICE"
+        hi, lo = _f(t.get("highPrice24h")), _f(t.get("lowPrice24h"))
+        if hi and lo and lo > 0 and (self.min_range or self.max_range):
+            rng = (hi - lo) / lo * 100.0
+            if self.min_range and rng < self.min_range:
+                return "RANGE_LOW"
+            if self.max_range and rng > self.max_range:
+                return "RANGE_HIGH"
+        if self.max_funding:
+            fr = _f(t.get("fundingRate"))
+            if fr is not None and abs(fr) > self.max_funding:
+                return "FUNDING"
+        if self.min_oi:
+            oi = _f(t.get("openInterestValue"))
+            if oi is not None and oi < self.min_oi:
+                return "OI"
+        return None
+
+    def ticker_stage(self, sym: str, ticker: Optional[dict]) -> Optional[str]:
+        """Motivo para pular o símbolo sem baixar velas (ou None para seguir)."""
+        self.n_in += 1
+        if not self.enabled:
+            self.n_klines += 1
+            return None
+        why = self._ticker_reason(sym, ticker)
+        if why:
+            self.n_ticker_skip += 1
+            self.reasons[why] = self.reasons.get(why, 0) + 1
+            return why
+        self.n_klines += 1
+        return None
+
+    # ---------- estágio 3 ----------
+    def depth_ok(self, sym: str, side: str, notional: float = 0.0) -> Tuple[bool, Optional[float]]:
+        """Checa o book só para quem está no gatilho. (True, None) se desligado/sem dado."""
+        if not self.depth_enabled:
+            return True, None
+        book = self._depth_cache.get(sym)
+        if book is None:
+            book = self.fetch_orderbook(sym, self.depth_limit) or {}
+            self._depth_cache[sym] = book
+            self.n_depth += 1
+        if not book:
+            return True, None
+        depth = book_depth_usdt(book, side, self.depth_band)
+        need = max(self.depth_min, notional * self.depth_mult)
+        if depth < need:
+            self.n_depth_rej += 1
+            return False, depth
+        return True, depth
+
+    # ---------- relatório ----------
+    def end_cycle(self) -> str:
+        kl_saved = self.n_ticker_skip * self._kl_per_symbol
+        # sem o estágio 3 restrito, todo símbolo que baixou velas também buscaria o book
+        book_saved = max(0, self.n_klines - self.n_depth) if self.depth_enabled else 0
+        m = self.metrics
+        m.incr("prefilter_ticker_skipped", self.n_ticker_skip)
+        m.incr("prefilter_kline_requests_saved", kl_saved)
+        m.incr("prefilter_depth_checks", self.n_depth)
+        m.incr("prefilter_depth_requests_saved", book_saved)
+        m.gauge("prefilter_last_kline_requests_saved", kl_saved)
+        why = ",".join(f"{k}:{v}" for k, v in sorted(self.reasons.items())) or "-"
+        return (
+            f"prefiltro | ticker: {self.n_ticker_skip}/{self.n_in} fora ({why}) → {kl_saved} req. de velas poupadas | "
+            f"velas: {self.n_klines} | book: {self.n_depth} checados, {self.n_depth_rej} rejeitados, "
+            f"{book_saved} req. poupadas"
+        )
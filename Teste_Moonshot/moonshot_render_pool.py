@@ -0,0 +1,103 @@
+# moonshot_render_pool.py — geração dos cards fora do monitor e do sender
+# - RenderPool: fila + poucas threads que rodam o renderer (PIL) e devolvem um Future;
+#   o monitor só enfileira o dict do card e segue checando os trades
+# - Com o TelegramOutbox, o card começa a ser gerado no momento em que a mensagem
+#   entra na fila; o sender só pega os bytes prontos (chats sem card pendente não esperam)
+# - Threads e não processos: os renderers são closures (archive, fundo) que não
+#   serializam, e o encode do PNG/JPEG (zlib/libjpeg) solta o GIL — é onde vai o tempo
+# - Métricas para dimensionar o pool: card_queue_depth (gauge, na fila + rodando),
+#   card_render_ms e card_queue_wait_ms (percentis), card_render_failed / card_dropped
+#
+# YAML opcional (valores padrão):
+#   cards:
+#     workers: 2             # 0 = gera na thread do sender, como antes
+#     max_queue: 200         # acima disso o card é gerado na hora pelo chamador
+#     render_timeout_sec: 30 # card que não ficou pronto nesse tempo vai como texto
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from moonshot_metrics import NULL_METRICS, CycleMetrics
+
+
+class RenderPool:
+    """
+    pool = RenderPool(workers=2, metrics=METRICS)
+    fut = pool.submit(render_tp_card, card, bg_path=bg)   # não bloqueia
+    png = fut.result()                                     # no consumidor (sender)
+    pool.stop()
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 200, render_timeout: float = 30.0,
+                 metrics: CycleMetrics = NULL_METRICS):
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        self.render_timeout = float(render_timeout)
+        self.metrics = metrics
+        self._ex = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="card-render")
+        self._lock = threading.Lock()
+        self._depth = 0
+
+    def submit(self, fn: Callable[..., object], *args, **kwargs) -> Optional[Future]:
+        """Future com o retorno de fn(*args, **kwargs); None com a fila cheia (chamador decide)."""
+        with self._lock:
+            if self._depth >= self.max_queue:
+                self.metrics.incr("card_dropped")
+                return None
+            self._depth += 1
+            self.metrics.gauge("card_queue_depth", self._depth)
+        t_enq = time.perf_counter()
+
+        def run():
+            t0 = time.perf_counter()
+            self.metrics.observe("card_queue_wait_ms", (t0 - t_enq) * 1000.0)
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                self.metrics.incr("card_render_failed")
+                raise
+            finally:
+                self.metrics.observe("card_render_ms", (time.perf_counter() - t0) * 1000.0)
+
+        def release(_fut):
+            # também dispara no cancel() de um card ainda na fila (que nunca roda)
+            with self._lock:
+                self._depth -= 1
+                self.metrics.gauge("card_queue_depth", self._depth)
+
+        try:
+            fut = self._ex.submit(run)
+        except RuntimeError:  # pool já encerrado
+            with self._lock:
+                self._depth -= 1
+            return None
+        fut.add_done_callback(release)
+        return fut
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._depth
+
+    def stop(self, wait: bool = True) -> None:
+        self._ex.shutdown(wait=wait)
+
+
+def render_pool_from_cfg(cfg: dict, metrics: CycleMetrics = NULL_METRICS) -> Optional[RenderPool]:
+    cc = cfg.get("cards") or {}
+    workers = int(cc.get("workers", 2))
+    if workers <= 0:
+        return None
+    return RenderPool(workers, int(cc.get("max_queue", 200)), float(cc.get("render_timeout_sec", 30)), metrics)
+
+
+def render_pool_from_env(env: dict, metrics: CycleMetrics = NULL_METRICS) -> Optional[RenderPool]:
+    """Daemons (tools/): CARD_WORKERS (padrão 1; 0 desliga), CARD_MAX_QUEUE, CARD_RENDER_TIMEOUT_SEC."""
+    workers = int(env.get("CARD_WORKERS") or 1)
+    if workers <= 0:
+        return None
+    return RenderPool(workers, int(env.get("CARD_MAX_QUEUE") or 200),
+                      float(env.get("CARD_RENDER_TIMEOUT_SEC") or 30), metrics)
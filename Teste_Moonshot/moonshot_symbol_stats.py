@@ -0,0 +1,178 @@
+# moonshot_symbol_stats.py — desempenho por símbolo em janela deslizante
+# - Agregados por símbolo (fechados, stops, TP1/TP3, PnL líquido) atualizados em O(1)
+#   a cada trade fechado pelo monitor (expiração da janela amortizada)
+# - perf_flags(): as regras do build_blacklist.py (stop rate, winrate TP3, PnL),
+#   compartilhadas entre o job manual e a avaliação ao vivo
+# - No agente, um símbolo marcado ganha cooldown na AutoBlacklist (ban_temp)
+#
+# YAML opcional (valores padrão):
+#   blacklist:
+#     perf_rules:
+#       enabled: true
+#       window_days: 14
+#       min_trades: 6
+#       stop_rate: 0.65        # marca se stop_rate >= X
+#       max_tp3_win: 0.15      # marca se winrate TP3 <= X
+#       max_netpnl: -10.0      # marca se PnL líquido <= X (USDT)
+#       cooldown_hours: 24
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from moonshot_monitor import parse_utc_ms
+
+DEFAULT_PERF_RULES = {
+    "min_trades": 6,
+    "stop_rate": 0.65,
+    "max_tp3_win": 0.15,
+    "max_netpnl": -10.0,
+}
+
+
+def est_pnl_usdt(t: dict) -> float:
+    """Aproxima o PnL do trade usando roi_pct*notional/100, se existir."""
+    roi = float(t.get("roi_pct", 0.0) or 0.0)
+    notion = float(t.get("notional", 0.0) or 0.0)
+    return (roi / 100.0) * notion
+
+
+def perf_flags(closed: int, stops: int, tp3: int, pnl: float, rules: Optional[dict] = None) -> List[str]:
+    """Regras de desempenho do build_blacklist; lista vazia = símbolo ok."""
+    r = dict(DEFAULT_PERF_RULES, **(rules or {}))
+    if closed < int(r["min_trades"]) or closed <= 0:
+        return []
+    stop_rate = stops / closed
+    tp3_win = tp3 / closed
+    out = []
+    if stop_rate >= float(r["stop_rate"]):
+        out.append(f"stop_rate={stop_rate:.2f}")
+    if tp3_win <= float(r["max_tp3_win"]):
+        out.append(f"tp3_win={tp3_win:.2f}")
+    if pnl <= float(r["max_netpnl"]):
+        out.append(f"netPnL={pnl:.2f}")
+    return out
+
+
+@dataclass
+class Outcome:
+    ts: float          # epoch s do fechamento
+    stop: bool
+    tp3: bool
+    tp1: bool
+    pnl: float
+
+
+def trade_outcome(tr: dict, now: Optional[float] = None) -> Optional[Outcome]:
+    """Resultado de um trade fechado (None se ainda aberto)."""
+    status = tr.get("status")
+    if status not in ("CLOSED_TP3", "STOP"):
+        return None
+    ms = parse_utc_ms(tr.get("closed_at") or "")
+    return Outcome(
+        ts=(ms / 1000.0) if ms is not None else (now or time.time()),
+        stop=status == "STOP",
+        tp3=status == "CLOSED_TP3",
+        tp1=any(u.get("event") == "TP1" for u in tr.get("updates") or []),
+        pnl=est_pnl_usdt(tr),
+    )
+
+
+class _Agg:
+    __slots__ = ("items", "closed", "stops", "tp3", "tp1", "pnl")
+
+    def __init__(self):
+        self.items: deque = deque()
+        self.closed = 0
+        self.stops = 0
+        self.tp3 = 0
+        self.tp1 = 0
+        self.pnl = 0.0
+
+    def push(self, o: Outcome, sign: int = 1):
+        self.closed += sign
+        self.stops += sign * o.stop
+        self.tp3 += sign * o.tp3
+        self.tp1 += sign * o.tp1
+        self.pnl += sign * o.pnl
+
+
+class SymbolStats:
+    """
+    Somas por símbolo numa janela deslizante (window_days). `add` é O(1); cada resultado
+    entra e sai da janela uma vez só. Thread-safe (o monitor chama de outra thread).
+    """
+
+    def __init__(self, window_days: float = 14.0):
+        self.window = float(window_days) * 86400.0
+        self._lock = threading.Lock()
+        self._by_sym: Dict[str, _Agg] = {}
+
+    def _expire(self, a: _Agg, now: float):
+        cut = now - self.window
+        while a.items and a.items[0].ts < cut:
+            a.push(a.items.popleft(), -1)
+
+    def add(self, symbol: str, o: Outcome, now: Optional[float] = None) -> dict:
+        now = now or time.time()
+        with self._lock:
+            a = self._by_sym.setdefault(symbol, _Agg())
+            if o.ts >= now - self.window:
+                a.items.append(o)  # fechamentos chegam em ordem; seed ordena antes
+                a.push(o)
+            self._expire(a, now)
+            return self._row(symbol, a)
+
+    def add_trade(self, tr: dict, now: Optional[float] = None) -> Optional[dict]:
+        o = trade_outcome(tr, now)
+        if o is None:
+            return None
+        return self.add(tr["symbol"], o, now)
+
+    def seed(self, trades: Dict[str, dict], now: Optional[float] = None) -> int:
+        """Carga inicial com os trades fechados já existentes (dentro da janela)."""
+        now = now or time.time()
+        outs = []
+        for tr in trades.values():
+            o = trade_outcome(tr, now)
+            if o is not None and tr.get("symbol"):
+                outs.append((o.ts, tr["symbol"], o))
+        outs.sort(key=lambda x: x[0])
+        for _, sym, o in outs:
+            self.add(sym, o, now)
+        return len(outs)
+
+    @staticmethod
+    def _row(symbol: str, a: _Agg) -> dict:
+        return {"symbol": symbol, "closed": a.closed, "stops": a.stops, "tp3": a.tp3,
+                "tp1_hits": a.tp1, "pnl": round(a.pnl, 2)}
+
+    def get(self, symbol: str, now: Optional[float] = None) -> dict:
+        with self._lock:
+            a = self._by_sym.get(symbol) or _Agg()
+            self._expire(a, now or time.time())
+            return self._row(symbol, a)
+
+    def all(self, now: Optional[float] = None) -> List[dict]:
+        now = now or time.time()
+        with self._lock:
+            out = []
+            for sym, a in self._by_sym.items():
+                self._expire(a, now)
+                if a.closed:
+                    out.append(self._row(sym, a))
+            return out
+
+
+def perf_cfg(cfg: dict) -> dict:
+    pr = ((cfg.get("blacklist") or {}).get("perf_rules") or {})
+    out = dict(DEFAULT_PERF_RULES)
+    out.update({k: pr[k] for k in DEFAULT_PERF_RULES if k in pr})
+    out["enabled"] = bool(pr.get("enabled", True))
+    out["window_days"] = float(pr.get("window_days", 14))
+    out["cooldown_hours"] = float(pr.get("cooldown_hours", 24))
+    return out
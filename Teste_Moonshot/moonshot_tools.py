@@ -18,7 +18,7 @@ except Exception:  # pragma: no cover
 import yaml
 
 # componentes do projeto
-from moonshot_blacklist import AutoBlacklist
+from moonshot_blacklist import AutoBlacklist, blacklist_from_cfg
 from moonshot_agent import fetch_instruments_page, load_json, save_json
 
 
@@ -31,13 +31,7 @@ def load_cfg(path: str = "moonshot_config.yaml") -> dict:
 
 
 def make_abl(cfg: dict) -> AutoBlacklist:
-    bl = (cfg.get("blacklist") or {})
-    return AutoBlacklist(
-        path=bl.get("file", cfg.get("blacklist_file", "moonshot_blacklist.json")),
-        rules=bl.get("rules", {}),
-        hard_denylist=(bl.get("hard_denylist") or cfg.get("denylist") or []),
-        enabled=bl.get("enabled", True),
-    )
+    return blacklist_from_cfg(cfg)
 
 
 def get_tz(cfg: dict):
@@ -276,7 +270,7 @@ def op_stats(cfg: dict, quote: Optional[str], use_cache: bool) -> None:
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(
         prog="moonshot_tools",
-        description="Ferramentas auxiliares do projeto Moonshot (blacklist e universo de símbolos).",
+        description="Ferramentas auxiliares do projeto Moonshot (blacklist, universo de símbolos e analytics).",
     )
     p.add_argument("--cfg", default="moonshot_config.yaml", help="Caminho do YAML de config (padrão: moonshot_config.yaml)")
     sub = p.add_subparsers(dest="cmd", required=True)
@@ -311,11 +305,24 @@ def build_parser() -> argparse.ArgumentParser:
     s8.add_argument("--quote", default=None, help="Filtrar por quote (ex.: USDT).")
     s8.add_argument("--use-cache", action="store_true", help="Tentar usar symbols_cache_file")
 
+    s9 = sub.add_parser("analytics", add_help=False,
+                        help="Consultas group-by no histórico de trades (moonshot_analytics; --help lá).")
+    s9.add_argument("args", nargs=argparse.REMAINDER)
+
     return p
 
 
+def op_analytics(cfg_path: str, argv: List[str]) -> int:
+    from moonshot_analytics import main as analytics_main
+    return analytics_main(["--cfg", cfg_path] + argv, prog="moonshot_tools analytics")
+
+
 def main():
-    args = build_parser().parse_args()
+    args, extra = build_parser().parse_known_args()
+    if args.cmd == "analytics":
+        raise SystemExit(op_analytics(args.cfg, extra + args.args))
+    if extra:
+        build_parser().error(f"argumentos desconhecidos: {' '.join(extra)}")
     cfg = load_cfg(args.cfg)
 
     if args.cmd == "list-blacklist":
@@ -0,0 +1,339 @@
+# moonshot_trade_archive.py — histórico de trades fechados em colunas, um arquivo por dia
+# - Cada trade fechado vira uma linha tipada (NumPy .npz, sem pickle): preços em float64,
+#   horários normalizados em epoch ms UTC (created/opened/closed e TP1..TP3), TF em minutos
+# - Partição pelo dia UTC do fechamento (<dir>/AAAA-MM-DD.npz); quem analisa lê só os
+#   dias do intervalo pedido, sem json.load do arquivo inteiro
+# - manifest.json: dias, linhas por dia e uma versão que sobe a cada gravação (chave de
+#   cache para quem agrega em cima do arquivo)
+# - Idempotente: a chave do trade substitui a linha anterior no mesmo dia
+# - O agente grava no fechamento (on_close do monitor) e faz o backfill sozinho na
+#   primeira execução (arquivo vazio); manualmente, a partir do JSON/SQLite:
+#     python moonshot_trade_archive.py backfill
+#     python moonshot_trade_archive.py info
+#
+# YAML opcional (valores padrão):
+#   trade_archive:
+#     enabled: true
+#     dir: data/trades
+#     profile: ""          # rótulo da instância/estratégia; vazio = nome da pasta do trades_file
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from moonshot_trade_store import CLOSED_STATUSES, db_path_from_cfg, read_trades
+
+FORMAT = 1
+UNDATED = "undated"
+
+# (coluna, dtype). Strings ficam como unicode de largura fixa (np.str_), então o .npz
+# abre com allow_pickle=False.
+SCHEMA: List[Tuple[str, str]] = [
+    ("key", "U"), ("symbol", "U"), ("profile", "U"), ("tf", "i4"), ("side", "U"),
+    ("status", "U"), ("exit_reason", "U"),
+    ("entry", "f8"), ("sl", "f8"), ("tp1", "f8"), ("tp2", "f8"), ("tp3", "f8"),
+    ("exit_price", "f8"), ("lev", "f8"), ("notional", "f8"), ("roi_pct", "f8"),
+    ("created_ms", "i8"), ("opened_ms", "i8"), ("closed_ms", "i8"),
+    ("tp1_hit", "?"), ("tp2_hit", "?"), ("tp3_hit", "?"),
+    ("tp1_px", "f8"), ("tp2_px", "f8"), ("tp3_px", "f8"),
+    ("tp1_ms", "i8"), ("tp2_ms", "i8"), ("tp3_ms", "i8"),
+]
+COLUMNS = [c for c, _ in SCHEMA]
+_DTYPE = dict(SCHEMA)
+
+_OFFSET_RE = re.compile(r"^(.*\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)\s*([+-]\d{2})(?::?(\d{2}))?$")
+
+
+def ts_ms(v) -> int:
+    """
+    Qualquer carimbo que os trades usam → epoch ms UTC (-1 se ausente/inválido):
+    "2025-09-11 11:56:41 UTC", "2025-09-11 08:15 -03", ISO com Z/offset, epoch s ou ms.
+    """
+    if v is None or v == "":
+        return -1
+    if isinstance(v, (int, float)):
+        x = float(v)
+        return int(x if x > 1e12 else x * 1000.0)
+    s = str(v).strip()
+    if s.isdigit():
+        return ts_ms(int(s))
+    if s.endswith(" UTC"):
+        s = s[:-4] + "+00:00"
+    else:
+        m = _OFFSET_RE.match(s)
+        if m:
+            s = f"{m.group(1)}{m.group(2)}:{m.group(3) or '00'}"
+    try:
+        dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        return -1
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def ms_day(ms: int) -> str:
+    if ms is None or ms < 0:
+        return UNDATED
+    return time.strftime("%Y-%m-%d", time.gmtime(ms / 1000.0))
+
+
+def _f(x) -> float:
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _tf_min(tf) -> int:
+    try:
+        return int(str(tf).strip().rstrip("m"))
+    except ValueError:
+        return {"D": 1440, "W": 10080}.get(str(tf).strip().upper(), 0)
+
+
+def trade_row(key: str, tr: dict, profile: str = "") -> dict:
+    """Trade (dict do agente) → linha tipada do arquivo."""
+    hit = [False, False, False]
+    px = [float("nan")] * 3
+    at = [-1, -1, -1]
+    updates = tr.get("updates")
+    if isinstance(updates, list):
+        for u in updates:
+            ev = str(u.get("event")).upper()
+            j = {"TP1": 0, "TP2": 1, "TP3": 2}.get(ev)
+            if j is None or hit[j]:
+                continue  # só o primeiro de cada TP (mesma regra do report_pnl)
+            hit[j] = True
+            px[j] = _f(u.get("price"))
+            at[j] = ts_ms(u.get("ts"))
+    created = ts_ms(tr.get("created_at"))
+    return {
+        "key": key, "symbol": tr.get("symbol") or "", "profile": profile,
+        "tf": _tf_min(tr.get("tf")), "side": str(tr.get("side") or "LONG").upper(),
+        "status": tr.get("status") or "", "exit_reason": tr.get("exit_reason") or "",
+        "entry": _f(tr.get("entry")), "sl": _f(tr.get("sl")),
+        "tp1": _f(tr.get("tp1")), "tp2": _f(tr.get("tp2")), "tp3": _f(tr.get("tp3")),
+        "exit_price": _f(tr.get("exit_price")), "lev": _f(tr.get("lev")),
+        "notional": _f(tr.get("notional")), "roi_pct": _f(tr.get("roi_pct")),
+        "created_ms": created, "opened_ms": int(tr.get("opened_ms") or created),
+        "closed_ms": ts_ms(tr.get("closed_at")),
+        "tp1_hit": hit[0], "tp2_hit": hit[1], "tp3_hit": hit[2],
+        "tp1_px": px[0], "tp2_px": px[1], "tp3_px": px[2],
+        "tp1_ms": at[0], "tp2_ms": at[1], "tp3_ms": at[2],
+    }
+
+
+def _columns(rows: Sequence[dict]) -> Dict[str, np.ndarray]:
+    return {c: np.array([r[c] for r in rows], dtype=_DTYPE[c]) for c in COLUMNS}
+
+
+def _empty() -> Dict[str, np.ndarray]:
+    return {c: np.array([], dtype=_DTYPE[c]) for c in COLUMNS}
+
+
+class TradeArchive:
+    """
+    arc = TradeArchive("data/trades", profile="Teste_Moonshot")
+    arc.append([(key, trade_dict), ...])             # no fechamento / backfill
+    cols = arc.read("2025-09-01", "2025-09-30")      # dict coluna → array (só esses dias)
+    df = arc.frame(start, end, columns=[...])        # idem como DataFrame
+    arc.version                                      # muda a cada gravação
+    """
+
+    def __init__(self, root: str, profile: str = ""):
+        self.root = root
+        self.profile = profile
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # ---------- manifest ----------
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, "manifest.json")
+
+    def manifest(self) -> dict:
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"format": FORMAT, "version": 0, "days": {}}
+
+    @property
+    def version(self) -> int:
+        return int(self.manifest().get("version", 0))
+
+    def days(self) -> List[str]:
+        return sorted(self.manifest().get("days", {}))
+
+    def _write_manifest(self, man: dict) -> None:
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(man, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._manifest_path)
+
+    @contextmanager
+    def _locked(self):
+        # thread (monitor do agente) + processo (backfill rodando junto)
+        with self._lock, open(os.path.join(self.root, ".lock"), "a") as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+    # ---------- dias ----------
+    def _day_path(self, day: str) -> str:
+        return os.path.join(self.root, f"{day}.npz")
+
+    def _load_day(self, day: str, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        try:
+            with np.load(self._day_path(day), allow_pickle=False) as z:
+                names = [c for c in (columns or COLUMNS) if c in z.files]
+                out = {c: z[c] for c in names}
+        except FileNotFoundError:
+            return _empty() if columns is None else {c: _empty()[c] for c in columns}
+        n = len(next(iter(out.values()))) if out else 0
+        for c in columns or COLUMNS:  # coluna nova no schema → valor vazio nos dias antigos
+            if c not in out:
+                out[c] = np.zeros(n, dtype=_DTYPE[c]) if _DTYPE[c] != "U" else np.full(n, "", dtype="U1")
+        return out
+
+    def _write_day(self, day: str, cols: Dict[str, np.ndarray]) -> None:
+        path = self._day_path(day)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **cols)
+        os.replace(tmp, path)
+
+    # ---------- escrita ----------
+    def append(self, trades: Iterable[Tuple[str, dict]]) -> int:
+        """Grava/atualiza trades fechados; devolve quantas linhas entraram."""
+        by_day: Dict[str, Dict[str, dict]] = {}
+        for key, tr in trades:
+            if tr.get("status") not in CLOSED_STATUSES:
+                continue
+            row = trade_row(key, tr, self.profile)
+            by_day.setdefault(ms_day(row["closed_ms"] if row["closed_ms"] >= 0 else row["created_ms"]), {})[key] = row
+        if not by_day:
+            return 0
+        with self._locked():
+            man = self.manifest()
+            version = int(man.get("version", 0)) + 1
+            for day, rows in by_day.items():
+                new = _columns(list(rows.values()))
+                old = self._load_day(day)
+                keep = ~np.isin(old["key"], new["key"])
+                merged = {c: np.concatenate([old[c][keep], new[c]]) for c in COLUMNS}
+                order = np.argsort(merged["closed_ms"], kind="stable")
+                merged = {c: a[order] for c, a in merged.items()}
+                self._write_day(day, merged)
+                man.setdefault("days", {})[day] = {"rows": int(len(order)), "version": version}
+            man["format"] = FORMAT
+            man["version"] = version
+            self._write_manifest(man)
+        return sum(len(r) for r in by_day.values())
+
+    # ---------- leitura ----------
+    def _select(self, start=None, end=None) -> List[str]:
+        lo = _as_day(start)
+        hi = _as_day(end)
+        out = []
+        for d in self.days():
+            if d == UNDATED:
+                if lo is None and hi is None:
+                    out.append(d)
+                continue
+            if (lo is None or d >= lo) and (hi is None or d <= hi):
+                out.append(d)
+        return out
+
+    def read(self, start=None, end=None, columns: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """Colunas dos dias [start, end] (AAAA-MM-DD, datetime ou epoch ms; None = aberto)."""
+        cols = list(columns or COLUMNS)
+        parts = [self._load_day(d, cols) for d in self._select(start, end)]
+        if not parts:
+            return {c: _empty()[c] for c in cols}
+        return {c: np.concatenate([p[c] for p in parts]) for c in cols}
+
+    def frame(self, start=None, end=None, columns: Optional[Sequence[str]] = None):
+        import pandas as pd
+        return pd.DataFrame(self.read(start, end, columns))
+
+
+def _as_day(v) -> Optional[str]:
+    if v is None or v == "":
+        return None
+    if isinstance(v, datetime):
+        return (v.astimezone(timezone.utc) if v.tzinfo else v).strftime("%Y-%m-%d")
+    if isinstance(v, (int, float, np.integer)):
+        return ms_day(int(v))
+    return str(v)[:10]
+
+
+def profile_from_cfg(cfg: dict) -> str:
+    ac = cfg.get("trade_archive") or {}
+    if ac.get("profile"):
+        return str(ac["profile"])
+    trades_file = cfg.get("trades_file", "moonshot_trades.json")
+    return os.path.basename(os.path.dirname(os.path.abspath(trades_file)))
+
+
+def archive_from_cfg(cfg: dict) -> Optional[TradeArchive]:
+    ac = cfg.get("trade_archive") or {}
+    if not ac.get("enabled", True):
+        return None
+    return TradeArchive(ac.get("dir", "data/trades"), profile_from_cfg(cfg))
+
+
+# ==============================
+# CLI (backfill / info)
+# ==============================
+
+def _load_cfg(path: str) -> dict:
+    import yaml
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Arquivo colunar de trades fechados (por dia)")
+    ap.add_argument("cmd", choices=("backfill", "info"))
+    ap.add_argument("--config", default="moonshot_config.yaml")
+    ap.add_argument("--dir", default=None, help="sobrepõe trade_archive.dir")
+    ap.add_argument("--profile", default=None, help="sobrepõe trade_archive.profile")
+    args = ap.parse_args()
+
+    cfg = _load_cfg(args.config)
+    ac = cfg.get("trade_archive") or {}
+    arc = TradeArchive(args.dir or ac.get("dir", "data/trades"), args.profile or profile_from_cfg(cfg))
+
+    if args.cmd == "backfill":
+        t0 = time.perf_counter()
+        trades = read_trades(cfg.get("trades_file", "moonshot_trades.json"), db_path_from_cfg(cfg))
+        n = arc.append(trades.items())
+        print(f"backfill: {n} trade(s) fechado(s) de {len(trades)} → {arc.root} "
+              f"(versão {arc.version}, {time.perf_counter() - t0:.2f}s)")
+        return
+
+    man = arc.manifest()
+    days = man.get("days", {})
+    total = sum(d["rows"] for d in days.values())
+    print(f"{arc.root}: {total} trades em {len(days)} dia(s) | versão {man.get('version', 0)}")
+    for d in sorted(days):
+        print(f"  {d}: {days[d]['rows']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# moonshot_trade_service.py — dono único do estado dos trades (API HTTP local)
+# - Roda dentro do agente (thread própria); só o agente escreve em trades/store
+# - GET  /trades?status=open|closed|all   → {"boot", "seq", "trades": {key: trade}}
+# - GET  /trades/<key>                     → {"key", "trade"}
+# - GET  /events?since=<seq>&timeout=25    → long-poll: {"boot", "seq", "oldest", "events": [...]}
+#        cada evento = {"seq", "key", "kind", "trade"} (snapshot do trade após a mudança);
+#        "oldest" = seq mais antigo ainda no buffer
+# - POST /trades/<key>  {"set": {...}}     → mescla campos (ex.: sl_sent/tp1_sent) e persiste
+# - Watchers (sl/tp) e trades_guard viram assinantes de /events quando TRADE_SERVICE_URL
+#   está definido; sem ele continuam lendo o arquivo como antes
+# - O cliente começa (e recomeça, se o agente reiniciou ou o buffer já descartou eventos
+#   que ele não viu) por GET /trades?status=all, entregue como eventos kind="snapshot":
+#   STOP/TP ocorridos com o watcher fora do ar ainda geram o card
+#
+# YAML opcional (valores padrão):
+#   trade_service:
+#     enabled: true
+#     host: 127.0.0.1
+#     port: 8765
+#     buffer: 5000        # eventos mantidos para assinantes atrasados
+
+from __future__ import annotations
+
+import copy
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+CLOSED_STATUSES = ("CLOSED_TP3", "STOP")
+
+# campos que o monitor controla; alterá-los por fora dessincroniza o ciclo TP/SL
+PROTECTED_FIELDS = {"entry", "sl", "tp1", "tp2", "tp3", "side", "symbol", "updates"}
+
+
+def _match_status(tr: dict, status: str) -> bool:
+    closed = str(tr.get("status", "")) in CLOSED_STATUSES
+    if status == "open":
+        return not closed
+    if status == "closed":
+        return closed
+    return True
+
+
+class TradeService:
+    """
+    Publica mudanças dos trades num buffer de eventos com seq monotônico e atende
+    leitura/escrita pela API local.
+
+    - trades/lock: o mesmo dict/RLock usados pelo scan e pelo monitor
+    - persist(keys): grava as linhas alteradas (chamado com o lock adquirido)
+    - on_patch(key): avisado após um POST (ex.: monitor.track para ressincronizar)
+
+    `publish(keys, kind)` deve ser chamado (com o lock) sempre que um trade mudar.
+    """
+
+    def __init__(
+        self,
+        trades: Dict[str, dict],
+        lock: threading.RLock,
+        persist: Callable[[List[str]], None],
+        on_patch: Optional[Callable[[str], None]] = None,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        buffer: int = 5000,
+    ):
+        self.trades = trades
+        self.lock = lock
+        self.persist = persist
+        self.on_patch = on_patch
+        self.host = host
+        self.port = int(port)
+        self.boot = uuid.uuid4().hex[:12]  # muda a cada restart: assinante recomeça do zero
+        self._events: deque = deque(maxlen=max(100, int(buffer)))
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._th: Optional[threading.Thread] = None
+
+    # ---------- eventos ----------
+
+    def publish(self, keys: Iterable[str], kind: str = "update") -> None:
+        snaps = []
+        for k in keys:
+            tr = self.trades.get(k)
+            if tr is not None:
+                snaps.append((k, copy.deepcopy(tr)))
+        if not snaps:
+            return
+        with self._cond:
+            for k, tr in snaps:
+                self._seq += 1
+                self._events.append({"seq": self._seq, "key": k, "kind": kind, "trade": tr})
+            self._cond.notify_all()
+
+    def oldest_seq(self) -> int:
+        """seq do evento mais antigo no buffer (seq + 1 se vazio)."""
+        with self._cond:
+            return self._events[0]["seq"] if self._events else self._seq + 1
+
+    def events_since(self, since: int, timeout: float = 0.0) -> Tuple[int, List[dict]]:
+        deadline = time.time() + max(0.0, timeout)
+        with self._cond:
+            while self._seq <= since:
+                left = deadline - time.time()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            return self._seq, [ev for ev in self._events if ev["seq"] > since]
+
+    # ---------- leitura/escrita ----------
+
+    def snapshot(self, status: str = "open") -> Dict[str, dict]:
+        with self.lock:
+            return {k: copy.deepcopy(tr) for k, tr in self.trades.items() if _match_status(tr, status)}
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            tr = self.trades.get(key)
+            return copy.deepcopy(tr) if tr is not None else None
+
+    def patch(self, key: str, fields: dict) -> Tuple[bool, str]:
+        bad = sorted(set(fields) & PROTECTED_FIELDS)
+        if bad:
+            return False, f"campos protegidos: {', '.join(bad)}"
+        with self.lock:
+            tr = self.trades.get(key)
+            if tr is None:
+                return False, "trade não encontrado"
+            tr.update(fields)
+            self.persist([key])
+            if self.on_patch is not None:
+                self.on_patch(key)
+            self.publish([key], kind="patch")
+        return True, "ok"
+
+    # ---------- HTTP ----------
+
+    def _handler(self):
+        svc = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):  # silencioso (o agente já loga bastante)
+                pass
+
+            def _send(self, code: int, obj) -> None:
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                u = urlparse(self.path)
+                q = {k: v[-1] for k, v in parse_qs(u.query).items()}
+                parts = [unquote(p) for p in u.path.split("/") if p]
+                try:
+                    if parts == ["trades"]:
+                        self._send(200, {"boot": svc.boot, "seq": svc._seq,
+                                         "trades": svc.snapshot(q.get("status", "open"))})
+                    elif len(parts) == 2 and parts[0] == "trades":
+                        tr = svc.get(parts[1])
+                        self._send(200 if tr is not None else 404, {"key": parts[1], "trade": tr})
+                    elif parts == ["events"]:
+                        since = int(q.get("since", 0))
+                        timeout = min(60.0, float(q.get("timeout", 25)))
+                        seq, evs = svc.events_since(since, timeout)
+                        self._send(200, {"boot": svc.boot, "seq": seq, "oldest": svc.oldest_seq(), "events": evs})
+                    elif parts == ["health"]:
+                        self._send(200, {"ok": True, "boot": svc.boot, "seq": svc._seq})
+                    else:
+                        self._send(404, {"error": "not found"})
+                except Exception as e:
+                    self._send(400, {"error": str(e)})
+
+            def do_POST(self):
+                parts = [unquote(p) for p in urlparse(self.path).path.split("/") if p]
+                if len(parts) != 2 or parts[0] != "trades":
+                    self._send(404, {"error": "not found"})
+                    return
+                try:
+                    n = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(n) or b"{}")
+                    fields = body.get("set") or {}
+                    if not isinstance(fields, dict):
+                        raise ValueError("'set' deve ser um objeto")
+                except Exception as e:
+                    self._send(400, {"error": str(e)})
+                    return
+                ok, msg = svc.patch(parts[1], fields)
+                self._send(200 if ok else (404 if "não encontrado" in msg else 409), {"ok": ok, "msg": msg})
+
+        return Handler
+
+    def start(self) -> bool:
+        try:
+            self._httpd = ThreadingHTTPServer((self.host, self.port), self._handler())
+        except OSError as e:
+            print(f"[trade_service] não subiu em {self.host}:{self.port}: {e}")
+            return False
+        self._httpd.daemon_threads = True
+        self._th = threading.Thread(target=self._httpd.serve_forever, name="trade-service", daemon=True)
+        self._th.start()
+        print(f"[trade_service] ouvindo em http://{self.host}:{self.port} (boot={self.boot})")
+        return True
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+
+# ==============================
+# Cliente (watchers / guard)
+# ==============================
+
+class TradeServiceClient:
+    """Assinante simples: `for key, kind, tr in client.follow(): ...` com reconexão."""
+
+    def __init__(self, url: str, timeout: float = 25.0):
+        import requests  # só quem usa o cliente precisa de requests
+
+        self.url = url.rstrip("/")
+        self.timeout = float(timeout)
+        self.http = requests.Session()
+        self.boot: Optional[str] = None
+        self.seq = 0
+
+    def trades(self, status: str = "open") -> Dict[str, dict]:
+        r = self.http.get(f"{self.url}/trades", params={"status": status}, timeout=10)
+        r.raise_for_status()
+        return r.json().get("trades") or {}
+
+    def patch(self, key: str, fields: dict) -> bool:
+        try:
+            r = self.http.post(f"{self.url}/trades/{quote(key, safe='')}", json={"set": fields}, timeout=10)
+            return r.ok
+        except Exception as e:
+            print(f"[trade_service] patch {key} falhou: {e}", flush=True)
+            return False
+
+    def _seed(self) -> List[dict]:
+        """Estado completo como eventos sintéticos (kind="snapshot"); o seq vem de antes do snapshot."""
+        r = self.http.get(f"{self.url}/trades", params={"status": "all"}, timeout=30)
+        r.raise_for_status()
+        j = r.json()
+        self.boot = j.get("boot")
+        self.seq = int(j.get("seq") or 0)
+        return [{"seq": self.seq, "key": k, "kind": "snapshot", "trade": tr}
+                for k, tr in (j.get("trades") or {}).items()]
+
+    def poll(self) -> List[dict]:
+        """Uma chamada long-poll; devolve os eventos novos (vazio no timeout)."""
+        if self.boot is None:
+            return self._seed()
+        r = self.http.get(f"{self.url}/events", params={"since": self.seq, "timeout": self.timeout},
+                          timeout=self.timeout + 10)
+        r.raise_for_status()
+        j = r.json()
+        if j.get("boot") != self.boot:
+            # agente reiniciou: o buffer novo não tem o que mudou com ele fora do ar
+            print("[trade_service] agente reiniciou; ressincronizando pelo snapshot", flush=True)
+            return self._seed()
+        if self.seq + 1 < int(j.get("oldest") or 0):
+            print("[trade_service] eventos descartados do buffer; ressincronizando pelo snapshot", flush=True)
+            return self._seed()
+        evs = j.get("events") or []
+        self.seq = int(j.get("seq") or self.seq)
+        return evs
+
+    def follow(self, retry_sec: float = 5.0):
+        while True:
+            try:
+                evs = self.poll()
+            except Exception as e:
+                print(f"[trade_service] sem conexão ({e}); nova tentativa em {retry_sec:.0f}s", flush=True)
+                time.sleep(retry_sec)
+                continue
+            for ev in evs:
+                yield ev["key"], ev.get("kind"), ev.get("trade") or {}
+
+
+def service_from_cfg(cfg: dict, trades, lock, persist, on_patch=None) -> Optional[TradeService]:
+    sc = cfg.get("trade_service") or {}
+    if not sc.get("enabled", True):
+        return None
+    return TradeService(
+        trades, lock, persist, on_patch=on_patch,
+        host=sc.get("host", "127.0.0.1"),
+        port=int(sc.get("port", 8765)),
+        buffer=int(sc.get("buffer", 5000)),
+    )
@@ -0,0 +1,325 @@
+# moonshot_trade_store.py — armazenamento transacional dos trades (SQLite em modo WAL)
+# - Uma linha por trade (status/symbol/closed_at indexados) + tabela de eventos (os "updates")
+# - Escrita por linha: só os trades que mudaram são gravados, numa transação
+# - Leitores consultam os abertos sem carregar o histórico (e não bloqueiam o writer: WAL)
+# - Compatibilidade: exporta o moonshot_trades.json (mesmo formato de antes) para quem ainda
+#   lê o arquivo (report_trades_now_all, open_trades_report_daemon, watchers sem
+#   TRADE_SERVICE_URL). Mudança de status (abertura, TP, STOP, fechamento) exporta na hora;
+#   o resto (preço, updates) no máximo uma vez por json_export_min_sec — regravar o histórico
+#   inteiro custa caro. Desligue (json_export: false) quando ninguém mais ler o arquivo
+# - As flags que os watchers gravam no arquivo (sl_sent, tpN_sent) são relidas antes de cada
+#   exportação e vão para o banco/memória, em vez de sumirem na regravação seguinte
+# - Na primeira execução importa o JSON existente
+#
+# YAML opcional (valores padrão):
+#   trade_store:
+#     enabled: true
+#     db: moonshot_trades.db
+#     json_export: true          # compatibilidade: mantém trades_file (quase) atualizado
+#     json_export_min_sec: 60    # sem mudança de status, exportações mais próximas que isso
+#                                #   ficam para o próximo flush
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CLOSED_STATUSES = ("CLOSED_TP3", "STOP")
+WATCHER_FLAGS = ("sl_sent", "tp1_sent", "tp2_sent", "tp3_sent")  # gravadas no JSON pelos tools/*_watcher
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    key        TEXT PRIMARY KEY,
+    symbol     TEXT,
+    tf         TEXT,
+    side       TEXT,
+    status     TEXT,
+    created_at TEXT,
+    closed_at  TEXT,
+    data       TEXT NOT NULL,
+    updated_ms INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_trades_status ON trades(status);
+CREATE INDEX IF NOT EXISTS ix_trades_symbol ON trades(symbol);
+CREATE INDEX IF NOT EXISTS ix_trades_closed ON trades(closed_at);
+CREATE TABLE IF NOT EXISTS trade_events (
+    key   TEXT NOT NULL,
+    seq   INTEGER NOT NULL,
+    ts    TEXT,
+    event TEXT,
+    price REAL,
+    data  TEXT NOT NULL,
+    PRIMARY KEY (key, seq)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    k TEXT PRIMARY KEY,
+    v TEXT
+);
+"""
+
+
+def _connect(path: str, readonly: bool = False) -> sqlite3.Connection:
+    if readonly:
+        con = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=10, check_same_thread=False)
+    else:
+        con = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+    con.row_factory = sqlite3.Row
+    return con
+
+
+class TradeStore:
+    """
+    Trades em SQLite. O dict de cada trade é guardado sem `updates` na coluna `data`;
+    os updates viram linhas em `trade_events` (append-only, chave (key, seq)).
+
+    Uso:
+        store = TradeStore("moonshot_trades.db", json_path="moonshot_trades.json")
+        trades = store.load_all()
+        ...
+        store.upsert_many([(key, trades[key])])
+        store.export_json(trades)
+    """
+
+    def __init__(self, path: str, json_path: Optional[str] = None, readonly: bool = False,
+                 export_min_sec: float = 60.0, json_export: bool = True):
+        self.path = path
+        self.json_path = json_path
+        self.json_export = bool(json_export)
+        self.readonly = readonly
+        self.export_min_sec = float(export_min_sec)
+        self._lock = threading.Lock()
+        self._con = _connect(path, readonly=readonly)
+        self._n_events: Dict[str, int] = {}
+        self._status: Dict[str, Optional[str]] = {}
+        self._last_export = 0.0
+        self._export_pending = False
+        self._status_changed = False
+        self._written_sig: Optional[Tuple[int, int]] = None
+        if not readonly:
+            with self._con:
+                self._con.executescript(_SCHEMA)
+            self._import_json_once()
+        for row in self._con.execute("SELECT key, COUNT(*) AS n FROM trade_events GROUP BY key"):
+            self._n_events[row["key"]] = int(row["n"])
+        if not readonly:
+            for row in self._con.execute("SELECT key, status FROM trades"):
+                self._status[row["key"]] = row["status"]
+
+    def close(self) -> None:
+        with self._lock:
+            self._con.close()
+
+    # ---------- escrita ----------
+
+    def _import_json_once(self) -> None:
+        done = self._con.execute("SELECT v FROM meta WHERE k='json_imported'").fetchone()
+        if done or not self.json_path or not os.path.exists(self.json_path):
+            return
+        try:
+            with open(self.json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"[trade_store] falha ao importar {self.json_path}: {e}")
+            return
+        if isinstance(data, dict):
+            self.upsert_many(data.items())
+        with self._con:
+            self._con.execute("INSERT OR REPLACE INTO meta(k, v) VALUES ('json_imported', ?)", (str(int(time.time())),))
+        print(f"[trade_store] importados {len(data) if isinstance(data, dict) else 0} trades de {self.json_path}")
+
+    def _upsert_locked(self, key: str, tr: dict, now_ms: int) -> None:
+        row = {k: v for k, v in tr.items() if k != "updates"}
+        if self._status.get(key, "") != tr.get("status"):
+            self._status[key] = tr.get("status")
+            self._status_changed = True
+        self._con.execute(
+            "INSERT INTO trades(key, symbol, tf, side, status, created_at, closed_at, data, updated_ms) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET symbol=excluded.symbol, tf=excluded.tf, side=excluded.side, "
+            "status=excluded.status, created_at=excluded.created_at, closed_at=excluded.closed_at, "
+            "data=excluded.data, updated_ms=excluded.updated_ms",
+            (key, tr.get("symbol"), tr.get("tf"), tr.get("side"), tr.get("status"),
+             tr.get("created_at"), tr.get("closed_at"), json.dumps(row), now_ms),
+        )
+        ups = tr.get("updates") or []
+        have = self._n_events.get(key, 0)
+        if len(ups) > have:
+            self._con.executemany(
+                "INSERT OR REPLACE INTO trade_events(key, seq, ts, event, price, data) VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, i, u.get("ts"), u.get("event"), u.get("price"), json.dumps(u))
+                 for i, u in enumerate(ups[have:], start=have)],
+            )
+            self._n_events[key] = len(ups)
+
+    def upsert(self, key: str, tr: dict) -> None:
+        self.upsert_many([(key, tr)])
+
+    def upsert_many(self, items: Iterable[Tuple[str, dict]]) -> int:
+        """Grava só os trades passados (uma transação). Retorna quantos foram gravados."""
+        now_ms = int(time.time() * 1000)
+        n = 0
+        with self._lock, self._con:
+            for key, tr in items:
+                self._upsert_locked(key, tr, now_ms)
+                n += 1
+        if n:
+            self._export_pending = True
+        return n
+
+    def append_event(self, key: str, upd: dict) -> None:
+        """Acrescenta um update avulso (o trade precisa já existir)."""
+        with self._lock, self._con:
+            seq = self._n_events.get(key, 0)
+            self._con.execute(
+                "INSERT OR REPLACE INTO trade_events(key, seq, ts, event, price, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, seq, upd.get("ts"), upd.get("event"), upd.get("price"), json.dumps(upd)),
+            )
+            self._n_events[key] = seq + 1
+        self._export_pending = True
+
+    # ---------- leitura ----------
+
+    def _rows_to_trades(self, rows: List[sqlite3.Row]) -> Dict[str, dict]:
+        out: Dict[str, dict] = {}
+        for r in rows:
+            tr = json.loads(r["data"])
+            tr["updates"] = []
+            out[r["key"]] = tr
+        if not out:
+            return out
+        keys = list(out)
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            q = f"SELECT key, data FROM trade_events WHERE key IN ({','.join('?' * len(chunk))}) ORDER BY key, seq"
+            for ev in self._con.execute(q, chunk):
+                out[ev["key"]]["updates"].append(json.loads(ev["data"]))
+        return out
+
+    def load_all(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._con.execute("SELECT key, data FROM trades ORDER BY rowid").fetchall()
+            return self._rows_to_trades(rows)
+
+    def load_open(self) -> Dict[str, dict]:
+        """Só os trades não fechados (usa o índice de status)."""
+        with self._lock:
+            rows = self._con.execute(
+                f"SELECT key, data FROM trades WHERE status NOT IN ({','.join('?' * len(CLOSED_STATUSES))}) ORDER BY rowid",
+                CLOSED_STATUSES,
+            ).fetchall()
+            return self._rows_to_trades(rows)
+
+    def load_closed_since(self, closed_at_min: str) -> Dict[str, dict]:
+        """Trades fechados com closed_at >= valor dado (formato "%Y-%m-%d %H:%M:%S UTC")."""
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT key, data FROM trades WHERE closed_at >= ? ORDER BY closed_at", (closed_at_min,)
+            ).fetchall()
+            return self._rows_to_trades(rows)
+
+    # ---------- compatibilidade JSON ----------
+
+    def export_json(self, trades: Optional[Dict[str, dict]] = None, force: bool = False) -> bool:
+        """
+        Regrava o trades_file a partir do dict em memória (ou do banco, se não passado).
+        Mudança de status desde a última exportação grava na hora; o resto respeita
+        `export_min_sec` e as chamadas adiadas saem no próximo `flush_export`.
+        """
+        if not self.json_path or not self.json_export or self.readonly:
+            return False
+        now = time.time()
+        if not force and not self._status_changed and now - self._last_export < self.export_min_sec:
+            self._export_pending = True
+            return False
+        data = trades if trades is not None else self.load_all()
+        merged = self._merge_watcher_flags(data)
+        if merged:
+            self.upsert_many((k, data[k]) for k in merged)
+        tmp = self.json_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.json_path)
+        st = os.stat(self.json_path)
+        self._written_sig = (st.st_mtime_ns, st.st_size)
+        self._last_export = now
+        self._export_pending = False
+        self._status_changed = False
+        return True
+
+    def _merge_watcher_flags(self, data: Dict[str, dict]) -> List[str]:
+        """Traz para `data` as WATCHER_FLAGS gravadas no arquivo desde a nossa última exportação."""
+        try:
+            st = os.stat(self.json_path)
+        except OSError:
+            return []
+        if (st.st_mtime_ns, st.st_size) == self._written_sig:
+            return []
+        try:
+            with open(self.json_path, "r", encoding="utf-8") as f:
+                disk = json.load(f)
+        except (OSError, ValueError):
+            return []  # arquivo no meio de uma gravação: fica para a próxima exportação
+        merged = []
+        for key, tr in (disk.items() if isinstance(disk, dict) else ()):
+            cur = data.get(key)
+            if not isinstance(tr, dict) or not isinstance(cur, dict):
+                continue
+            new = {f: True for f in WATCHER_FLAGS if tr.get(f) and not cur.get(f)}
+            if new:
+                cur.update(new)
+                merged.append(key)
+        return merged
+
+    def flush_export(self, trades: Optional[Dict[str, dict]] = None) -> bool:
+        if self._export_pending:
+            return self.export_json(trades)
+        return False
+
+
+def store_from_cfg(cfg: dict) -> Optional[TradeStore]:
+    """Cria o store a partir da seção `trade_store` do YAML (None se desligado)."""
+    sc = cfg.get("trade_store") or {}
+    if not sc.get("enabled", True):
+        return None
+    return TradeStore(
+        sc.get("db", "moonshot_trades.db"),
+        json_path=cfg.get("trades_file", "moonshot_trades.json"),
+        export_min_sec=float(sc.get("json_export_min_sec", 60)),
+        json_export=bool(sc.get("json_export", True)),
+    )
+
+
+def db_path_from_cfg(cfg: dict) -> Optional[str]:
+    sc = cfg.get("trade_store") or {}
+    if not sc.get("enabled", True):
+        return None
+    return sc.get("db", "moonshot_trades.db")
+
+
+def read_trades(json_path: str, db_path: Optional[str] = None, only_open: bool = False) -> Dict[str, dict]:
+    """
+    Leitura para scripts/relatórios: usa o banco se existir (sem carregar o histórico
+    quando only_open=True); senão cai no JSON.
+    """
+    if db_path and os.path.exists(db_path):
+        try:
+            store = TradeStore(db_path, readonly=True)
+            try:
+                return store.load_open() if only_open else store.load_all()
+            finally:
+                store.close()
+        except sqlite3.Error as e:
+            print(f"[trade_store] falha lendo {db_path} ({e}); usando {json_path}")
+    if not os.path.exists(json_path):
+        return {}
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if only_open and isinstance(data, dict):
+        data = {k: v for k, v in data.items() if v.get("status") not in CLOSED_STATUSES}
+    return data
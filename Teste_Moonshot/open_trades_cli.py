@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, json, time, math, argparse, requests, datetime
+import os, time, math, argparse, requests, datetime
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
 
+from moonshot_trade_store import read_trades
+
 BYBIT_TICKER_URL = "https://api.bybit.com/v5/market/tickers"
 
 def parse_float(x, default=None):
@@ -226,17 +228,22 @@ def send_telegram_summary(rows: List[Dict[str,Any]], env: Dict[str,str]):
 def main():
     ap = argparse.ArgumentParser(description="Listar trades em aberto (detalhe)")
     ap.add_argument("--trades-file", default="moonshot_trades.json", help="Caminho do JSON de trades")
+    ap.add_argument("--db", default=None,
+                    help="Banco SQLite de trades (usado se existir; padrão: moonshot_trades.db ao lado do --trades-file)")
     ap.add_argument("--html", help="Salvar HTML em arquivo (ex.: open_trades.html)")
     ap.add_argument("--telegram", action="store_true", help="Enviar resumo no Telegram (usa .env_moonshot se existir)")
     ap.add_argument("--env-file", help="Caminho .env para Telegram (padrão: .env_moonshot, fallback .env)")
     args = ap.parse_args()
 
     trades_path = Path(args.trades_file)
-    if not trades_path.exists():
+    # banco da mesma instância do arquivo, não o do diretório atual
+    db_path = Path(args.db) if args.db else trades_path.parent / "moonshot_trades.db"
+    if not trades_path.exists() and not db_path.exists():
         print(f"[ERRO] Não achei {trades_path}")
         return
 
-    data = json.loads(trades_path.read_text(encoding="utf-8"))
+    # só abertos: com o banco, o histórico nem é carregado
+    data = read_trades(str(trades_path), str(db_path), only_open=True)
     rows = []
     env_local = {}
 
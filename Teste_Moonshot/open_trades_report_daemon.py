@@ -18,6 +18,8 @@ import os, time, json, argparse, requests, datetime, hashlib
 from pathlib import Path
 from typing import Dict, Any, List
 
+from tools.file_watch import JsonFileCache
+
 BYBIT_TICKER_URL = "https://api.bybit.com/v5/market/tickers"
 STALE_STATUSES = {"closed","stopped","tp3","done","expired","abort","aborted","invalid","cooldown","no_entry"}
 
@@ -141,9 +143,12 @@ def pnl_percent(side: str, entry: float, last: float) -> float:
     if not entry or not last: return None
     return ((last - entry)/entry*100.0) if side=="LONG" else ((entry - last)/entry*100.0)
 
+_TRADES_CACHE: Dict[Path, JsonFileCache] = {}
+
 def build_rows(trades_path: Path, max_age_h: int) -> List[Dict[str,Any]]:
     if not trades_path.exists(): return []
-    data = json.loads(trades_path.read_text(encoding="utf-8"))
+    # re-parse só quando o arquivo mudou desde o último relatório
+    data = _TRADES_CACHE.setdefault(trades_path, JsonFileCache(trades_path, default={})).get()
     now = datetime.datetime.utcnow()
     symbols = set()
     lst = []
@@ -0,0 +1,253 @@
+# pnl_engine.py — PnL colunar (vetorizado) para o report_pnl.py
+# - load_columns(): uma passada pelo dict de trades → arrays NumPy (entry, saída,
+#   notional, TPs, preço/flag do primeiro update TP1/TP2/TP3 — os updates são
+#   varridos uma vez só, não três)
+# - compute(): parciais, slippage, taxas, ROI e R de todos os trades de uma vez,
+#   com as MESMAS operações (e na mesma ordem) de compute_trade_pnl_with_partials
+#   e r_usdt_per_trade → resultado idêntico bit a bit (report_pnl.py --verify confere);
+#   também devolve as pernas (TP1/TP2/final e taxas) para o moonshot_equity
+# - trade_table()/summarize(): tabela por trade (pandas) e agregados por dia,
+#   símbolo e TF via group-by
+# - columns_from_archive(): mesmo cálculo em cima do moonshot_trade_archive (analytics)
+#
+# Peculiaridade preservada de propósito: a perna final só dispensa o slippage de
+# saída quando existe update de TP3 (tp3_seen), inclusive em trades com status STOP.
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+CLOSED = ("CLOSED_TP3", "STOP")
+_EV = {"TP1": 0, "TP2": 1, "TP3": 2}
+
+
+def norm_splits(splits: Sequence[float]):
+    """Mesma normalização de compute_trade_pnl_with_partials."""
+    s1, s2, s3 = splits
+    s1 = max(0.0, float(s1)); s2 = max(0.0, float(s2)); s3 = max(0.0, float(s3))
+    total = s1 + s2 + s3
+    if total == 0:
+        s1 = 0.33; s2 = 0.33; s3 = 0.34
+    elif total > 1.0:
+        s1, s2, s3 = [x/total for x in (s1, s2, s3)]
+    return s1, s2, s3
+
+
+def pnl_params(cfg: dict) -> dict:
+    """splits/fees/slip do YAML (mesmos padrões do report_pnl, sem os overrides da CLI)."""
+    splits = cfg.get("tp_splits", [0.33, 0.33, 0.34])
+    if len(splits) != 3:
+        splits = [0.33, 0.33, 0.34]
+    fees_cfg = cfg.get("fees", {})
+    slip_cfg = cfg.get("slippage_bps", {})
+    return {
+        "splits": [float(x) for x in splits],
+        "fees": {"entry_bps": float(fees_cfg.get("entry_bps", 6.0)), "exit_bps": float(fees_cfg.get("exit_bps", 6.0))},
+        "slip": {"entry_bps": float(slip_cfg.get("entry", 1.0)), "exit_bps": float(slip_cfg.get("exit", 1.0))},
+    }
+
+
+def load_columns(trades: Dict[str, dict], statuses: Optional[Iterable[str]] = CLOSED) -> dict:
+    """Dict de trades → colunas. statuses=None carrega todos."""
+    keep = set(statuses) if statuses is not None else None
+    num = []  # (entry, saída, notional, tp1..3 fallback, tp1..3 preço, tp1..3 visto)
+    text = {k: [] for k in ("key", "symbol", "tf", "side", "status", "exit_reason", "created_at", "closed_at")}
+
+    for key, tr in trades.items():
+        status = tr.get("status", "")
+        if keep is not None and status not in keep:
+            continue
+        e = float(tr.get("entry", 0.0))
+        x = float(tr.get("exit_price", e))
+        fb = (float(tr.get("tp1", e)), float(tr.get("tp2", e)), float(tr.get("tp3", x or e)))
+        px = list(fb)
+        sn = [False, False, False]
+        updates = tr.get("updates", [])
+        if isinstance(updates, list):
+            # primeiro update de cada TP (como get_update_price), numa passada só
+            for u in updates:
+                j = _EV.get(str(u.get("event")).upper())
+                if j is None or sn[j]:
+                    continue
+                sn[j] = True
+                try:
+                    px[j] = float(u.get("price"))
+                except Exception:
+                    pass
+                if sn[0] and sn[1] and sn[2]:
+                    break
+        num.append((e, x, float(tr.get("notional", 0.0)), *fb, *px, *sn))
+        text["key"].append(key)
+        text["symbol"].append(tr.get("symbol"))
+        text["tf"].append(tr.get("tf"))
+        text["side"].append(tr.get("side", "LONG"))
+        text["status"].append(status)
+        text["exit_reason"].append(tr.get("exit_reason", ""))
+        text["created_at"].append(tr.get("created_at", ""))
+        text["closed_at"].append(tr.get("closed_at", ""))
+
+    m = np.array(num, dtype=float).reshape(-1, 12)
+    cols = {k: np.array(v, dtype=object) for k, v in text.items()}
+    cols.update(entry=m[:, 0], exit=m[:, 1], notional=m[:, 2],
+                tp_fb=m[:, 3:6], tp_px=m[:, 6:9], seen=m[:, 9:12] != 0)
+    return cols
+
+
+def columns_from_archive(a: Dict[str, np.ndarray]) -> dict:
+    """Colunas do moonshot_trade_archive → entrada de compute() (mesmos fallbacks do load_columns)."""
+    entry = np.where(np.isnan(a["entry"]), 0.0, a["entry"])
+    exit_p = np.where(np.isnan(a["exit_price"]), entry, a["exit_price"])
+    tp3_default = np.where(exit_p != 0, exit_p, entry)
+    tp_fb = np.column_stack([
+        np.where(np.isnan(a["tp1"]), entry, a["tp1"]),
+        np.where(np.isnan(a["tp2"]), entry, a["tp2"]),
+        np.where(np.isnan(a["tp3"]), tp3_default, a["tp3"]),
+    ])
+    seen = np.column_stack([a["tp1_hit"], a["tp2_hit"], a["tp3_hit"]]).astype(bool)
+    px = np.column_stack([a["tp1_px"], a["tp2_px"], a["tp3_px"]])
+    tp_px = np.where(seen & ~np.isnan(px), px, tp_fb)  # preço ilegível no update → fallback
+    return {
+        "side": a["side"].astype(object), "status": a["status"].astype(object),
+        "entry": entry, "exit": exit_p, "notional": np.where(np.isnan(a["notional"]), 0.0, a["notional"]),
+        "tp_fb": tp_fb, "tp_px": tp_px, "seen": seen,
+    }
+
+
+def compute(cols: dict, splits, fees: dict, slip: dict, slip_on_updates: bool = False) -> Dict[str, np.ndarray]:
+    """pnl_gross, fees, pnl_net, roi_pct_net, R_usdt, pnl_R por trade (arrays) + pernas TP1/TP2/final."""
+    s1, s2, _ = norm_splits(splits)
+    entry, exit_p, notional = cols["entry"], cols["exit"], cols["notional"]
+    tp_fb, tp_px, seen = cols["tp_fb"], cols["tp_px"], cols["seen"]
+    seen1, seen2, seen3 = seen[:, 0], seen[:, 1], seen[:, 2]
+    long = np.array([str(s).upper() == "LONG" for s in cols["side"]], dtype=bool)
+    direction = np.where(long, 1.0, -1.0)
+
+    fac_in = (slip["entry_bps"] or 0.0) / 10000.0
+    fac_out = (slip["exit_bps"] or 0.0) / 10000.0
+    entry_eff = np.where(long, entry * (1.0 + fac_in), entry * (1.0 - fac_in))
+
+    def adj_exit(px):
+        return np.where(long, px * (1.0 - fac_out), px * (1.0 + fac_out))
+
+    def component(exit_eff, frac):
+        # pnl_component: notional * frac * direction * move (mesma ordem das operações)
+        move = (exit_eff - entry_eff) / np.maximum(entry_eff, 1e-12)
+        return np.where(np.asarray(frac) > 0, notional * frac * direction * move, 0.0)
+
+    def fee(leg, bps):
+        return leg * (bps or 0.0) / 10000.0
+
+    ex1 = tp_px[:, 0] if not slip_on_updates else adj_exit(tp_px[:, 0])
+    ex2 = tp_px[:, 1] if not slip_on_updates else adj_exit(tp_px[:, 1])
+    p1 = np.where(seen1, component(ex1, s1), 0.0)
+    p2 = np.where(seen2, component(ex2, s2), 0.0)
+    realized = 0.0 + np.where(seen1, s1, 0.0) + np.where(seen2, s2, 0.0)
+    remaining = np.maximum(0.0, 1.0 - realized)
+
+    status = cols["status"]
+    raw = np.where(status == "CLOSED_TP3", tp_px[:, 2],
+                   np.where(status == "STOP", exit_p, np.where(exit_p != 0, exit_p, tp_fb[:, 2])))
+    ex3 = np.where(seen3 & (not slip_on_updates), raw, adj_exit(raw))
+    has3 = remaining > 0
+    p3 = np.where(has3, component(ex3, remaining), 0.0)
+    gross = 0.0 + p1 + p2 + p3
+
+    exit_bps = fees["exit_bps"]
+    fee_in = 0.0 + fee(notional, fees["entry_bps"])
+    fee1 = np.where(seen1, fee(notional * s1, exit_bps), 0.0)
+    fee2 = np.where(seen2, fee(notional * s2, exit_bps), 0.0)
+    fee3 = np.where(has3, fee(notional * remaining, exit_bps), 0.0)
+    fees_total = fee_in + fee1 + fee2 + fee3
+
+    net = gross - fees_total
+    roi = 100.0 * (net / np.maximum(notional, 1e-12))
+    r_usdt = notional * (np.abs(tp_fb[:, 0] - entry) / np.maximum(entry, 1e-12))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pnl_r = np.where(r_usdt > 0, net / np.where(r_usdt > 0, r_usdt, 1.0), 0.0)
+    return {"pnl_gross": gross, "fees": fees_total, "pnl_net": net, "roi_pct_net": roi,
+            "R_usdt": r_usdt, "pnl_R": pnl_r,
+            # pernas (equity no tempo: cada uma realiza no seu horário)
+            "pnl_tp1": p1, "pnl_tp2": p2, "pnl_final": p3,
+            "fee_entry": fee_in, "fee_tp1": fee1, "fee_tp2": fee2, "fee_final": fee3,
+            "frac_tp1": np.where(seen1, s1, 0.0), "frac_tp2": np.where(seen2, s2, 0.0),
+            "entry_eff": entry_eff}
+
+
+def _local_times(closed_at: np.ndarray, tz):
+    """(dia, rótulo) no fuso de exibição; "N/A" quando closed_at falta ou não parseia."""
+    ts = pd.to_datetime(pd.Series(closed_at, dtype=object), format="%Y-%m-%d %H:%M:%S UTC",
+                        utc=True, errors="coerce")
+    local = ts.dt.tz_convert(tz)
+    # strftime linha a linha é o gargalo; datetime_as_string no horário local (naive)
+    # + abreviação do fuso resolvida uma vez por offset (muda só no horário de verão)
+    naive = local.dt.tz_localize(None).to_numpy()
+    ok = ~np.isnat(naive)
+    day = np.full(len(naive), "N/A", dtype=object)
+    label = np.full(len(naive), "N/A", dtype=object)
+    if ok.any():
+        day[ok] = np.datetime_as_string(naive[ok], unit="D")
+        hm = np.char.replace(np.datetime_as_string(naive[ok], unit="m"), "T", " ")
+        offs = (naive[ok] - ts.dt.tz_localize(None).to_numpy()[ok]).astype("timedelta64[m]").astype(np.int64)
+        loc_ok = local[ok].reset_index(drop=True)
+        names = {o: loc_ok.iloc[int(np.argmax(offs == o))].strftime("%Z") for o in np.unique(offs)}
+        zone = np.array([names[o] for o in offs.tolist()], dtype=object)
+        label[ok] = hm.astype(object) + " " + zone
+    return day, label
+
+
+def trade_table(trades: Dict[str, dict], splits, fees: dict, slip: dict, tz,
+                slip_on_updates: bool = False) -> pd.DataFrame:
+    """Tabela por trade fechado, mesmas colunas das linhas do report_pnl."""
+    cols = load_columns(trades)
+    res = compute(cols, splits, fees, slip, slip_on_updates)
+    day, label = _local_times(cols["closed_at"], tz)
+    return pd.DataFrame({
+        "day": day,
+        "symbol": cols["symbol"], "tf": cols["tf"], "side": cols["side"], "status": cols["status"],
+        "exit_reason": cols["exit_reason"], "created_at": cols["created_at"], "closed_at": label,
+        "entry": cols["entry"], "exit": cols["exit"], "notional": cols["notional"],
+        "pnl_gross": res["pnl_gross"], "fees": res["fees"], "pnl_net": res["pnl_net"],
+        "R_usdt": res["R_usdt"], "pnl_R": res["pnl_R"],
+    })
+
+
+def last_days(df: pd.DataFrame, days: int) -> pd.DataFrame:
+    """Últimos N dias com trades (+ os sem data), como o --days do report."""
+    known = sorted(set(df.loc[df["day"] != "N/A", "day"]))
+    if not known:
+        return df
+    keep = set(known[-days:]) | {"N/A"}
+    return df[df["day"].isin(keep)]
+
+
+def _group(df: pd.DataFrame, by: str) -> pd.DataFrame:
+    net = df["pnl_net"]
+    g = df.assign(wins=net > 0, losses=net < 0).groupby(by, sort=False, dropna=False)
+    out = g.agg(net=("pnl_net", "sum"), R=("pnl_R", "sum"), wins=("wins", "sum"),
+                losses=("losses", "sum"), count=("pnl_net", "size"))
+    out["wins"] = out["wins"].astype(int)
+    out["losses"] = out["losses"].astype(int)
+    return out
+
+
+def summarize(df: pd.DataFrame) -> dict:
+    """Agregados globais + by_day (Series) + by_symbol/by_tf (DataFrames net/R/wins/losses/count)."""
+    net, gross, r = df["pnl_net"], df["pnl_gross"], df["pnl_R"]
+    closed = len(df)
+    wins = int((net > 0).sum())
+    losses = int((net < 0).sum())
+    return {
+        "closed": closed, "wins": wins, "losses": losses, "ties": closed - wins - losses,
+        "winrate": (wins / closed * 100.0) if closed > 0 else 0.0,
+        "gross_win": float(gross[gross > 0].sum()), "gross_loss": float(gross[gross < 0].sum()),
+        "fees_total": float(df["fees"].sum()), "net": float(net.sum()),
+        "total_R": float(r.sum()),
+        "avg_R": float(r.mean()) if closed else 0.0,
+        "med_R": float(r.median()) if closed else 0.0,
+        "by_day": net.groupby(df["day"], dropna=False).sum().sort_index(),
+        "by_symbol": _group(df, "symbol"),
+        "by_tf": _group(df, "tf"),
+    }
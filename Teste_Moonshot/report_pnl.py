@@ -6,23 +6,32 @@ import os
 # - Aplica TAXAS (entry/exit em bps) e SLIPPAGE (entry/exit em bps)
 # - Sumários por PAR (symbol) e por TIMEFRAME
 # - Exporta CSV por trade e CSVs agregados
+# - Motor vetorizado (pnl_engine.py, padrão) ou o laço por trade original
+#   (--engine loop); --verify roda os dois e confere que batem bit a bit
 #
 # Exemplo:
 #   python3 report_pnl.py --tz America/Sao_Paulo \
 #     --csv pnl_trades.csv --csv-group-prefix pnl_ \
 #     --entry-fee-bps 6 --exit-fee-bps 6 \
 #     --entry-slip-bps 1 --exit-slip-bps 1
+#   python3 report_pnl.py --verify      # motor vetorizado == laço original?
 #
 # YAML opcional (valores padrão):
 #   tp_splits: [0.33, 0.33, 0.34]
 #   fees: { entry_bps: 6.0, exit_bps: 6.0 }
 #   slippage_bps: { entry: 1.0, exit: 1.0 }
 
-import argparse, json, os, csv, statistics
+import argparse, os, csv, time
 from collections import defaultdict
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 
+import numpy as np
+import pandas as pd
+
+import pnl_engine
+from moonshot_trade_store import db_path_from_cfg, read_trades
+
 try:
     import yaml
 except Exception as e:
@@ -36,11 +45,10 @@ def load_cfg(path="moonshot_config.yaml"):
     with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
-def load_trades(path):
-    if not os.path.exists(path):
+def load_trades(path, db_path=None):
+    if not os.path.exists(path) and not (db_path and os.path.exists(db_path)):
         raise FileNotFoundError(f"Trades não encontrado: {path}")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return read_trades(path, db_path)
 
 def parse_utc_dt(s: str):
     if not s:
@@ -51,6 +59,17 @@ def parse_utc_dt(s: str):
     except Exception:
         return None
 
+def _items(df):
+    """(índice, dict da linha) preservando o tipo de cada coluna (iterrows vira tudo float)."""
+    return zip(df.index, df.to_dict("records"))
+
+def _tf_order(tf):
+    """Ordena tf numericamente; trades sem tf (None/NaN) vão para o fim."""
+    try:
+        return (0, int(tf))
+    except (TypeError, ValueError):
+        return (1, 0)
+
 def pct(x):   return f"{x:.2f}%"
 def money(x): return f"{'-' if x < 0 else ''}${abs(x):,.2f}"
 
@@ -211,6 +230,106 @@ def r_usdt_per_trade(tr):
     return notional * base
 
 
+# ------------------ tabela por trade ------------------
+ROW_FIELDS = [
+    "day","symbol","tf","side","status","exit_reason","created_at","closed_at",
+    "entry","exit","notional","pnl_gross","fees","pnl_net","R_usdt","pnl_R"
+]
+
+def rows_loop(trades_dict, splits, fees, slip, tz, slip_on_updates=False):
+    """Laço original (um trade por vez); referência do motor vetorizado."""
+    rows = []
+    for key, tr in trades_dict.items():
+        status = tr.get("status", "")
+        if status not in ("CLOSED_TP3", "STOP"):
+            continue  # só fechados
+
+        sym = tr.get("symbol"); tf = tr.get("tf"); side = tr.get("side", "LONG")
+        entry = float(tr.get("entry", 0.0))
+        exit_price = float(tr.get("exit_price", entry))
+        notional = float(tr.get("notional", 0.0))
+
+        comp = compute_trade_pnl_with_partials(tr, splits, fees, slip, slip_on_updates=slip_on_updates)
+        pnl_net = comp["pnl_net_usdt"]
+        pnl_gross = comp["pnl_gross_usdt"]
+        fees_usdt = comp["fees_usdt_total"]
+
+        R_usdt = r_usdt_per_trade(tr)
+        pnl_R  = pnl_net / R_usdt if R_usdt > 0 else 0.0
+
+        closed_at = parse_utc_dt(tr.get("closed_at", ""))
+        if closed_at:
+            local_dt = closed_at.astimezone(tz)
+            day_key = local_dt.strftime("%Y-%m-%d")
+            closed_label = local_dt.strftime("%Y-%m-%d %H:%M %Z")
+        else:
+            day_key = "N/A"; closed_label = "N/A"
+
+        rows.append({
+            "day": day_key,
+            "symbol": sym, "tf": tf, "side": side, "status": status, "exit_reason": tr.get("exit_reason",""),
+            "created_at": tr.get("created_at",""), "closed_at": closed_label,
+            "entry": entry, "exit": exit_price, "notional": notional,
+            "pnl_gross": pnl_gross, "fees": fees_usdt, "pnl_net": pnl_net,
+            "R_usdt": R_usdt, "pnl_R": pnl_R
+        })
+    return pd.DataFrame(rows, columns=ROW_FIELDS)
+
+def verify_engines(trades_dict, splits, fees, slip, tz, slip_on_updates=False) -> bool:
+    """pnl_engine.trade_table == rows_loop, coluna a coluna (números: igualdade exata)."""
+    t0 = time.perf_counter(); ref = rows_loop(trades_dict, splits, fees, slip, tz, slip_on_updates)
+    t1 = time.perf_counter(); vec = pnl_engine.trade_table(trades_dict, splits, fees, slip, tz, slip_on_updates)
+    t2 = time.perf_counter()
+    ok = len(ref) == len(vec)
+    print(f"verify: {len(ref)} trades | laço {1000*(t1-t0):.1f} ms | vetorizado {1000*(t2-t1):.1f} ms")
+    for col in ROW_FIELDS if ok else []:
+        a, b = ref[col].to_numpy(), vec[col].to_numpy()
+        if col in ("entry","exit","notional","pnl_gross","fees","pnl_net","R_usdt","pnl_R"):
+            a, b = a.astype(float), b.astype(float)
+            bad = ~((a == b) | (np.isnan(a) & np.isnan(b)))
+            diff = float(np.nanmax(np.abs(a - b))) if len(a) else 0.0
+        else:
+            bad = np.array([x != y for x, y in zip(a, b)], dtype=bool)
+            diff = None
+        if bad.any():
+            ok = False
+            extra = f", max |Δ|={diff:.3e}" if diff is not None else ""
+            print(f"  {col}: {int(bad.sum())} divergência(s){extra}")
+    ok = _verify_groups(ref, vec, "grupos") and ok
+
+    # trade fechado sem symbol/tf: tem que cair num grupo próprio, não sumir dos totais
+    k = next((k for k, t in trades_dict.items() if t.get("status") in ("CLOSED_TP3", "STOP")), None)
+    if k is not None:
+        bare = {k: {f: v for f, v in trades_dict[k].items() if f not in ("symbol", "tf")}}
+        ok = _verify_groups(rows_loop(bare, splits, fees, slip, tz, slip_on_updates),
+                            pnl_engine.trade_table(bare, splits, fees, slip, tz, slip_on_updates),
+                            "sem symbol/tf") and ok
+    print("verify: OK (idêntico)" if ok else "verify: DIVERGE")
+    return ok
+
+def _verify_groups(ref, vec, label) -> bool:
+    """summarize(vetorizado) por dia/símbolo/tf == acumulação do laço original (chave None = ausente)."""
+    agg = pnl_engine.summarize(vec)
+    ok = True
+    for name, col in (("by_day", "day"), ("by_symbol", "symbol"), ("by_tf", "tf")):
+        net, count = defaultdict(float), defaultdict(int)
+        for key, v in zip(ref[col], ref["pnl_net"]):
+            key = None if pd.isna(key) else key
+            net[key] += v
+            count[key] += 1
+        got = agg[name]
+        got_net = got["net"] if isinstance(got, pd.DataFrame) else got
+        got_net = {(None if pd.isna(k) else k): float(v) for k, v in got_net.items()}
+        got_count = ({(None if pd.isna(k) else k): int(v) for k, v in got["count"].items()}
+                     if isinstance(got, pd.DataFrame) else count)
+        if set(got_net) != set(net) or got_count != dict(count) \
+           or any(not np.isclose(got_net[k], net[k], rtol=1e-9, atol=1e-9) for k in net):
+            ok = False
+            print(f"  {label}/{name}: grupos divergem ({len(got_net)} vs {len(net)} chaves, "
+                  f"{sum(got_count.values())} vs {sum(count.values())} trades)")
+    return ok
+
+
 # ------------------ CLI ------------------
 def main():
     ap = argparse.ArgumentParser(description="Relatório de PnL do Moonshot (parciais + R por trade + taxas/slippage + sumários)")
@@ -227,6 +346,10 @@ def main():
     ap.add_argument("--exit-slip-bps", type=float, default=None)
     ap.add_argument("--slip-on-updates", action="store_true",
                     help="aplica slippage também em preços capturados nos updates de TP/STOP")
+    ap.add_argument("--engine", choices=("vector", "loop"), default="vector",
+                    help="vector = pnl_engine (colunar); loop = cálculo trade a trade original")
+    ap.add_argument("--verify", action="store_true",
+                    help="compara os dois motores trade a trade e sai (código 1 se divergirem)")
     args = ap.parse_args()
 
     cfg = load_cfg(args.cfg)
@@ -257,95 +380,44 @@ def main():
         "exit_bps":  args.exit_slip_bps  if args.exit_slip_bps  is not None else float(slip_cfg.get("exit",  1.0)),
     }
 
-    trades_dict = load_trades(trades_path)
-    rows = []
-
-    # -------------- processa trades --------------
-    for key, tr in trades_dict.items():
-        status = tr.get("status", "")
-        if status not in ("CLOSED_TP3", "STOP"):
-            continue  # só fechados
-
-        sym = tr.get("symbol"); tf = tr.get("tf"); side = tr.get("side", "LONG")
-        entry = float(tr.get("entry", 0.0))
-        exit_price = float(tr.get("exit_price", entry))
-        notional = float(tr.get("notional", 0.0))
-
-        comp = compute_trade_pnl_with_partials(tr, splits, fees, slip, slip_on_updates=args.slip_on_updates)
-        pnl_net = comp["pnl_net_usdt"]
-        pnl_gross = comp["pnl_gross_usdt"]
-        fees_usdt = comp["fees_usdt_total"]
-
-        R_usdt = r_usdt_per_trade(tr)
-        pnl_R  = pnl_net / R_usdt if R_usdt > 0 else 0.0
+    trades_dict = load_trades(trades_path, db_path_from_cfg(cfg))
 
-        closed_at = parse_utc_dt(tr.get("closed_at", ""))
-        if closed_at:
-            local_dt = closed_at.astimezone(tz)
-            day_key = local_dt.strftime("%Y-%m-%d")
-            closed_label = local_dt.strftime("%Y-%m-%d %H:%M %Z")
-        else:
-            day_key = "N/A"; closed_label = "N/A"
+    if args.verify:
+        ok = verify_engines(trades_dict, splits, fees, slip, tz, args.slip_on_updates)
+        raise SystemExit(0 if ok else 1)
 
-        rows.append({
-            "day": day_key,
-            "symbol": sym, "tf": tf, "side": side, "status": status, "exit_reason": tr.get("exit_reason",""),
-            "created_at": tr.get("created_at",""), "closed_at": closed_label,
-            "entry": entry, "exit": exit_price, "notional": notional,
-            "pnl_gross": pnl_gross, "fees": fees_usdt, "pnl_net": pnl_net,
-            "R_usdt": R_usdt, "pnl_R": pnl_R
-        })
+    # -------------- processa trades --------------
+    t0 = time.perf_counter()
+    if args.engine == "loop":
+        rows = rows_loop(trades_dict, splits, fees, slip, tz, args.slip_on_updates)
+    else:
+        rows = pnl_engine.trade_table(trades_dict, splits, fees, slip, tz, args.slip_on_updates)
+    elapsed_ms = (time.perf_counter() - t0) * 1000.0
 
-    if not rows:
+    if rows.empty:
         print("Nenhum trade fechado encontrado.")
         return
 
     # filtro últimos N dias
     if args.days:
-        all_days = sorted({r["day"] for r in rows if r["day"] != "N/A"})
-        if all_days:
-            cutoff = set(all_days[-args.days:])
-            rows = [r for r in rows if r["day"] in cutoff or r["day"] == "N/A"]
-
-    # -------------- agregações globais --------------
-    closed = len(rows)
-    wins = sum(1 for r in rows if r["pnl_net"] > 0)
-    losses = sum(1 for r in rows if r["pnl_net"] < 0)
-    ties = closed - wins - losses
-    winrate = (wins / closed * 100.0) if closed > 0 else 0.0
-
-    gross_win = sum(r["pnl_gross"] for r in rows if r["pnl_gross"] > 0)
-    gross_loss = sum(r["pnl_gross"] for r in rows if r["pnl_gross"] < 0)
-    fees_total = sum(r["fees"] for r in rows)
-    net = sum(r["pnl_net"] for r in rows)
-
-    total_R = sum(r["pnl_R"] for r in rows)
-    R_list = [r["pnl_R"] for r in rows]
-    avg_R = statistics.mean(R_list) if R_list else 0.0
-    med_R = statistics.median(R_list) if R_list else 0.0
-
-    # por dia (NET)
-    by_day = defaultdict(float)
-    for r in rows:
-        by_day[r["day"]] += r["pnl_net"]
-
-    # por symbol e por timeframe (NET e R)
-    by_symbol = defaultdict(lambda: {"net":0.0,"R":0.0,"wins":0,"losses":0,"count":0})
-    by_tf = defaultdict(lambda: {"net":0.0,"R":0.0,"wins":0,"losses":0,"count":0})
-    for r in rows:
-        s = by_symbol[r["symbol"]]
-        s["net"] += r["pnl_net"]; s["R"] += r["pnl_R"]; s["count"] += 1
-        if r["pnl_net"] > 0: s["wins"] += 1
-        elif r["pnl_net"] < 0: s["losses"] += 1
-        t = by_tf[r["tf"]]
-        t["net"] += r["pnl_net"]; t["R"] += r["pnl_R"]; t["count"] += 1
-        if r["pnl_net"] > 0: t["wins"] += 1
-        elif r["pnl_net"] < 0: t["losses"] += 1
+        rows = pnl_engine.last_days(rows, args.days)
+
+    # -------------- agregações (group-by) --------------
+    agg = pnl_engine.summarize(rows)
+    closed, wins, losses, ties = agg["closed"], agg["wins"], agg["losses"], agg["ties"]
+    winrate = agg["winrate"]
+    gross_win, gross_loss = agg["gross_win"], agg["gross_loss"]
+    fees_total, net = agg["fees_total"], agg["net"]
+    total_R, avg_R, med_R = agg["total_R"], agg["avg_R"], agg["med_R"]
+    by_day = agg["by_day"]
+    by_symbol = agg["by_symbol"]
+    by_tf = agg["by_tf"].loc[sorted(agg["by_tf"].index, key=_tf_order)]
 
     # -------------- impressão --------------
     print("\n==== Moonshot PnL Report (parciais + R por trade + taxas/slippage) ====")
     print(f"Fuso: {tzname}")
     print(f"Splits: TP1={splits[0]:.2f}  TP2={splits[1]:.2f}  Final={splits[2]:.2f}")
+    print(f"Motor: {args.engine} ({elapsed_ms:.0f} ms p/ {closed} trades)")
     print(f"Taxas (bps): entry={fees['entry_bps']}  exit={fees['exit_bps']}  |  Slippage (bps): entry={slip['entry_bps']}  exit={slip['exit_bps']}")
     print(f"Trades fechados: {closed}  |  Wins: {wins}  Losses: {losses}  Ties: {ties}  |  Win rate: {pct(winrate)}")
     print(f"Gross Win:  {money(gross_win)}")
@@ -355,12 +427,12 @@ def main():
     print(f"Total R: {total_R:.2f}R  |  Avg R/trade: {avg_R:.2f}R  |  Median R/trade: {med_R:.2f}R")
 
     print("\nPor dia (NET):")
-    for d in sorted(by_day.keys()):
-        print(f"  {d}: {money(by_day[d])}")
+    for d, v in by_day.items():
+        print(f"  {d}: {money(v)}")
 
     # Top/bottom por símbolo
-    top_sym = sorted(by_symbol.items(), key=lambda kv: kv[1]["net"], reverse=True)[:10]
-    bot_sym = sorted(by_symbol.items(), key=lambda kv: kv[1]["net"])[:10]
+    top_sym = _items(by_symbol.sort_values("net", ascending=False, kind="stable").head(10))
+    bot_sym = _items(by_symbol.sort_values("net", kind="stable").head(10))
     print("\nTop 10 pares (NET):")
     for sym, v in top_sym:
         wr = (v["wins"] / v["count"] * 100.0) if v["count"] else 0.0
@@ -372,21 +444,18 @@ def main():
 
     # Por timeframe
     print("\nPor timeframe (NET):")
-    for tf, v in sorted(by_tf.items(), key=lambda kv: int(kv[0])):
+    for tf, v in _items(by_tf):
         wr = (v["wins"] / v["count"] * 100.0) if v["count"] else 0.0
         print(f"  {tf:>3}m   NET={money(v['net']):>12} | R={v['R']:+.2f}R | WR={wr:5.1f}% | n={v['count']}")
 
     # -------------- CSVs --------------
     if args.csv:
-        fields = [
-            "day","symbol","tf","side","status","exit_reason","created_at","closed_at",
-            "entry","exit","notional","pnl_gross","fees","pnl_net","R_usdt","pnl_R"
-        ]
+        fields = ROW_FIELDS
         with open(args.csv, "w", newline="", encoding="utf-8") as f:
             w = csv.DictWriter(f, fieldnames=fields)
             w.writeheader()
-            for r in rows:
-                w.writerow({k: r.get(k,"") for k in fields})
+            for r in rows[fields].to_dict("records"):
+                w.writerow(r)
         print(f"\nCSV (trades) salvo em: {os.path.abspath(args.csv)}")
 
     if args.csv_group_prefix:
@@ -395,7 +464,7 @@ def main():
         with open(sym_path, "w", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
             w.writerow(["symbol","net_usdt","total_R","wins","losses","count","winrate_pct"])
-            for sym, v in sorted(by_symbol.items()):
+            for sym, v in _items(by_symbol.sort_index()):
                 wr = (v["wins"]/v["count"]*100.0) if v["count"] else 0.0
                 w.writerow([sym, round(v["net"],2), round(v["R"],4), v["wins"], v["losses"], v["count"], round(wr,2)])
         # por timeframe
@@ -403,7 +472,7 @@ def main():
         with open(tf_path, "w", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
             w.writerow(["timeframe_m","net_usdt","total_R","wins","losses","count","winrate_pct"])
-            for tf, v in sorted(by_tf.items(), key=lambda kv: int(kv[0])):
+            for tf, v in _items(by_tf):
                 wr = (v["wins"]/v["count"]*100.0) if v["count"] else 0.0
                 w.writerow([tf, round(v["net"],2), round(v["R"],4), v["wins"], v["losses"], v["count"], round(wr,2)])
         print(f"CSVs de grupos salvos em: {os.path.abspath(sym_path)} ; {os.path.abspath(tf_path)}")
@@ -0,0 +1,684 @@
+# telegram_outbox.py — fila de saída do Telegram com envio em background
+# - O loop do agente só enfileira (send_text/send_photo/send_animation); uma thread
+#   própria faz os POSTs, então um Telegram lento ou um 429 não trava o scan
+# - Limites do Telegram: intervalo mínimo por chat + teto global de msgs/s
+# - 429: respeita parameters.retry_after (pausa só aquele chat, mantém a ordem)
+# - Erros transitórios (rede, 5xx): retry com backoff exponencial + jitter;
+#   esgotou → fallback para texto (foto/GIF) ou descarta com log
+# - Métricas: telegram_queue_depth (gauge), telegram_send_ms / telegram_queue_ms
+#   (percentis), contadores telegram_sent/failed/retries/429/dropped/dedup
+# - Durável (OutboxStore, SQLite): cada mensagem é gravada com uma chave de
+#   idempotência ANTES do envio e marcada como enviada DEPOIS; chave repetida é
+#   ignorada e o que ficou pendente num crash/restart é reenviado no start().
+#   Cards entram como (renderer, args) — registrados com register_renderer —
+#   para poderem ser gerados de novo no replay. Uma janela mínima continua
+#   possível: POST aceito e processo morto antes do "sent" → reenvio no replay.
+# - Mídia estática (GIF de sinal, fotos fixas): MediaCache guarda o file_id que o
+#   Telegram devolve no primeiro upload (chave: bot + sha256 do arquivo, persistido
+#   em JSON); os envios seguintes vão só com o file_id — id recusado → novo upload
+# - Com um RenderPool (moonshot_render_pool), o card é gerado em paralelo assim que
+#   entra na fila; o sender pula o chat cujo card ainda não ficou pronto
+#
+# YAML opcional (valores padrão):
+#   telegram:
+#     outbox:
+#       enabled: true
+#       per_chat_interval_sec: 1.0   # Telegram: ~1 msg/s por chat
+#       global_per_sec: 25           # Telegram: ~30 msg/s por bot
+#       max_retries: 5
+#       backoff_base_sec: 1.0
+#       backoff_max_sec: 60
+#       max_queue: 1000
+#       drain_timeout_sec: 15        # no shutdown: tempo para esvaziar a fila
+#       db: moonshot_outbox.db       # "" desliga a persistência (fila só em memória)
+#       keep_days: 30                # enviados mais antigos que isso são apagados
+#     media_cache_file: moonshot_media_ids.json   # "" desliga o reaproveitamento de file_id
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+import requests
+
+from moonshot_metrics import NULL_METRICS, CycleMetrics
+from moonshot_render_pool import RenderPool
+
+TELEGRAM_API = "https://api.telegram.org/bot{token}/{method}"
+
+
+@dataclass
+class OutMsg:
+    method: str                      # sendMessage | sendPhoto | sendAnimation
+    chat_id: str
+    data: dict
+    file_field: Optional[str] = None  # "photo" / "animation" quando há upload
+    file_path: Optional[str] = None
+    render: Optional[Callable[[], object]] = None  # gera o arquivo/bytes na thread do sender
+    fallback_text: Optional[str] = None
+    enq_at: float = field(default_factory=time.time)
+    attempts: int = 0
+    not_before: float = 0.0
+    key: Optional[str] = None          # idempotência (ex.: "sig:<signal key>", "ev:<trade key>:TP1")
+    render_name: Optional[str] = None  # renderer registrado (persistível, ao contrário de `render`)
+    render_args: Optional[dict] = None
+    row_id: Optional[int] = None
+    file_bytes: Optional[bytes] = None  # card renderizado em memória (não persiste; re-render no replay)
+    future: Optional[object] = None     # render em andamento no RenderPool
+    render_at: float = 0.0
+
+
+# ==============================
+# Persistência (idempotência + replay)
+# ==============================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    key           TEXT UNIQUE,
+    source        TEXT NOT NULL,
+    method        TEXT NOT NULL,
+    chat_id       TEXT NOT NULL,
+    data          TEXT NOT NULL,
+    file_field    TEXT,
+    file_path     TEXT,
+    render_name   TEXT,
+    render_args   TEXT,
+    fallback_text TEXT,
+    status        TEXT NOT NULL,
+    created       REAL NOT NULL,
+    updated       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_status ON outbox(source, status);
+"""
+
+PENDING, INFLIGHT, SENT, FAILED = "pending", "inflight", "sent", "failed"
+
+
+class OutboxStore:
+    """
+    Registro das mensagens em SQLite (WAL; pode ser compartilhado entre agente e daemons —
+    cada processo reenvia só as pendências do próprio `source`).
+    """
+
+    def __init__(self, path: str, source: str = "agent"):
+        self.path = path
+        self.source = source
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.row_factory = sqlite3.Row
+        with self._con:
+            self._con.executescript(_SCHEMA)
+
+    def record(self, msg: OutMsg) -> Optional[int]:
+        """Grava a mensagem como pendente; None se a chave já existe (já enviada/enfileirada)."""
+        now = time.time()
+        with self._lock, self._con:
+            cur = self._con.execute(
+                "INSERT OR IGNORE INTO outbox (key, source, method, chat_id, data, file_field, file_path, "
+                "render_name, render_args, fallback_text, status, created, updated) "
+                "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (msg.key, self.source, msg.method, msg.chat_id, json.dumps(msg.data, ensure_ascii=False),
+                 msg.file_field, msg.file_path, msg.render_name,
+                 json.dumps(msg.render_args, ensure_ascii=False) if msg.render_args is not None else None,
+                 msg.fallback_text, PENDING, now, now),
+            )
+            return cur.lastrowid if cur.rowcount else None
+
+    def mark(self, row_id: int, status: str) -> None:
+        with self._lock, self._con:
+            self._con.execute("UPDATE outbox SET status=?, updated=? WHERE id=?", (status, time.time(), row_id))
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return self._con.execute("SELECT 1 FROM outbox WHERE key=?", (key,)).fetchone() is not None
+
+    def pending(self) -> List[OutMsg]:
+        """Pendentes e em voo (processo caiu no meio do envio), na ordem original."""
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT * FROM outbox WHERE source=? AND status IN (?,?) ORDER BY id",
+                (self.source, PENDING, INFLIGHT),
+            ).fetchall()
+        out = []
+        for r in rows:
+            out.append(OutMsg(
+                r["method"], r["chat_id"], json.loads(r["data"]), r["file_field"], r["file_path"],
+                fallback_text=r["fallback_text"], enq_at=r["created"], key=r["key"],
+                render_name=r["render_name"],
+                render_args=json.loads(r["render_args"]) if r["render_args"] else None,
+                row_id=r["id"],
+            ))
+        return out
+
+    def prune(self, keep_days: float) -> int:
+        cut = time.time() - float(keep_days) * 86400.0
+        with self._lock, self._con:
+            cur = self._con.execute(
+                "DELETE FROM outbox WHERE source=? AND status IN (?,?) AND updated < ?",
+                (self.source, SENT, FAILED, cut),
+            )
+            return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._con.close()
+
+
+# ==============================
+# file_id de mídia estática
+# ==============================
+
+class MediaCache:
+    """
+    file_id do Telegram por (bot, sha256 do arquivo). O hash é recalculado só quando
+    o arquivo muda (mtime/size), então trocar o GIF no disco gera um upload novo.
+    """
+
+    def __init__(self, path: str, token: str):
+        self.path = path
+        self.bot = (token or "").split(":", 1)[0]  # só o id do bot; o token não vai para o disco
+        self._lock = threading.Lock()
+        self._digests: Dict[str, tuple] = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._ids: Dict[str, str] = json.load(f) or {}
+        except (FileNotFoundError, ValueError):
+            self._ids = {}
+
+    def _key(self, file_path: str) -> Optional[str]:
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        sig = (st.st_mtime_ns, st.st_size)
+        cached = self._digests.get(file_path)
+        if cached is None or cached[0] != sig:
+            h = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            cached = (sig, h.hexdigest())
+            self._digests[file_path] = cached
+        return f"{self.bot}:{cached[1]}"
+
+    def get(self, file_path: str) -> Optional[str]:
+        with self._lock:
+            k = self._key(file_path)
+            return self._ids.get(k) if k else None
+
+    def _save_locked(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._ids, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def remember(self, file_path: str, file_id: str) -> None:
+        with self._lock:
+            k = self._key(file_path)
+            if k and file_id and self._ids.get(k) != file_id:
+                self._ids[k] = file_id
+                self._save_locked()
+
+    def forget(self, file_path: str) -> None:
+        with self._lock:
+            k = self._key(file_path)
+            if k and self._ids.pop(k, None) is not None:
+                self._save_locked()
+
+
+def _file_id(resp_json: dict, field: str) -> Optional[str]:
+    res = (resp_json or {}).get("result") or {}
+    obj = res.get(field) or res.get("document")  # GIF às vezes volta como document
+    if isinstance(obj, list):  # photo: vários tamanhos, o maior por último
+        obj = obj[-1] if obj else None
+    return (obj or {}).get("file_id")
+
+
+def post_media(session, token: str, method: str, data: dict, field: str, file_path: str,
+               media: Optional[MediaCache] = None, timeout: float = 30.0):
+    """
+    POST de foto/GIF: por file_id se já houver um em cache, senão upload multipart
+    (e guarda o file_id devolvido). Devolve o Response do último POST.
+    """
+    url = TELEGRAM_API.format(token=token, method=method)
+    fid = media.get(file_path) if media is not None else None
+    if fid:
+        r = session.post(url, json=dict(data, **{field: fid}), timeout=timeout)
+        if r.status_code != 400:
+            return r
+        print(f"[telegram] file_id recusado ({(r.text or '')[:120]}); reenviando arquivo")
+        media.forget(file_path)
+    with open(file_path, "rb") as f:
+        r = session.post(url, data=data, files={field: f}, timeout=timeout)
+    if media is not None and r.status_code == 200:
+        try:
+            media.remember(file_path, _file_id(r.json(), field))
+        except ValueError:
+            pass
+    return r
+
+
+def media_name(data: bytes, field: str):
+    """(nome, mime) para o multipart a partir da assinatura dos bytes."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return f"{field}.png", "image/png"
+    if data[:3] == b"\xff\xd8\xff":
+        return f"{field}.jpg", "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return f"{field}.webp", "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return f"{field}.gif", "image/gif"
+    return field, "application/octet-stream"
+
+
+def _truncate(s: str, limit: int) -> str:
+    s = (s or "").strip()
+    return s if len(s) <= limit else s[: limit - 1] + "…"
+
+
+def _retry_after(resp) -> Optional[float]:
+    try:
+        return float((resp.json().get("parameters") or {}).get("retry_after"))
+    except Exception:
+        return None
+
+
+class TelegramOutbox:
+    """
+    ob = TelegramOutbox(token, metrics=METRICS); ob.start()
+    ob.send_text(chat_id, "oi")                    # não bloqueia
+    ob.send_photo(chat_id, caption, render=fn)     # fn() -> bytes (ou caminho) do PNG, chamado no sender
+    ob.stop()                                      # esvazia a fila (até drain_timeout)
+
+    Mensagens do mesmo chat saem na ordem em que entraram; chats diferentes
+    não esperam uns pelos outros. Com `store`, `key=` torna o envio idempotente
+    e start() reenvia o que ficou pendente (registre os renderers antes).
+    """
+
+    def __init__(
+        self,
+        token: str,
+        session: Optional[requests.Session] = None,
+        per_chat_interval: float = 1.0,
+        global_per_sec: float = 25.0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        max_queue: int = 1000,
+        drain_timeout: float = 15.0,
+        metrics: CycleMetrics = NULL_METRICS,
+        timeout: float = 20.0,
+        store: Optional[OutboxStore] = None,
+        media: Optional[MediaCache] = None,
+        render_pool: Optional[RenderPool] = None,
+    ):
+        self.token = token
+        self.session = session or requests.Session()
+        self.per_chat_interval = max(0.0, float(per_chat_interval))
+        self.global_per_sec = max(1, int(global_per_sec))
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base = max(0.05, float(backoff_base))
+        self.backoff_max = max(self.backoff_base, float(backoff_max))
+        self.max_queue = max(1, int(max_queue))
+        self.drain_timeout = float(drain_timeout)
+        self.metrics = metrics
+        self.timeout = float(timeout)
+        self.store = store
+        self.media = media
+        self.render_pool = render_pool
+        self._renderers: Dict[str, Callable[..., str]] = {}
+
+        self._cond = threading.Condition()
+        self._chats: "OrderedDict[str, Deque[OutMsg]]" = OrderedDict()
+        self._next_ok: Dict[str, float] = {}
+        self._sent_window: Deque[float] = deque()
+        self._depth = 0
+        self._busy = False
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self.sent = 0
+        self.failed = 0
+
+    def register_renderer(self, name: str, fn: Callable[..., object]) -> None:
+        """fn(**render_args) -> bytes da imagem (ou caminho); usado por send_photo(render_name=...)."""
+        self._renderers[name] = fn
+
+    # ---------- enfileirar (chamado pelo loop quente) ----------
+    def put(self, msg: OutMsg) -> bool:
+        """Enfileira; True também quando a chave já foi registrada antes (nada a fazer)."""
+        with self._cond:
+            if self._depth >= self.max_queue:
+                self.metrics.incr("telegram_dropped")
+                print(f"[telegram] fila cheia ({self._depth}); descartando {msg.method}")
+                return False
+        if self.store is not None:
+            row_id = self.store.record(msg)
+            if row_id is None:
+                self.metrics.incr("telegram_dedup")
+                return True
+            msg.row_id = row_id
+        self._enqueue(msg)
+        return True
+
+    def _enqueue(self, msg: OutMsg) -> None:
+        if self.render_pool is not None:
+            self._prerender(msg)
+        with self._cond:
+            self._chats.setdefault(str(msg.chat_id), deque()).append(msg)
+            self._depth += 1
+            self.metrics.gauge("telegram_queue_depth", self._depth)
+            self._cond.notify()
+
+    def _resolve_render(self, msg: OutMsg) -> bool:
+        """render_name → msg.render; False se o renderer não foi registrado."""
+        if msg.render_name is not None and msg.render is None:
+            fn = self._renderers.get(msg.render_name)
+            if fn is None:
+                return False
+            args = msg.render_args or {}
+            msg.render = lambda: fn(**args)
+        return True
+
+    def _prerender(self, msg: OutMsg) -> None:
+        """Dispara o render no pool já no enfileiramento (fila cheia → render no sender)."""
+        if msg.file_path or msg.file_bytes is not None or not self._resolve_render(msg) or msg.render is None:
+            return
+        fut = self.render_pool.submit(msg.render)
+        if fut is None:
+            return
+        msg.future, msg.render_at = fut, time.time()
+        fut.add_done_callback(self._render_done)
+
+    def _render_done(self, _fut) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def send_text(self, chat_id, text: str, key: Optional[str] = None, **extra) -> bool:
+        data = {"chat_id": chat_id, "text": _truncate(text, 4096)}
+        data.update(extra)
+        return self.put(OutMsg("sendMessage", str(chat_id), data, key=key))
+
+    def send_photo(self, chat_id, caption: str, path: Optional[str] = None,
+                   render: Optional[Callable[[], str]] = None, fallback_text: Optional[str] = None,
+                   key: Optional[str] = None, render_name: Optional[str] = None,
+                   render_args: Optional[dict] = None) -> bool:
+        data = {"chat_id": chat_id, "caption": _truncate(caption, 1024)}
+        return self.put(OutMsg("sendPhoto", str(chat_id), data, "photo", path, render, fallback_text,
+                               key=key, render_name=render_name, render_args=render_args))
+
+    def send_animation(self, chat_id, caption: str, url: Optional[str] = None, path: Optional[str] = None,
+                       fallback_text: Optional[str] = None, key: Optional[str] = None) -> bool:
+        data = {"chat_id": chat_id, "caption": _truncate(caption, 1024)}
+        if url:
+            data["animation"] = url
+            return self.put(OutMsg("sendAnimation", str(chat_id), data, fallback_text=fallback_text, key=key))
+        return self.put(OutMsg("sendAnimation", str(chat_id), data, "animation", path, None, fallback_text, key=key))
+
+    def has(self, key: str) -> bool:
+        """Chave já registrada (enviada ou na fila)? Sem store, sempre False."""
+        return self.store is not None and self.store.has(key)
+
+    def depth(self) -> int:
+        with self._cond:
+            return self._depth
+
+    # ---------- ciclo de vida ----------
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        if self.store is not None:
+            with self._cond:
+                queued = {m.row_id for q in self._chats.values() for m in q}
+            replay = [m for m in self.store.pending() if m.row_id not in queued]
+            for msg in replay:
+                self._enqueue(msg)
+            if replay:
+                print(f"[telegram] reenviando {len(replay)} mensagem(ns) pendente(s) do outbox")
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="telegram-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> int:
+        """Espera a fila esvaziar (até timeout) e encerra; devolve quantas ficaram para trás."""
+        deadline = time.monotonic() + (self.drain_timeout if timeout is None else float(timeout))
+        with self._cond:
+            while (self._depth or self._busy) and self._thread is not None:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(min(left, 0.2))
+            self._stop = True
+            self._cond.notify_all()
+            left_behind = self._depth
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+        if left_behind:
+            print(f"[telegram] {left_behind} mensagem(ns) não enviada(s) no shutdown")
+        return left_behind
+
+    # ---------- sender ----------
+    def _pick_locked(self, now: float):
+        """(chat_id, espera). chat_id None → nada pronto; esperar `espera` segundos."""
+        while self._sent_window and now - self._sent_window[0] >= 1.0:
+            self._sent_window.popleft()
+        if len(self._sent_window) >= self.global_per_sec:
+            return None, 1.0 - (now - self._sent_window[0])
+        wait = None
+        for chat, q in self._chats.items():
+            if not q:
+                continue
+            head = q[0]
+            if head.future is not None and not head.future.done():
+                # card ainda no pool: o chat espera (ordem mantida), os outros seguem
+                left = head.render_at + self.render_pool.render_timeout - now
+                if left > 0:
+                    wait = left if wait is None else min(wait, left)
+                    continue
+            ready_at = max(self._next_ok.get(chat, 0.0), head.not_before)
+            if ready_at <= now:
+                self._chats.move_to_end(chat)  # round-robin entre chats
+                return chat, 0.0
+            wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        return None, wait
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._stop:
+                        return
+                    chat, wait = self._pick_locked(time.time())
+                    if chat is not None:
+                        break
+                    self._cond.wait(wait)
+                msg = self._chats[chat][0]
+                self._busy = True
+            try:
+                outcome, delay = self._deliver(msg)
+            except Exception as e:  # nunca deixa a thread morrer
+                print(f"[telegram] erro inesperado no sender: {e}")
+                outcome, delay = "drop", 0.0
+            with self._cond:
+                now = time.time()
+                self._busy = False
+                if outcome == "retry":
+                    msg.not_before = now + delay
+                else:
+                    if self.store is not None and msg.row_id is not None:
+                        self.store.mark(msg.row_id, SENT if outcome == "ok" else FAILED)
+                    self._chats[chat].popleft()
+                    if not self._chats[chat]:
+                        del self._chats[chat]
+                    self._depth -= 1
+                    self.metrics.gauge("telegram_queue_depth", self._depth)
+                self._cond.notify_all()
+
+    def _post(self, msg: OutMsg):
+        if msg.file_field and msg.file_bytes is not None:
+            url = TELEGRAM_API.format(token=self.token, method=msg.method)
+            name, mime = media_name(msg.file_bytes, msg.file_field)
+            return self.session.post(url, data=msg.data, files={msg.file_field: (name, msg.file_bytes, mime)},
+                                     timeout=self.timeout)
+        if msg.file_field and msg.file_path:
+            # file_id só para mídia estática; card renderizado é sempre um arquivo novo
+            static = msg.render is None and msg.render_name is None
+            return post_media(self.session, self.token, msg.method, msg.data, msg.file_field,
+                              msg.file_path, self.media if static else None, self.timeout)
+        url = TELEGRAM_API.format(token=self.token, method=msg.method)
+        return self.session.post(url, json=msg.data, timeout=self.timeout)
+
+    def _to_text(self, msg: OutMsg) -> bool:
+        """Foto/GIF que não deu: vira texto no mesmo lugar da fila."""
+        if msg.method == "sendMessage" or not msg.fallback_text:
+            return False
+        msg.method, msg.file_field, msg.file_path, msg.file_bytes = "sendMessage", None, None, None
+        msg.render, msg.render_name, msg.future = None, None, None
+        msg.data = {"chat_id": msg.chat_id, "text": _truncate(msg.fallback_text, 4096)}
+        msg.attempts = 0
+        return True
+
+    def _backoff(self, attempts: int) -> float:
+        d = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return d * random.uniform(0.8, 1.2)
+
+    def _deliver(self, msg: OutMsg):
+        """("ok"|"drop", 0) ou ("retry", atraso)."""
+        m = self.metrics
+        if not self._resolve_render(msg):
+            print(f"[telegram] renderer '{msg.render_name}' não registrado; fallback para texto")
+            return ("retry", 0.0) if self._to_text(msg) else ("drop", 0.0)
+        if msg.render is not None and not msg.file_path and msg.file_bytes is None:
+            fut, msg.future = msg.future, None
+            try:
+                if fut is not None and not fut.done():
+                    fut.cancel()
+                    raise TimeoutError(f"card não ficou pronto em {self.render_pool.render_timeout:.0f}s")
+                out = fut.result() if fut is not None else msg.render()
+                if isinstance(out, (bytes, bytearray)):
+                    msg.file_bytes = bytes(out)
+                else:
+                    msg.file_path = out
+            except Exception as e:
+                print(f"[telegram] render falhou ({e}); fallback para texto")
+                return ("retry", 0.0) if self._to_text(msg) else ("drop", 0.0)
+        if msg.file_field and msg.file_bytes is None and not (msg.file_path and os.path.exists(msg.file_path)):
+            print(f"[telegram] arquivo não encontrado: {msg.file_path}")
+            return ("retry", 0.0) if self._to_text(msg) else ("drop", 0.0)
+
+        if self.store is not None and msg.row_id is not None and msg.attempts == 0:
+            self.store.mark(msg.row_id, INFLIGHT)
+        now = time.time()
+        self._next_ok[msg.chat_id] = now + self.per_chat_interval
+        with self._cond:
+            self._sent_window.append(now)
+        t0 = time.perf_counter()
+        try:
+            r = self._post(msg)
+            status = r.status_code
+        except requests.exceptions.RequestException as e:
+            r, status = None, None
+            print(f"[telegram] {msg.method} falhou — {e.__class__.__name__}: {e}")
+        m.observe("telegram_send_ms", (time.perf_counter() - t0) * 1000.0)
+
+        if status == 200:
+            self.sent += 1
+            m.incr("telegram_sent")
+            m.observe("telegram_queue_ms", (time.time() - msg.enq_at) * 1000.0)
+            return "ok", 0.0
+
+        if status == 429:
+            ra = _retry_after(r) or 5.0
+            m.incr("telegram_429")
+            self._next_ok[msg.chat_id] = time.time() + ra
+            print(f"[telegram] 429 no chat {msg.chat_id}; retry_after={ra:.0f}s")
+            return "retry", ra
+
+        if status == 400 and "parse entities" in (r.text or "").lower() and "parse_mode" in msg.data:
+            msg.data.pop("parse_mode", None)
+            return "retry", 0.0
+
+        if status is not None and 400 <= status < 500:
+            print(f"[telegram] {msg.method} {status}: {(r.text or '')[:200]}")
+            if self._to_text(msg):
+                return "retry", 0.0
+            self.failed += 1
+            m.incr("telegram_failed")
+            return "drop", 0.0
+
+        # rede / 5xx: backoff
+        msg.attempts += 1
+        if msg.attempts > self.max_retries:
+            if self._to_text(msg):
+                return "retry", 0.0
+            self.failed += 1
+            m.incr("telegram_failed")
+            print(f"[telegram] desistindo de {msg.method} após {msg.attempts - 1} retries")
+            return "drop", 0.0
+        m.incr("telegram_retries")
+        return "retry", self._backoff(msg.attempts)
+
+
+def media_cache_from_cfg(cfg: dict) -> Optional[MediaCache]:
+    tg = cfg.get("telegram") or {}
+    path = tg.get("media_cache_file", "moonshot_media_ids.json")
+    if not tg.get("bot_token") or not path:
+        return None
+    return MediaCache(path, tg["bot_token"])
+
+
+def outbox_from_cfg(cfg: dict, metrics: CycleMetrics = NULL_METRICS,
+                    session: Optional[requests.Session] = None,
+                    media: Optional[MediaCache] = None,
+                    render_pool: Optional[RenderPool] = None) -> Optional[TelegramOutbox]:
+    tg = cfg.get("telegram") or {}
+    oc = tg.get("outbox") or {}
+    if not tg.get("enabled", False) or not oc.get("enabled", True) or not tg.get("bot_token"):
+        return None
+    store = None
+    db = oc.get("db", "moonshot_outbox.db")
+    if db:
+        store = OutboxStore(db, source="agent")
+        store.prune(float(oc.get("keep_days", 30)))
+    return TelegramOutbox(
+        tg["bot_token"],
+        session=session,
+        per_chat_interval=float(oc.get("per_chat_interval_sec", 1.0)),
+        global_per_sec=float(oc.get("global_per_sec", 25)),
+        max_retries=int(oc.get("max_retries", 5)),
+        backoff_base=float(oc.get("backoff_base_sec", 1.0)),
+        backoff_max=float(oc.get("backoff_max_sec", 60)),
+        max_queue=int(oc.get("max_queue", 1000)),
+        drain_timeout=float(oc.get("drain_timeout_sec", 15)),
+        metrics=metrics,
+        store=store,
+        media=media,
+        render_pool=render_pool,
+    )
+
+
+def outbox_from_env(env: dict, token: str, source: str, base_dir: str = ".",
+                    render_pool: Optional[RenderPool] = None) -> TelegramOutbox:
+    """Para os daemons em tools/ (config via .env_moonshot): OUTBOX_DB, OUTBOX_KEEP_DAYS."""
+    db = os.path.expanduser(env.get("OUTBOX_DB") or os.path.join(base_dir, "moonshot_outbox.db"))
+    store = OutboxStore(db, source=source)
+    store.prune(float(env.get("OUTBOX_KEEP_DAYS", "30")))
+    return TelegramOutbox(
+        token,
+        per_chat_interval=float(env.get("OUTBOX_PER_CHAT_INTERVAL_SEC", "1.0")),
+        store=store,
+        render_pool=render_pool,
+    )
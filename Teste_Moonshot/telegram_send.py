@@ -1,7 +1,8 @@
 import requests
 from pathlib import Path
 from typing import Optional
-from moonshot_card import generate_trade_card  # usamos um único gerador para TP/STOP
+from moonshot_card import CardArchive, default_renderer  # um único gerador para TP/STOP
+from telegram_outbox import media_name
 
 TELEGRAM_API = "https://api.telegram.org/bot{token}/{method}"
 
@@ -16,19 +17,19 @@ def _resolve(path_candidates):
             return str(p)
     return None
 
-def _send_photo(token: str, chat_id: str, photo_path: str, caption: str, parse_mode: Optional[str] = None) -> None:
-    with open(photo_path, "rb") as f:
-        data = {"chat_id": chat_id, "caption": caption}
-        if parse_mode:
-            data["parse_mode"] = parse_mode
-        r = requests.post(TELEGRAM_API.format(token=token, method="sendPhoto"),
-                          data=data, files={"photo": f}, timeout=30)
+def _send_photo(token: str, chat_id: str, photo: bytes, caption: str, parse_mode: Optional[str] = None) -> None:
+    # PNG em memória vai direto no multipart (sem arquivo temporário); nome/mime pela codificação
+    name, mime = media_name(photo, "card")
+    data = {"chat_id": chat_id, "caption": caption}
+    if parse_mode:
+        data["parse_mode"] = parse_mode
+    r = requests.post(TELEGRAM_API.format(token=token, method="sendPhoto"),
+                      data=data, files={"photo": (name, photo, mime)}, timeout=30)
     # Se erro de parse, reenvia sem parse_mode
     if r.status_code == 400 and "parse entities" in r.text.lower():
-        with open(photo_path, "rb") as f:
-            r2 = requests.post(TELEGRAM_API.format(token=token, method="sendPhoto"),
-                               data={"chat_id": chat_id, "caption": caption},
-                               files={"photo": f}, timeout=30)
+        r2 = requests.post(TELEGRAM_API.format(token=token, method="sendPhoto"),
+                           data={"chat_id": chat_id, "caption": caption},
+                           files={"photo": (name, photo, mime)}, timeout=30)
         r2.raise_for_status()
         return
     r.raise_for_status()
@@ -38,41 +39,33 @@ def _send_text(token: str, chat_id: str, text: str) -> None:
                       data={"chat_id": chat_id, "text": text}, timeout=20)
     r.raise_for_status()
 
-def send_tp_card(token: str, chat_id: str, data: dict, bg_path: str = None, out_dir: str = "/tmp") -> None:
-    # Gera card padrão (TP1/TP2/TP3)
-    out = Path(out_dir); out.mkdir(parents=True, exist_ok=True)
+def render_tp_card(data: dict, bg_path: str = None, archive: Optional[CardArchive] = None) -> bytes:
+    # Gera card padrão (TP1/TP2/TP3) em memória (bytes no formato do renderer padrão); `archive` guarda uma cópia em disco
     label = data.get("tp_label") or data.get("event") or "TP"
-    img = out / f"moonshot_{data.get('symbol','SYMBOL')}_{label}.png"
 
     # resolver BG
     here = Path(__file__).resolve().parent
     bg_resolved = _resolve([bg_path or "", here / "assets/moonshot/bg.jpg", here.parent / "assets/moonshot/bg.jpg"])
 
-    # gerar imagem
-    generate_trade_card(
-        symbol=data.get("symbol",""),
-        side=data.get("side","LONG"),
-        leverage=data.get("leverage",""),
-        tp_label=label,
-        roi_pct=float(data.get("roi_pct", 0.0)),
-        entry_price=float(data.get("entry", 0.0) or 0.0),
-        last_price=float(data.get("last", 0.0) or 0.0),
-        stop_text=str(data.get("stop_text","") or data.get("sl","") or ""),
-        out_path=str(img),
-        bg_path=bg_resolved,
+    r = default_renderer()
+    im = r.trade_card(
+        data.get("symbol",""),
+        data.get("side","LONG"),
+        data.get("leverage",""),
+        label,
+        float(data.get("roi_pct", 0.0)),
+        float(data.get("entry", 0.0) or 0.0),
+        float(data.get("last", 0.0) or 0.0),
+        str(data.get("stop_text","") or data.get("sl","") or ""),
+        bg_resolved,
     )
+    png = r.encode(im)  # formato em cards.encoding
+    if archive is not None:
+        archive.save(png, label, data.get("symbol", "SYMBOL"), ext=r.ext)
+    return png
 
-    caption = _truncate(data.get("caption") or f"{data.get('symbol','')} | {label}", 1024)
-    try:
-        _send_photo(token, chat_id, str(img), caption, parse_mode=None)
-    except requests.exceptions.RequestException:
-        _send_text(token, chat_id, _truncate(caption, 4096))
-
-def send_stop_card(token: str, chat_id: str, data: dict, bg_path_stop: str = None, out_dir: str = "/tmp") -> None:
+def render_stop_card(data: dict, bg_path_stop: str = None, archive: Optional[CardArchive] = None) -> bytes:
     # Usa o MESMO gerador de card, apenas rotula como STOP e troca o BG se existir
-    out = Path(out_dir); out.mkdir(parents=True, exist_ok=True)
-    img = out / f"moonshot_{data.get('symbol','SYMBOL')}_STOP.png"
-
     here = Path(__file__).resolve().parent
     bg_resolved = _resolve([
         bg_path_stop or "",
@@ -82,22 +75,37 @@ def send_stop_card(token: str, chat_id: str, data: dict, bg_path_stop: str = Non
         here.parent / "assets/moonshot/bg.jpg",
     ])
 
-    generate_trade_card(
-        symbol=data.get("symbol",""),
-        side=data.get("side","LONG"),
-        leverage=data.get("leverage",""),
-        tp_label="STOP",
-        roi_pct=float(data.get("roi_pct", 0.0)),
-        entry_price=float(data.get("entry", 0.0) or 0.0),
-        last_price=float(data.get("last", 0.0) or 0.0),
-        stop_text=str(data.get("sl","") or data.get("stop_text","") or ""),
-        out_path=str(img),
-        bg_path=bg_resolved,
+    r = default_renderer()
+    im = r.trade_card(
+        data.get("symbol",""),
+        data.get("side","LONG"),
+        data.get("leverage",""),
+        "STOP",
+        float(data.get("roi_pct", 0.0)),
+        float(data.get("entry", 0.0) or 0.0),
+        float(data.get("last", 0.0) or 0.0),
+        str(data.get("sl","") or data.get("stop_text","") or ""),
+        bg_resolved,
     )
+    png = r.encode(im)  # formato em cards.encoding
+    if archive is not None:
+        archive.save(png, "STOP", data.get("symbol", "SYMBOL"), ext=r.ext)
+    return png
+
+def send_tp_card(token: str, chat_id: str, data: dict, bg_path: str = None, archive: Optional[CardArchive] = None) -> None:
+    png = render_tp_card(data, bg_path=bg_path, archive=archive)
+    label = data.get("tp_label") or data.get("event") or "TP"
+    caption = _truncate(data.get("caption") or f"{data.get('symbol','')} | {label}", 1024)
+    try:
+        _send_photo(token, chat_id, png, caption, parse_mode=None)
+    except requests.exceptions.RequestException:
+        _send_text(token, chat_id, _truncate(caption, 4096))
 
+def send_stop_card(token: str, chat_id: str, data: dict, bg_path_stop: str = None, archive: Optional[CardArchive] = None) -> None:
+    png = render_stop_card(data, bg_path_stop=bg_path_stop, archive=archive)
     cap = data.get("caption") or f"{data.get('symbol','')} | STOP"
     caption = _truncate(cap, 1024)
     try:
-        _send_photo(token, chat_id, str(img), caption, parse_mode=None)
+        _send_photo(token, chat_id, png, caption, parse_mode=None)
     except requests.exceptions.RequestException:
         _send_text(token, chat_id, _truncate(caption, 4096))
@@ -0,0 +1,150 @@
+# tools/file_watch.py — acordar consumidores só quando um arquivo muda de verdade
+# - FileWatcher: inotify (Linux, via ctypes) no diretório do arquivo — pega o
+#   tmp+replace dos atomic_write — com fallback para polling de mtime/size/inode
+# - JsonFileCache: re-parse do JSON só quando a assinatura do arquivo muda
+# - Fora do escopo: leitor incremental de logs append-only (só os bytes novos). Nenhum
+#   consumidor aqui lê log — hb_sidecar só olha o mtime de logs/*.out —, então não há
+#   o que ligar; se aparecer um, é aqui que ele entra
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_NONBLOCK    = 0o4000
+IN_CLOEXEC     = 0o2000000
+_EVENT_HDR = struct.Struct("iIII")
+
+_libc = None
+
+
+def _inotify_libc():
+    global _libc
+    if _libc is None:
+        try:
+            lib = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            lib.inotify_init1  # noqa: B018 — só confere que o símbolo existe
+            _libc = lib
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc or None
+
+
+def file_signature(path):
+    """(mtime_ns, size, inode) ou None se o arquivo não existe."""
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+    except FileNotFoundError:
+        return None
+
+
+class FileWatcher:
+    """
+    w = FileWatcher(path)
+    while True:
+        if w.wait(timeout=300):   # True só se o arquivo mudou desde a última checagem
+            ...
+    """
+
+    def __init__(self, path, poll_sec=1.0, use_inotify=True):
+        self.path = Path(path)
+        self.poll_sec = max(0.05, float(poll_sec))
+        self._sig = file_signature(self.path)
+        self._fd = None
+        lib = _inotify_libc() if use_inotify else None
+        if lib is not None:
+            fd = lib.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+                wd = lib.inotify_add_watch(fd, str(self.path.parent.resolve()).encode(), mask)
+                if wd >= 0:
+                    self._fd = fd
+                else:
+                    os.close(fd)
+
+    @property
+    def backend(self):
+        return "inotify" if self._fd is not None else "poll"
+
+    def changed(self):
+        """Checagem não bloqueante pela assinatura (mtime/size/inode)."""
+        sig = file_signature(self.path)
+        if sig != self._sig:
+            self._sig = sig
+            return True
+        return False
+
+    def _drain(self):
+        names = set()
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            i = 0
+            while i + _EVENT_HDR.size <= len(buf):
+                _wd, _mask, _cookie, ln = _EVENT_HDR.unpack_from(buf, i)
+                i += _EVENT_HDR.size
+                names.add(buf[i:i + ln].rstrip(b"\0").decode(errors="replace"))
+                i += ln
+        return names
+
+    def wait(self, timeout=None):
+        """Bloqueia até o arquivo mudar (True) ou o timeout estourar (False)."""
+        if self.changed():
+            return True
+        deadline = None if timeout is None else time.monotonic() + float(timeout)
+        while True:
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                return False
+            if self._fd is not None:
+                r, _, _ = select.select([self._fd], [], [], left)
+                if r and self.path.name in self._drain() and self.changed():
+                    return True
+            else:
+                time.sleep(self.poll_sec if left is None else min(self.poll_sec, left))
+                if self.changed():
+                    return True
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class JsonFileCache:
+    """JSON parseado uma vez por versão do arquivo; `get()` devolve o mesmo objeto enquanto não mudar."""
+
+    def __init__(self, path, default=None):
+        self.path = Path(path)
+        self.default = default
+        self._sig = None
+        self._data = default
+
+    def get(self):
+        sig = file_signature(self.path)
+        if sig is None:
+            self._sig, self._data = None, self.default
+        elif sig != self._sig:
+            text = self.path.read_text(encoding="utf-8")
+            self._data = json.loads(text) if text.strip() else self.default
+            self._sig = sig
+        return self._data
+
+    def mark_written(self, data):
+        """Depois de gravar o próprio arquivo: evita re-parse do que acabamos de escrever."""
+        self._sig = file_signature(self.path)
+        self._data = data
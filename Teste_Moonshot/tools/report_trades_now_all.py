@@ -1,6 +1,27 @@
-import os, json, pathlib, requests
+# tools/report_trades_now_all.py — trades em aberto de todas as instâncias numa mensagem
+# - Lê REPORT_TRADES_FILE + EXTRA_TRADES_FILES em paralelo (uma thread por arquivo); cada
+#   arquivo fica em cache pela assinatura (mtime/size/inode) e só é re-parseado se mudou
+# - Preços: um único GET /v5/market/tickers (todos os lineares) em vez de um por símbolo;
+#   bybit_last() só para o que não vier no mapa
+# - Um passe só monta a visão agregada por (symbol, tf) — o status "mais aberto" vence,
+#   com a fonte entre colchetes — e o resumo por fonte (abertos / PnL médio)
+# - Modo daemon (--daemon): fica rodando, re-lê só os arquivos que mudaram e reenvia a
+#   cada REPORT_ALL_EVERY_SEC (ou só quando as posições mudam, REPORT_ALL_ONLY_CHANGES=1)
+#
+# .env_moonshot (valores padrão):
+#   REPORT_ALL_EVERY_SEC=300
+#   REPORT_ALL_ONLY_CHANGES=0
+#
+#   python tools/report_trades_now_all.py              # uma vez (como antes)
+#   python tools/report_trades_now_all.py --no-send    # só imprime
+#   python tools/report_trades_now_all.py --daemon
+
+import argparse, fcntl, os, pathlib, sys, time, requests
+from concurrent.futures import ThreadPoolExecutor
 
 BASE = pathlib.Path(__file__).resolve().parent.parent
+if str(BASE) not in sys.path: sys.path.insert(0, str(BASE))
+from tools.file_watch import JsonFileCache, file_signature
 
 # ==== carregar .env_moonshot ====
 env = os.environ.copy()
@@ -8,7 +29,7 @@ env_file = BASE / ".env_moonshot"
 if env_file.exists():
     for line in env_file.read_text().splitlines():
         line=line.strip()
-        if not line or line.startswith("#") or "=" not in line: 
+        if not line or line.startswith("#") or "=" not in line:
             continue
         k,v = line.split("=",1)
         env.setdefault(k.strip(), v.strip().strip("'").strip('"'))
@@ -16,6 +37,8 @@ if env_file.exists():
 TAG     = (env.get("REPORT_TAG") or "").strip()
 TOKEN   = env.get("TELEGRAM_BOT_TOKEN") or env.get("TELEGRAM_BOT")
 CHAT_ID = env.get("TELEGRAM_CHAT_ID")
+EVERY   = int(env.get("REPORT_ALL_EVERY_SEC", "300"))
+ONLY_CHANGES = env.get("REPORT_ALL_ONLY_CHANGES", "0") == "1"
 
 primary = env.get("REPORT_TRADES_FILE") or "moonshot_trades.json"
 extras  = env.get("EXTRA_TRADES_FILES","").replace(";",",")
@@ -25,11 +48,8 @@ def abspath(p):
     P = pathlib.Path(p)
     return P if P.is_absolute() else (BASE / P)
 
-FILES = []
-for fp in [primary] + extra_list:
-    P = abspath(fp)
-    if P.exists():
-        FILES.append(P)
+# sem filtrar por exists(): no daemon um arquivo pode aparecer depois
+PATHS = [abspath(fp) for fp in [primary] + extra_list]
 
 def src_tag(fp: pathlib.Path) -> str:
     s = str(fp)
@@ -57,6 +77,15 @@ def bybit_last(symbol: str):
         pass
     return None
 
+def bybit_last_map(category="linear"):
+    """symbol → lastPrice de todos os tickers numa chamada ({} se falhar)."""
+    try:
+        r = requests.get("https://api.bybit.com/v5/market/tickers", params={"category":category}, timeout=10)
+        lst = ((r.json().get("result") or {}).get("list")) or []
+        return {x["symbol"]: float(x["lastPrice"]) for x in lst if x.get("lastPrice")}
+    except Exception:
+        return {}
+
 def pnl_pct(side, entry, price):
     if not entry or not price: return 0.0
     return (price/entry-1.0)*100.0 if (side or "").upper()=="LONG" else (1.0-price/entry)*100.0
@@ -70,51 +99,153 @@ def rank_status(s: str) -> int:
     if "PARTIAL" in s or "REDUCE" in s: return 1
     return 0
 
-# ==== agrega por (symbol, tf) escolhendo o status "mais aberto" ====
-agg = {}
-for fp in FILES:
-    try:
-        data = json.loads(fp.read_text() or "{}")
-    except Exception:
-        continue
-    source = src_tag(fp)
-    for k,t in (data.items() if isinstance(data, dict) else []):
-        if not isinstance(t, dict): continue
-        if not is_open_like(t.get("status")): continue
-        sym = (t.get("symbol") or "").upper()
-        tf  = str(t.get("tf") or t.get("timeframe") or "")
-        key = (sym, tf)
-        prev = agg.get(key)
-        if (prev is None) or (rank_status(t.get("status")) > rank_status(prev.get("status",""))) \
-           or ((t.get("opened_at") or "") > (prev.get("opened_at") or "")):
-            t2 = dict(t)
-            t2["_source"] = source
-            agg[key] = t2
+# ==== fontes (um arquivo de trades por instância) ====
+class Source:
+    """Trades abertos de um arquivo; re-parse só quando a assinatura do arquivo muda."""
 
-# ==== monta mensagem ====
-lines = []
-for (sym, tf), t in sorted(agg.items()):
-    side  = (t.get("side") or "").upper()
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.tag = src_tag(path)
+        self.cache = JsonFileCache(path, default={})
+        self.sig = None
+        self.open = []
+
+    def refresh(self) -> bool:
+        sig = file_signature(self.path)
+        if sig == self.sig:
+            return False
+        try:
+            data = self.cache.get()
+        except Exception:
+            data = {}  # JSON no meio de uma gravação: tenta de novo na próxima rodada
+            sig = None
+        self.sig = sig
+        self.open = [t for t in (data.values() if isinstance(data, dict) else [])
+                     if isinstance(t, dict) and is_open_like(t.get("status"))]
+        return True
+
+def refresh_all(sources, pool):
+    """Checa/relê os arquivos em paralelo; devolve quantos mudaram."""
+    return sum(pool.map(lambda s: s.refresh(), sources))
+
+# ==== agrega por (symbol, tf) escolhendo o status "mais aberto" + resumo por fonte ====
+def aggregate(sources):
+    agg, per_source = {}, {}
+    for src in sources:  # ordem dos arquivos preservada (desempate igual ao de antes)
+        if src.sig is None: continue  # arquivo (ainda) inexistente
+        per_source.setdefault(src.tag, [])
+        for t in src.open:
+            sym = (t.get("symbol") or "").upper()
+            tf  = str(t.get("tf") or t.get("timeframe") or "")
+            key = (sym, tf)
+            per_source[src.tag].append(t)
+            prev = agg.get(key)
+            if (prev is None) or (rank_status(t.get("status")) > rank_status(prev.get("status",""))) \
+               or ((t.get("opened_at") or "") > (prev.get("opened_at") or "")):
+                t2 = dict(t)
+                t2["_source"] = src.tag
+                agg[key] = t2
+    return agg, per_source
+
+def entry_of(t):
     entry = t.get("entry_price") or t.get("avg_entry") or t.get("entry") or 0
-    entry = float(entry) if entry not in (None,"",0) else 0.0
-    last  = bybit_last(sym) or entry
-    pnl   = pnl_pct(side, entry, last)
-    tps   = t.get("tp_levels") or t.get("tps") or []
-    tp1   = tps[0] if len(tps)>=1 else "-"
-    tp2   = tps[1] if len(tps)>=2 else "-"
-    tp3   = tps[2] if len(tps)>=3 else "-"
-    sl    = t.get("stop_loss") or t.get("sl") or "-"
-    src   = f" [{t.get('_source')}]" if t.get("_source") else ""
-    tf2   = f" {tf}" if tf else ""
-    lines.append(f"• {sym}{tf2} {side}{src} | entry {entry:g} → last {last:g} | PnL {pnl:.2f}% | SL {sl} | TP1 {tp1} | TP2 {tp2} | TP3 {tp3} | N[----]")
-
-header = f"{(TAG+' ') if TAG else ''}📈 Trades em aberto (agregado) ({len(agg)}):"
-msg = header + ("\n\n" + "\n".join(lines) if lines else "\n\n(nenhuma)")
-
-print(msg)
-if TOKEN and CHAT_ID:
+    return float(entry) if entry not in (None,"",0) else 0.0
+
+def prices_for(symbols):
+    """Um GET para todos; fallback por símbolo só para o que faltar no mapa."""
+    if not symbols: return {}
+    m = bybit_last_map()
+    for sym in symbols:
+        if sym not in m:
+            px = bybit_last(sym)
+            if px is not None: m[sym] = px
+    return m
+
+# ==== monta mensagem ====
+def build_message(agg, per_source, prices):
+    lines = []
+    for (sym, tf), t in sorted(agg.items()):
+        side  = (t.get("side") or "").upper()
+        entry = entry_of(t)
+        last  = prices.get(sym) or entry
+        pnl   = pnl_pct(side, entry, last)
+        tps   = t.get("tp_levels") or t.get("tps") or []
+        tp1   = tps[0] if len(tps)>=1 else "-"
+        tp2   = tps[1] if len(tps)>=2 else "-"
+        tp3   = tps[2] if len(tps)>=3 else "-"
+        sl    = t.get("stop_loss") or t.get("sl") or "-"
+        src   = f" [{t.get('_source')}]" if t.get("_source") else ""
+        tf2   = f" {tf}" if tf else ""
+        lines.append(f"• {sym}{tf2} {side}{src} | entry {entry:g} → last {last:g} | PnL {pnl:.2f}% | SL {sl} | TP1 {tp1} | TP2 {tp2} | TP3 {tp3} | N[----]")
+
+    summary = []
+    for tag, items in per_source.items():
+        if not items:
+            summary.append(f"{tag}: 0")
+            continue
+        pnls = [pnl_pct((t.get("side") or "").upper(), entry_of(t),
+                        prices.get((t.get("symbol") or "").upper()) or entry_of(t)) for t in items]
+        summary.append(f"{tag}: {len(items)} (PnL médio {sum(pnls)/len(pnls):+.2f}%)")
+
+    header = f"{(TAG+' ') if TAG else ''}📈 Trades em aberto (agregado) ({len(agg)}):"
+    if len(per_source) > 1:
+        header += "\n" + " | ".join(summary)
+    return header + ("\n\n" + "\n".join(lines) if lines else "\n\n(nenhuma)")
+
+def positions_key(agg):
+    """O que muda a lista (não o preço): para REPORT_ALL_ONLY_CHANGES."""
+    return sorted((k, str(t.get("status")), t.get("_source")) for k, t in agg.items())
+
+def send(msg):
+    if not (TOKEN and CHAT_ID): return
     try:
         requests.post(f"https://api.telegram.org/bot{TOKEN}/sendMessage",
-                      data={"chat_id": CHAT_ID, "text": msg})
+                      data={"chat_id": CHAT_ID, "text": msg}, timeout=15)
     except Exception:
         pass
+
+def run_once(sources, pool, do_send=True):
+    refresh_all(sources, pool)
+    agg, per_source = aggregate(sources)
+    msg = build_message(agg, per_source, prices_for({sym for sym, _ in agg}))
+    print(msg)
+    if do_send: send(msg)
+    return agg
+
+def daemon(sources, pool, do_send=True):
+    lock = open(f"/tmp/report_all_{BASE.name}.lock", "w")
+    try: fcntl.flock(lock, fcntl.LOCK_EX|fcntl.LOCK_NB)
+    except OSError: print("[report_all] já existe outra instância; saindo.", flush=True); return
+    print(f"[report_all] {len(sources)} arquivo(s) a cada {EVERY}s"
+          f"{' (só quando mudar)' if ONLY_CHANGES else ''}", flush=True)
+    last_key = None
+    while True:
+        t0 = time.time()
+        try:
+            changed = refresh_all(sources, pool)
+            agg, per_source = aggregate(sources)
+            key = positions_key(agg)
+            if not ONLY_CHANGES or key != last_key:
+                msg = build_message(agg, per_source, prices_for({sym for sym, _ in agg}))
+                if do_send: send(msg)
+                print(f"[report_all] enviado: {len(agg)} aberto(s), {changed} arquivo(s) relido(s) "
+                      f"em {time.time() - t0:.2f}s", flush=True)
+            last_key = key
+        except Exception as e:
+            print("[report_all] erro:", e, flush=True)
+        time.sleep(max(1.0, EVERY - (time.time() - t0)))
+
+def main():
+    ap = argparse.ArgumentParser(description="Trades em aberto de todas as instâncias (agregado)")
+    ap.add_argument("--daemon", action="store_true", help="fica rodando e reenvia a cada REPORT_ALL_EVERY_SEC")
+    ap.add_argument("--no-send", action="store_true", help="só imprime, não manda no Telegram")
+    args = ap.parse_args()
+    sources = [Source(p) for p in PATHS]
+    with ThreadPoolExecutor(max_workers=max(1, len(sources)), thread_name_prefix="report-all") as pool:
+        if args.daemon:
+            daemon(sources, pool, not args.no_send)
+        else:
+            run_once(sources, pool, not args.no_send)
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
-import os, time, json, pathlib, requests, fcntl, sys, hashlib
+import os, time, json, pathlib, requests, fcntl, sys
 from pathlib import Path
 import sys
 BASE = Path(__file__).resolve().parent.parent
 if str(BASE) not in sys.path: sys.path.insert(0, str(BASE))
-from moonshot_card import generate_stop_card  # << usa seu gerador de card
+from moonshot_card import archive_from_env, default_renderer, renderer_from_env, set_default_renderer  # << usa seu gerador de card
+from tools.file_watch import FileWatcher, JsonFileCache
+from telegram_outbox import outbox_from_env
+from moonshot_render_pool import render_pool_from_env
 
 BASE = pathlib.Path(__file__).resolve().parent.parent
 env = os.environ.copy()
@@ -16,13 +19,15 @@ TOKEN=env.get("TELEGRAM_BOT_TOKEN")
 CHAT =env.get("TELEGRAM_STOPS_CHAT_ID") or env.get("TELEGRAM_CHAT_ID")
 TAG  =(env.get("STOPS_TAG") or "[TESTE]").strip()
 EVERY=int(env.get("STOP_WATCH_EVERY_SEC","15"))
+IDLE_MAX=int(env.get("WATCH_IDLE_MAX_SEC","300"))  # sem trade aberta: dorme até o arquivo mudar
 TRF  =env.get("REPORT_TRADES_FILE") or "moonshot_trades.json"
 TRADES = pathlib.Path(TRF) if pathlib.Path(TRF).is_absolute() else (BASE/TRF)
 SET_STATUS=int(env.get("STOP_SET_STATUS","1"))
-SENT_FILE = pathlib.Path(os.path.expanduser(env.get("STOPS_SENT_FILE") or "~/.moonshot_shared/stops_sent.json"))
 STOP_BG = env.get("STOP_CARD_TEMPLATE", "assets/moonshot/bg_stoploss.jpg")
-OUTDIR = pathlib.Path(env.get("CARD_OUT_DIR") or (BASE/"out"))
-OUTDIR.mkdir(parents=True, exist_ok=True)
+# card vai da memória direto para o upload; cópia em disco só com CARD_ARCHIVE=1 (com retenção)
+ARCHIVE = archive_from_env(env, BASE/"out")
+set_default_renderer(renderer_from_env(env))  # CARD_ENCODING / CARD_QUALITY
+SERVICE_URL = (env.get("TRADE_SERVICE_URL") or "").strip()  # ex.: http://127.0.0.1:8765
 
 # lock
 lock=open(f"/tmp/sl_watcher_{BASE.name}.lock","w")
@@ -43,36 +48,78 @@ def pnl_pct(side,entry,price):
     if not entry or not price: return 0.0
     return (price/entry-1.0)*100.0 if side=="LONG" else (1.0-price/entry)*100.0
 
-def load_sent():
-    try: return set(json.loads(SENT_FILE.read_text()))
-    except Exception: return set()
-def save_sent(s):
-    try: SENT_FILE.write_text(json.dumps(sorted(s)))
-    except Exception: pass
-def key(kjson, side, sl): return hashlib.sha1(f"{kjson}|{side}|{sl}".encode()).hexdigest()
+def key(kjson, side, sl): return f"sl:{kjson}:{side}:{sl}"
 
-def send_photo(path, caption):
-    if not (TOKEN and CHAT): return False
-    try:
-        with open(path, "rb") as f:
-            r=requests.post(f"https://api.telegram.org/bot{TOKEN}/sendPhoto",
-                            data={"chat_id":CHAT,"caption":caption},
-                            files={"photo":("stop.png", f, "image/png")}, timeout=30)
-        return r.ok
-    except Exception: return False
+# outbox durável (SQLite compartilhado): chave de idempotência por trade/evento no lugar
+# do antigo *_sent.json; o que ficou pendente num restart é reenviado
+OUTBOX = (outbox_from_env(env, TOKEN, source="sl_watcher", base_dir=str(BASE),
+                          render_pool=render_pool_from_env(env))  # cards gerados em paralelo (CARD_WORKERS)
+          if (TOKEN and CHAT) else None)
+
+def render_stop_card(sym, side, lev, roi_pct, entry, filled, sl):
+    # no pool de render (também no replay); devolve os bytes da imagem
+    r = default_renderer()
+    im = r.stop_card(
+        symbol=sym, side=side, leverage=lev,
+        roi_pct=roi_pct, entry_price=float(entry),
+        filled_price=float(filled), sl_price=float(sl), bg_path=STOP_BG,
+    )
+    png = r.encode(im)
+    if ARCHIVE is not None: ARCHIVE.save(png, "stop", sym, ext=r.ext)
+    return png
+
+if OUTBOX is not None:
+    OUTBOX.register_renderer("stop_card", render_stop_card)
+    OUTBOX.start()
+
+def notify_stop(k, sym, side, tf, tr, price, sl):
+    if OUTBOX is None:
+        print("[sl] sem TELEGRAM_BOT_TOKEN/CHAT; aviso não enviado", flush=True); return
+    entry=float(tr.get("entry_price") or tr.get("avg_entry") or tr.get("entry") or 0) or 0.0
+    delta=pnl_pct(side, entry, price or sl)
+    caption=f"{TAG} 🛑 Stop Loss | {sym} {side} on {tf}"
+    OUTBOX.send_photo(
+        CHAT, caption,
+        render_name="stop_card",
+        render_args={"sym":sym, "side":side, "lev":str(tr.get("lev") or tr.get("leverage") or ""),
+                     "roi_pct":delta, "entry":entry,
+                     "filled":float(price if price is not None else sl), "sl":sl},
+        fallback_text=f"{caption}\nFilled: {(price or sl):g}\nROI (est.): {delta:.4f}%",
+        key=key(k, side, sl),
+    )
+
+def loop_service():
+    # assinante do serviço de trades do agente: o monitor decide o STOP, aqui só o card
+    from moonshot_trade_service import TradeServiceClient
+    client=TradeServiceClient(SERVICE_URL)
+    print(f"[sl] assinando eventos de {SERVICE_URL} | bg={STOP_BG}", flush=True)
+    for k,kind,tr in client.follow(retry_sec=EVERY):
+        try:
+            if str(tr.get("status","")).upper()!="STOP" or tr.get("sl_sent"): continue
+            side=(tr.get("side") or "").upper()
+            sym =(tr.get("symbol") or "").upper()
+            sl  = tr.get("stop_loss") or tr.get("sl")
+            if not sym or sl is None: continue
+            sl=float(sl)
+            price=tr.get("exit_price")
+            notify_stop(k, sym, side, str(tr.get("tf") or ""), tr, float(price) if price is not None else None, sl)
+            client.patch(k, {"sl_sent": True})
+        except Exception as e:
+            print("[sl] erro:", e, flush=True)
 
 def loop():
     print(f"[sl] watching {TRADES} every {EVERY}s | bg={STOP_BG}", flush=True)
-    sent=load_sent()
+    cache=JsonFileCache(TRADES, default={}); watch=FileWatcher(TRADES)
     while True:
+        pending=True
         try:
-            if not TRADES.exists(): time.sleep(EVERY); continue
-            data=json.loads(TRADES.read_text() or "{}"); changed=False
+            data=cache.get(); changed=False; pending=False
             for k,tr in list(data.items()):
                 if not isinstance(tr,dict): continue
                 st=str(tr.get("status","")).upper()
                 if st.startswith("CLOSED") or st in {"STOP","CANCEL","CANCELED"}:
                     continue
+                pending=True
                 side=(tr.get("side") or "").upper()
                 sym =(tr.get("symbol") or "").upper()
                 tf  = str(tr.get("tf") or "")
@@ -81,36 +128,17 @@ def loop():
                 sl=float(sl)
                 price=last_price(sym)
                 crossed = (price is not None) and ((side=="LONG" and price<=sl) or (side=="SHORT" and price>=sl))
-                ksent=key(k, side, sl)
-                if crossed and (not tr.get("sl_sent")) and (ksent not in sent):
-                    entry=float(tr.get("entry_price") or tr.get("avg_entry") or tr.get("entry") or 0) or 0.0
-                    delta=pnl_pct(side, entry, price or sl)
-                    caption=f"{TAG} 🛑 Stop Loss | {sym} {side} on {tf}"
-                    out = OUTDIR / f"stop_{sym}_{int(time.time())}.png"
-                    try:
-                        generate_stop_card(
-                            symbol=sym, side=side, leverage=str(tr.get("lev") or tr.get("leverage") or ""),
-                            roi_pct=delta, entry_price=float(entry),
-                            filled_price=float(price if price is not None else sl),
-                            sl_price=float(sl), out_path=str(out), bg_path=STOP_BG,
-                        )
-                        ok = send_photo(out, caption)
-                    except Exception as e:
-                        ok = False
-                        print("[sl] erro card:", e, flush=True)
-                    if not ok:
-                        # fallback texto
-                        try:
-                            requests.post(f"https://api.telegram.org/bot{TOKEN}/sendMessage",
-                                          data={"chat_id":CHAT,"text":f"{caption}\nFilled: {(price or sl):g}\nROI (est.): {delta:.4f}%"},
-                                          timeout=10)
-                        except Exception: pass
+                if crossed and not tr.get("sl_sent"):
+                    notify_stop(k, sym, side, tf, tr, price, sl)  # idempotente (chave no outbox)
                     tr["sl_sent"]=True
                     if SET_STATUS: tr["status"]="STOP"
-                    sent.add(ksent); changed=True
-            if changed: atomic_write(TRADES, data); save_sent(sent)
+                    changed=True
+            if changed: atomic_write(TRADES, data); cache.mark_written(data)
         except Exception as e:
             print("[sl] erro:", e, flush=True)
-        time.sleep(EVERY)
+        # com trade aberta precisa checar preço a cada EVERY; sem nenhuma, só acorda quando o arquivo mudar
+        if pending: time.sleep(EVERY)
+        else: watch.wait(timeout=IDLE_MAX)
 
-if __name__=="__main__": loop()
+if __name__=="__main__":
+    loop_service() if SERVICE_URL else loop()
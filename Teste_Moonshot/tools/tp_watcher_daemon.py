@@ -1,9 +1,12 @@
-import os, time, json, pathlib, requests, fcntl, sys, hashlib
+import os, time, json, pathlib, requests, fcntl, sys
 from pathlib import Path
 import sys
 BASE = Path(__file__).resolve().parent.parent
 if str(BASE) not in sys.path: sys.path.insert(0, str(BASE))
-from moonshot_card import generate_trade_card  # << usa seu gerador de card
+from moonshot_card import archive_from_env, default_renderer, renderer_from_env, set_default_renderer  # << usa seu gerador de card
+from tools.file_watch import FileWatcher, JsonFileCache
+from telegram_outbox import outbox_from_env
+from moonshot_render_pool import render_pool_from_env
 
 BASE = pathlib.Path(__file__).resolve().parent.parent
 env = os.environ.copy()
@@ -16,13 +19,15 @@ TOKEN=env.get("TELEGRAM_BOT_TOKEN")
 CHAT =env.get("TELEGRAM_TP_CHAT_ID") or env.get("TELEGRAM_CHAT_ID")
 TAG  =(env.get("TP_TAG") or "[TESTE]").strip()
 EVERY=int(env.get("TP_WATCH_EVERY_SEC","10"))
+IDLE_MAX=int(env.get("WATCH_IDLE_MAX_SEC","300"))  # sem trade aberta: dorme até o arquivo mudar
 TRF  =env.get("REPORT_TRADES_FILE") or "moonshot_trades.json"
 TRADES = pathlib.Path(TRF) if pathlib.Path(TRF).is_absolute() else (BASE/TRF)
 SET_STATUS = int(env.get("TP_SET_STATUS","1"))
-SENT_FILE = pathlib.Path(os.path.expanduser(env.get("TPS_SENT_FILE") or "~/.moonshot_shared/tps_sent.json"))
 TP_BG = env.get("TP_CARD_TEMPLATE", "assets/moonshot/bg_tp.jpg")
-OUTDIR = pathlib.Path(env.get("CARD_OUT_DIR") or (BASE/"out"))
-OUTDIR.mkdir(parents=True, exist_ok=True)
+# card vai da memória direto para o upload; cópia em disco só com CARD_ARCHIVE=1 (com retenção)
+ARCHIVE = archive_from_env(env, BASE/"out")
+set_default_renderer(renderer_from_env(env))  # CARD_ENCODING / CARD_QUALITY
+SERVICE_URL = (env.get("TRADE_SERVICE_URL") or "").strip()  # ex.: http://127.0.0.1:8765
 
 # lock de instância
 lock=open(f"/tmp/tp_watcher_{BASE.name}.lock","w")
@@ -43,36 +48,93 @@ def pnl_pct(side,entry,price):
     if not entry or not price: return 0.0
     return (price/entry-1.0)*100.0 if side=="LONG" else (1.0-price/entry)*100.0
 
-def load_sent():
-    try: return set(json.loads(SENT_FILE.read_text()))
-    except Exception: return set()
-def save_sent(s):
-    try: SENT_FILE.write_text(json.dumps(sorted(s)))
-    except Exception: pass
-def key(kjson, lvl, tp_val): return hashlib.sha1(f"{kjson}|TP{lvl}|{tp_val}".encode()).hexdigest()
+def key(kjson, lvl, tp_val): return f"tp:{kjson}:TP{lvl}:{tp_val}"
 
-def send_photo(path, caption):
-    if not (TOKEN and CHAT): return False
-    try:
-        with open(path, "rb") as f:
-            r=requests.post(f"https://api.telegram.org/bot{TOKEN}/sendPhoto",
-                            data={"chat_id":CHAT,"caption":caption},
-                            files={"photo":("tp.png", f, "image/png")}, timeout=30)
-        return r.ok
-    except Exception: return False
+# outbox durável (SQLite compartilhado): chave de idempotência por trade/evento no lugar
+# do antigo *_sent.json; o que ficou pendente num restart é reenviado
+OUTBOX = (outbox_from_env(env, TOKEN, source="tp_watcher", base_dir=str(BASE),
+                          render_pool=render_pool_from_env(env))  # cards gerados em paralelo (CARD_WORKERS)
+          if (TOKEN and CHAT) else None)
+
+def render_tp_card(sym, side, lev, idx, roi_pct, entry, price, stop_text):
+    # gera card com o seu template (no pool de render, também no replay); bytes da imagem
+    r = default_renderer()
+    im = r.trade_card(
+        symbol=sym, side=side, leverage=lev,
+        tp_label=f"TP{idx}", roi_pct=roi_pct,
+        entry_price=float(entry), last_price=float(price),
+        stop_text=stop_text, bg_path=TP_BG,
+    )
+    png = r.encode(im)
+    if ARCHIVE is not None: ARCHIVE.save(png, f"tp{idx}", sym, ext=r.ext)
+    return png
+
+if OUTBOX is not None:
+    OUTBOX.register_renderer("tp_card", render_tp_card)
+    OUTBOX.start()
+
+def notify_tp(k, sym, side, tf, tr, idx, tpv, entry, price):
+    if OUTBOX is None:
+        print("[tp] sem TELEGRAM_BOT_TOKEN/CHAT; aviso não enviado", flush=True); return
+    delta=pnl_pct(side, entry, price)
+    caption=f"{TAG} 🟢 TP{idx} atingido — {sym} {tf} ({side})"
+    OUTBOX.send_photo(
+        CHAT, caption,
+        render_name="tp_card",
+        render_args={"sym":sym, "side":side, "lev":str(tr.get("lev") or tr.get("leverage") or ""), "idx":idx,
+                     "roi_pct":delta, "entry":entry, "price":price,
+                     "stop_text":str(tr.get("stop_loss") or tr.get("sl") or "")},
+        fallback_text=f"{caption}\nEntry {entry:g} → Price {price:g} (TP{idx} {tpv:g}) | ROI {delta:.2f}%",
+        key=key(k, idx, tpv),
+    )
+
+REACHED = {"TP1": 1, "TP2": 2, "CLOSED_TP3": 3}
+
+def loop_service():
+    # assinante do serviço de trades do agente: o monitor decide os TPs, aqui só o card
+    from moonshot_trade_service import TradeServiceClient
+    client=TradeServiceClient(SERVICE_URL)
+    print(f"[tp] assinando eventos de {SERVICE_URL} | bg={TP_BG}", flush=True)
+    for k,kind,tr in client.follow(retry_sec=EVERY):
+        try:
+            side=(tr.get("side") or "").upper()
+            sym =(tr.get("symbol") or "").upper()
+            if not sym or not side: continue
+            hits={u.get("event"): u.get("price") for u in (tr.get("updates") or [])}
+            reached=REACHED.get(str(tr.get("status","")).upper(), 0)
+            if str(tr.get("status","")).upper()=="STOP":
+                reached=2 if "TP2" in hits else (1 if "TP1" in hits else 0)
+            # trades do próprio agente (tp1/tp2/tp3) já têm card em notify_trade_event
+            tps = tr.get("tp_levels") or tr.get("tps") or []
+            if not tps: continue
+            entry=float(tr.get("entry_price") or tr.get("avg_entry") or tr.get("entry") or 0) or 0.0
+            flags={}
+            for idx,tpv in enumerate(tps[:reached], start=1):
+                if tpv in (None,"",0): continue
+                tpv=float(tpv)
+                flag=f"tp{idx}_sent"
+                if tr.get(flag): continue
+                price=float(hits.get(f"TP{idx}") or tpv)
+                notify_tp(k, sym, side, str(tr.get("tf") or ""), tr, idx, tpv, entry, price)  # idempotente
+                flags[flag]=True
+            if flags:
+                client.patch(k, flags)
+        except Exception as e:
+            print("[tp] erro:", e, flush=True)
 
 def loop():
     print(f"[tp] watching {TRADES} every {EVERY}s | bg={TP_BG}", flush=True)
-    sent=load_sent()
+    cache=JsonFileCache(TRADES, default={}); watch=FileWatcher(TRADES)
     while True:
+        pending=True
         try:
-            if not TRADES.exists(): time.sleep(EVERY); continue
-            data=json.loads(TRADES.read_text() or "{}"); changed=False
+            data=cache.get(); changed=False; pending=False
             for k,tr in list(data.items()):
                 if not isinstance(tr,dict): continue
                 st=str(tr.get("status","")).upper()
                 if st.startswith("CLOSED") or st in {"STOP","CANCEL","CANCELED"}: 
                     continue
+                pending=True
                 side=(tr.get("side") or "").upper()
                 sym =(tr.get("symbol") or "").upper()
                 tf  = str(tr.get("tf") or "")
@@ -84,41 +146,21 @@ def loop():
                 for idx,tpv in enumerate(tps, start=1):
                     if tpv in (None,"",0): continue
                     tpv=float(tpv)
-                    sent_key=key(k, idx, tpv)
                     flag=f"tp{idx}_sent"
-                    if tr.get(flag) or sent_key in sent: 
+                    if tr.get(flag):
                         continue
                     hit = (price is not None) and ((side=="LONG" and price>=tpv) or (side=="SHORT" and price<=tpv))
                     if hit:
-                        delta=pnl_pct(side, entry, price)
-                        caption=f"{TAG} 🟢 TP{idx} atingido — {sym} {tf} ({side})"
-                        # gera card com o seu template
-                        out = OUTDIR / f"tp{idx}_{sym}_{int(time.time())}.png"
-                        try:
-                            generate_trade_card(
-                                symbol=sym, side=side, leverage=str(tr.get("lev") or tr.get("leverage") or ""),
-                                tp_label=f"TP{idx}", roi_pct=delta,
-                                entry_price=float(entry), last_price=float(price),
-                                stop_text=str(tr.get("stop_loss") or tr.get("sl") or ""),
-                                out_path=str(out), bg_path=TP_BG,
-                            )
-                            ok = send_photo(out, caption)
-                        except Exception as e:
-                            ok = False
-                            print("[tp] erro card:", e, flush=True)
-                        if not ok:
-                            # fallback texto
-                            try:
-                                requests.post(f"https://api.telegram.org/bot{TOKEN}/sendMessage",
-                                              data={"chat_id":CHAT,"text":f"{caption}\nEntry {entry:g} → Price {price:g} (TP{idx} {tpv:g}) | ROI {delta:.2f}%"},
-                                              timeout=10)
-                            except Exception: pass
+                        notify_tp(k, sym, side, tf, tr, idx, tpv, entry, price)
                         tr[flag]=True
                         if SET_STATUS and idx==len(tps): tr["status"]=f"CLOSED_TP{idx}"
-                        sent.add(sent_key); changed=True
-            if changed: atomic_write(TRADES, data); save_sent(sent)
+                        changed=True
+            if changed: atomic_write(TRADES, data); cache.mark_written(data)
         except Exception as e:
             print("[tp] erro:", e, flush=True)
-        time.sleep(EVERY)
+        # com trade aberta precisa checar preço a cada EVERY; sem nenhuma, só acorda quando o arquivo mudar
+        if pending: time.sleep(EVERY)
+        else: watch.wait(timeout=IDLE_MAX)
 
-if __name__=="__main__": loop()
+if __name__=="__main__":
+    loop_service() if SERVICE_URL else loop()
@@ -1,6 +1,8 @@
-import os, time, json, pathlib
+import os, json, pathlib, sys
 
 BASE = pathlib.Path(__file__).resolve().parent.parent
+if str(BASE) not in sys.path: sys.path.insert(0, str(BASE))
+from tools.file_watch import FileWatcher
 ENV = os.environ.copy()
 ENV_FILE = BASE / ".env_moonshot"
 if ENV_FILE.exists():
@@ -13,6 +15,8 @@ TRF   = ENV.get("REPORT_TRADES_FILE") or "moonshot_trades.json"
 TRADES_PATH = pathlib.Path(TRF) if pathlib.Path(TRF).is_absolute() else (BASE / TRF)
 SHADOW_PATH = BASE / "moonshot_trades_shadow.json"
 INTERVAL = int(ENV.get("TRADES_GUARD_EVERY_SEC", "15"))
+IDLE_MAX = int(ENV.get("WATCH_IDLE_MAX_SEC", "300"))
+SERVICE_URL = (ENV.get("TRADE_SERVICE_URL") or "").strip()  # ex.: http://127.0.0.1:8765
 
 def atomic_write(path: pathlib.Path, data: dict):
     tmp = path.with_suffix(path.suffix + ".tmp")
@@ -27,11 +31,18 @@ ESSENTIAL = ["entry_price","tp_levels","stop_loss","tick_size","opened_at","side
 
 def loop():
     shadow = load_json(SHADOW_PATH)
-    print(f"[trades_guard] rodando a cada {INTERVAL}s | trades={TRADES_PATH}", flush=True)
+    watch = FileWatcher(TRADES_PATH, poll_sec=INTERVAL)
+    print(f"[trades_guard] acordando a cada mudança de {TRADES_PATH} ({watch.backend})", flush=True)
+    first = True
     while True:
+        # só trabalha quando o arquivo de trades mudou (ou na primeira volta)
+        if not first and not watch.wait(timeout=IDLE_MAX):
+            continue
+        first = False
         try:
             data = load_json(TRADES_PATH)
             changed = False
+            before = json.dumps(shadow, sort_keys=True)
             # 1) atualiza shadow com dados bons de OPEN
             for k,tr in data.items():
                 if not isinstance(tr, dict): continue
@@ -56,11 +67,39 @@ def loop():
 
             if changed:
                 atomic_write(TRADES_PATH, data)
-            # persiste shadow periodicamente
-            atomic_write(SHADOW_PATH, shadow)
+                watch.changed()  # a própria escrita não deve acordar o loop de novo
+            # shadow só é regravado quando algo mudou nele
+            if json.dumps(shadow, sort_keys=True) != before:
+                atomic_write(SHADOW_PATH, shadow)
+        except Exception as e:
+            print(f"[trades_guard] erro: {e}", flush=True)
+
+def loop_service():
+    # assinante do serviço de trades: atualiza o shadow a cada evento e restaura
+    # campos faltantes via POST (o agente é o único que grava os trades)
+    from moonshot_trade_service import PROTECTED_FIELDS, TradeServiceClient
+    client = TradeServiceClient(SERVICE_URL)
+    shadow = load_json(SHADOW_PATH)
+    print(f"[trades_guard] assinando eventos de {SERVICE_URL}", flush=True)
+    for k, kind, tr in client.follow(retry_sec=INTERVAL):
+        try:
+            st = str(tr.get("status",""))
+            if st.startswith("CLOSED") or st == "STOP":
+                snap = shadow.get(k, {})
+                fix = {f: snap[f] for f in ESSENTIAL
+                       if tr.get(f) is None and f in snap and f not in PROTECTED_FIELDS}
+                if fix:
+                    client.patch(k, fix)
+                continue
+            snap = dict(shadow.get(k, {}))
+            for field in ESSENTIAL:
+                if tr.get(field) is not None:
+                    snap[field] = tr[field]
+            if snap != shadow.get(k):
+                shadow[k] = snap
+                atomic_write(SHADOW_PATH, shadow)
         except Exception as e:
             print(f"[trades_guard] erro: {e}", flush=True)
-        time.sleep(INTERVAL)
 
 if __name__=="__main__":
-    loop()
+    loop_service() if SERVICE_URL else loop()